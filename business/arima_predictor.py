@@ -1,67 +1,255 @@
 # arima_predictory.py
 
+import copy
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.arima.model import ARIMA
-from pmdarima import auto_arima
-from PyQt5.QtWidgets import QMessageBox
+
+from business.forecast_engines import get_engine
+from business.model_cache import get_model_cache
+
+
+# Меньше рядов прогнозируется в текущем процессе: запуск пула дороже самих моделей
+POOL_MIN_SERIES = int(os.getenv("QC_FORECAST_POOL_MIN", "4"))
+
+
+def default_workers():
+    """Число процессов для параллельного прогноза (QC_FORECAST_WORKERS или все ядра)"""
+    return int(os.getenv("QC_FORECAST_WORKERS", "0")) or os.cpu_count() or 1
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_forecast_pool(workers):
+    """Общий для процесса пул прогноза; создается при первом обращении и
+    пересоздается, если нужно больше процессов.
+
+    Процессы создаются через spawn (прогноз запускается из потока QThreadPool,
+    fork многопоточного процесса может зависнуть) и каждый раз импортируют
+    модули заново, поэтому пул не создается на каждый прогноз.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or workers > _pool_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)  # Уже поставленные задачи других прогнозов дорабатывают
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(executor):
+    """Убирает сломанный пул (процесс завершился аварийно); следующий прогноз создаст новый"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is executor:
+            _pool, _pool_workers = None, 0
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_forecast_pool():
+    """Останавливает пул прогноза при завершении приложения"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool, _pool_workers = None, 0
+
+
+def _forecast_task(task):
+    """Рабочая функция пула: прогноз одной партии. Ошибка возвращается
+    вместе с ключом, чтобы сбой одной партии не останавливал остальные.
+    Вместе с результатом возвращается обученная модель для кэша."""
+    batch, series, model, n_fitted, forecast_steps, engine = task
+    try:
+        model = ARIMAPredictor.fit(series, model, n_fitted, engine)
+        return batch, ARIMAPredictor.forecast(model, series, forecast_steps), None, model
+    except Exception as e:
+        return batch, None, str(e), None
+
 
 class ARIMAPredictor:
-    def __init__(self, parent):
-        self.parent = parent
+    """Прогноз временных рядов. Модель задается движком из
+    business.forecast_engines (по умолчанию - полный подбор auto_arima).
+    Класс не зависит от интерфейса: об ошибках predict сообщает через
+    on_error(сообщение), который передает вызывающая страница."""
 
-    def predict(self, df, target_col, time_col='timestamp', forecast_steps=5):
-        try:
-            if df.empty:
-                raise ValueError("Нет данных для прогнозирования")
-                
-            df = df.set_index(pd.to_datetime(df[time_col])).sort_index()
-            series = df[target_col].dropna()
-            
-            if len(series) < 10:
-                raise ValueError(f"Недостаточно данных ({len(series)} точек)")
-                
-            model = auto_arima(
-                series,
-                seasonal=False,
-                trace=False,
-                stepwise=True
-            )
-            
-            forecast, conf_int = model.predict(
-                n_periods=forecast_steps,
-                return_conf_int=True
-            )
+    def __init__(self, model_cache=None, engine=None, on_error=None):
+        self.on_error = on_error
+        self.model_cache = model_cache if model_cache is not None else get_model_cache()
+        self.engine = engine if engine is not None else get_engine()
 
-            last_date = series.index[-1]
-            freq = pd.infer_freq(series.index) or 'D'
-            
-            # Генерируем даты, включая последнюю дату истории
-            future_dates = pd.date_range(
-                start=last_date,
-                periods=forecast_steps + 1,  # +1 чтобы включить последнюю дату
-                freq=freq
-            )
-            
-            # Добавляем последнее значение истории в прогноз и доверительный интервал
-            last_value = series.iloc[-1]
-            forecast = pd.Series(
-                [last_value] + list(forecast),
-                index=future_dates
-            )
+    @staticmethod
+    def predict_many(series, target_col, time_col='timestamp', forecast_steps=5,
+                     workers=None, is_cancelled=None, model_cache=None, engine=None):
+        """Прогноз для нескольких партий в общем пуле процессов.
+
+        series - словарь ключ ряда (партия или пара партия-параметр) ->
+        DataFrame (time_col, target_col). Генератор выдает (ключ, результат,
+        ошибка) в порядке готовности прогнозов.
+        Партии с моделью в кэше прогнозируются сразу, без пула; меньше
+        POOL_MIN_SERIES рядов и быстрые движки (engine.in_process) - в
+        текущем процессе. Если процесс пула
+        аварийно завершился, ошибкой помечается его партия, остальные
+        незавершенные партии перезапускаются в новом пуле.
+        """
+        is_cancelled = is_cancelled or (lambda: False)
+        model_cache = model_cache if model_cache is not None else get_model_cache()
+        engine = engine if engine is not None else get_engine()
+
+        tasks = []
+        for batch, df in series.items():
+            try:
+                prepared = ARIMAPredictor.prepare_series(df, target_col, time_col)
+            except Exception as e:
+                yield batch, None, str(e)
+                continue
+            model, n_fitted = model_cache.lookup(prepared, engine.params)
+            task = (batch, prepared, model, n_fitted, forecast_steps, engine)
+            if model is not None and n_fitted == len(prepared):
+                yield _forecast_task(task)[:3]
+                continue
+            tasks.append(task)
+        if not tasks:
+            return
+
+        def finish(output):
+            batch, result, error, model = output
+            if model is not None:
+                model_cache.put(prepared_by_batch[batch], engine.params, model)
+            return batch, result, error
+
+        prepared_by_batch = {task[0]: task[1] for task in tasks}
+        workers = min(workers or default_workers(), len(tasks))
+        if workers <= 1 or len(tasks) < POOL_MIN_SERIES or engine.in_process:
+            for task in tasks:
+                if is_cancelled():
+                    return
+                yield finish(_forecast_task(task))
+            return
+
+        pending = {task[0]: task for task in tasks}
+        while pending:
+            executor = get_forecast_pool(workers)
+            try:
+                futures = {executor.submit(_forecast_task, task): batch for batch, task in pending.items()}
+            except BrokenProcessPool:
+                _discard_pool(executor)
+                continue
+            broken = False
+            try:
+                for future in as_completed(futures):
+                    if is_cancelled():
+                        return
+                    batch = futures[future]
+                    try:
+                        output = future.result()
+                    except BrokenProcessPool:
+                        # Какая партия уронила процесс, неизвестно: ошибкой помечается
+                        # первая, остальные повторяются в новом пуле
+                        if not broken:
+                            broken = True
+                            del pending[batch]
+                            yield batch, None, "Процесс прогноза аварийно завершился"
+                        continue
+                    del pending[batch]
+                    yield finish(output)
+            finally:
+                # Пул общий: снимаются только еще не начатые задачи этого прогноза
+                for future in futures:
+                    future.cancel()
+            if broken:
+                _discard_pool(executor)
+
+    @staticmethod
+    def prepare_series(df, target_col, time_col='timestamp'):
+        """Ряд значений target_col с индексом по времени"""
+        if df.empty:
+            raise ValueError("Нет данных для прогнозирования")
             
-            conf_int = pd.DataFrame(
-                np.vstack(([[last_value, last_value]], conf_int)),
-                index=future_dates,
-                columns=['lower', 'upper']
-            )
-
-            return {
-                'history': series,
-                'forecast': forecast,
-                'conf_int': conf_int
-            }
+        df = df.set_index(pd.to_datetime(df[time_col])).sort_index()
+        series = df[target_col].dropna()
+        
+        if len(series) < 10:
+            raise ValueError(f"Недостаточно данных ({len(series)} точек)")
+        return series
+
+    @staticmethod
+    def fit(series, model=None, n_fitted=0, engine=None):
+        """Подбор модели движком engine или дообучение model, уже учитывающей
+        первые n_fitted точек ряда"""
+        if model is None:
+            return (engine if engine is not None else get_engine()).fit(series)
+        if n_fitted < len(series):
+            # Копия: модель из кэша остается привязанной к своему ряду
+            model = copy.deepcopy(model)
+            model.update(series.iloc[n_fitted:].to_numpy())
+        return model
+
+    @staticmethod
+    def forecast(model, series, forecast_steps=5):
+        """Прогноз на forecast_steps шагов с 95% доверительным интервалом"""
+        forecast, conf_int = model.predict(
+            n_periods=forecast_steps,
+            return_conf_int=True
+        )
+
+        last_date = series.index[-1]
+        freq = pd.infer_freq(series.index) or 'D'
+        
+        # Генерируем даты, включая последнюю дату истории
+        future_dates = pd.date_range(
+            start=last_date,
+            periods=forecast_steps + 1,  # +1 чтобы включить последнюю дату
+            freq=freq
+        )
+        
+        # Добавляем последнее значение истории в прогноз и доверительный интервал
+        last_value = series.iloc[-1]
+        forecast = pd.Series(
+            [last_value] + list(forecast),
+            index=future_dates
+        )
+        
+        conf_int = pd.DataFrame(
+            np.vstack(([[last_value, last_value]], conf_int)),
+            index=future_dates,
+            columns=['lower', 'upper']
+        )
+
+        return {
+            'history': series,
+            'forecast': forecast,
+            'conf_int': conf_int
+        }
+
+    def predict(self, df, target_col, time_col='timestamp', forecast_steps=5, raise_errors=False):
+        """Ошибка передается в on_error, а без обработчика или при
+        raise_errors=True пробрасывается вызывающему.
+
+        Модель для того же ряда берется из кэша, для ряда с добавленными
+        точками - дообучается без повторного подбора порядка.
+        """
+        try:
+            series = self.prepare_series(df, target_col, time_col)
+
+            cached, n_fitted = self.model_cache.lookup(series, self.engine.params)
+            model = self.fit(series, cached, n_fitted, self.engine)
+            if model is not cached:
+                self.model_cache.put(series, self.engine.params, model)
+
+            return self.forecast(model, series, forecast_steps)
             
         except Exception as e:
-            QMessageBox.warning(self.parent, "ARIMA Error", str(e))
-            return None
\ No newline at end of file
+            if raise_errors or self.on_error is None:
+                raise
+            self.on_error(str(e))
+            return None
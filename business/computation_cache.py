@@ -0,0 +1,148 @@
+# business/computation_cache.py
+import threading
+
+import pandas as pd
+
+from business.quality_calculator import QualityCalculator
+
+
+class ComputationCache:
+    """Мемоизация расчета индекса качества по отдельным параметрам.
+
+    Агрегаты столбца (min/max/худшее значение) кэшируются по ключу
+    (версия набора данных, столбец), оценки - по паре (агрегат, настройка
+    ограничения) в пределах версии. Поэтому при добавлении одного ограничения пересчитывается
+    только этот параметр. Загрузка новых данных увеличивает версию набора и
+    сбрасывает кэш соответствующего типа анализа.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._aggregates = {}  # (тип анализа, версия, столбец, сигнатура) -> строка reduction
+        self._scores = {}      # (тип анализа, версия, агрегат, настройка ограничения) -> оценка
+        self._memo = {}        # (тип анализа, версия, имя) -> значение
+        self._processed = {}   # тип анализа -> уже предобработанный DataFrame
+        # Фоновые задачи обращаются к memo одновременно - значение строится один раз.
+        # Общая блокировка защищает только словари, значение строится под блокировкой
+        # своего ключа, поэтому разные ключи не ждут друг друга
+        self._memo_lock = threading.Lock()
+        self._key_locks = {}   # ключ memo -> блокировка на время построения значения
+
+    def version(self, analysis_type):
+        return self._versions.get(analysis_type, 0)
+
+    def invalidate(self, analysis_type):
+        """Новые данные: версия набора увеличивается, старые агрегаты и оценки удаляются"""
+        with self._memo_lock:
+            self._versions[analysis_type] = self.version(analysis_type) + 1
+            self._aggregates = {k: v for k, v in self._aggregates.items() if k[0] != analysis_type}
+            self._scores = {k: v for k, v in self._scores.items() if k[0] != analysis_type}
+            self._memo = {k: v for k, v in self._memo.items() if k[0] != analysis_type}
+        self._processed.pop(analysis_type, None)
+
+    def mark_processed(self, analysis_type, df):
+        self._processed[analysis_type] = df
+
+    def is_processed(self, analysis_type, df):
+        """Данные уже прошли предобработку и повторно ее не требуют"""
+        return self._processed.get(analysis_type) is df
+
+    def memo(self, analysis_type, name, factory):
+        """Произвольное значение, вычисляемое один раз на версию набора данных"""
+        key = (analysis_type, self.version(analysis_type), name)
+        with self._memo_lock:
+            if key in self._memo:
+                return self._memo[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._memo_lock:
+                if key in self._memo:
+                    return self._memo[key]
+            try:
+                value = factory()
+                with self._memo_lock:
+                    # Пока значение строилось, данные могли смениться - устаревшее не сохраняется
+                    if key[1] == self.version(analysis_type):
+                        self._memo[key] = value
+            finally:
+                with self._memo_lock:
+                    self._key_locks.pop(key, None)
+            return value
+
+    @staticmethod
+    def _signature(config):
+        """От чего зависит агрегат: для диапазона худшее значение зависит от центра"""
+        if config['type'] == 'range':
+            return ('range', (config['min'] + config['max']) / 2)
+        if config['type'] == 'fixed':
+            return ('fixed',)
+        return ('extrema',)
+
+    @staticmethod
+    def _freeze(config):
+        return tuple(sorted((k, str(v)) for k, v in config.items()))
+
+    def _store(self, cache, key, value):
+        """Сохранение в кэш, если версия ключа (key[1]) еще актуальна: результат,
+        посчитанный по старым данным, после invalidate не сохраняется"""
+        with self._memo_lock:
+            if key[1] == self.version(key[0]):
+                cache[key] = value
+
+    def _aggregate_key(self, analysis_type, param, config, version=None):
+        version = self.version(analysis_type) if version is None else version
+        return (analysis_type, version, param, self._signature(config))
+
+    def reduction(self, analysis_type, df, constraints):
+        """reduce_parameters, пересчитывающий только параметры без агрегатов в кэше"""
+        # Версия фиксируется до расчета: данные могут смениться, пока идет фоновая задача
+        version = self.version(analysis_type)
+        keys = {
+            param: self._aggregate_key(analysis_type, param, config, version)
+            for param, config in constraints.items()
+        }
+        rows = {param: self._aggregates.get(key) for param, key in keys.items()}
+        missing = {param: constraints[param] for param, row in rows.items() if row is None}
+        if missing:
+            fresh = QualityCalculator.reduce_parameters(df, missing)
+            for param in missing:
+                rows[param] = fresh.loc[param]
+                self._store(self._aggregates, keys[param], rows[param])
+
+        reduction = pd.DataFrame(index=pd.Index(list(constraints), dtype=object),
+                                 columns=['min', 'max', 'worst'], dtype=object)
+        for param, row in rows.items():
+            reduction.loc[param] = row
+        return reduction
+
+    def quality(self, analysis_type, df, constraints):
+        """Индекс качества (Series) и лучшие/худшие значения с учетом кэша"""
+        version = self.version(analysis_type)
+        reduction = self.reduction(analysis_type, df, constraints)
+
+        scores = {}
+        missing = {}
+        for param, config in constraints.items():
+            aggregate = reduction.loc[param, 'min' if config['type'] == 'min' else
+                                      'max' if config['type'] == 'max' else 'worst']
+            # NaN не равен сам себе и никогда не найдется в кэше - такой агрегат не кэшируется
+            key = None if pd.isna(aggregate) else (analysis_type, version, aggregate, self._freeze(config))
+            if key is not None and key in self._scores:
+                scores[param] = self._scores[key]
+            else:
+                missing[param] = key
+
+        if missing:
+            fresh = QualityCalculator.calculate_quality_index(
+                df, {p: constraints[p] for p in missing}, analysis_type,
+                reduction=reduction.loc[list(missing)]
+            )
+            for param, key in missing.items():
+                scores[param] = fresh[param]
+                if key is not None:
+                    self._store(self._scores, key, scores[param])
+
+        result = pd.Series({param: scores[param] for param in constraints}, dtype=float)
+        best_worst = QualityCalculator.calculate_actual_best_worst(df, constraints, reduction=reduction)
+        return result, best_worst
@@ -1,10 +1,20 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
+
+from business.streaming_resampler import StreamingResampler
 
 class DataProcessor:
     @staticmethod
-    def preprocess_data(df, analysis_type='static'):
+    def preprocess_data(df, analysis_type='static', sequential=False, resample_rule='D'):
+        """Удаление дубликатов, ресемплинг динамических данных, заполнение
+        пропусков медианой и фильтрация выбросов.
+
+        По умолчанию статистики всех столбцов считаются по одним и тем же
+        строкам, а выбросы удаляются одной общей маской. sequential=True
+        воспроизводит прежний порядок: статистики каждого следующего столбца
+        считаются по строкам, оставшимся после фильтрации предыдущих.
+        resample_rule - шаг ресемплинга динамических данных ('min', 'h', 'D', 'W').
+        """
         try:
             df = df.drop_duplicates()
 
@@ -20,22 +30,77 @@ class DataProcessor:
                     
                     numeric_cols = df.select_dtypes(include=np.number).columns
                     if not numeric_cols.empty:
-                        df = df.set_index(time_col)[numeric_cols].resample('D').mean()
+                        df = df.set_index(time_col)[numeric_cols].resample(resample_rule).mean()
                         df = df.interpolate(method='time')
 
             numeric_cols = df.select_dtypes(include=np.number).columns
-            for col in numeric_cols:
-                df[col].fillna(df[col].median(), inplace=True)
-                q1 = df[col].quantile(0.05)
-                q3 = df[col].quantile(0.95)
-                iqr = q3 - q1
-                df = df[(df[col] >= q1 - 1.5*iqr) & (df[col] <= q3 + 1.5*iqr)]
+            if sequential:
+                df = DataProcessor._filter_outliers_sequential(df, numeric_cols)
+            else:
+                df = DataProcessor.filter_outliers(df, numeric_cols)
 
-            # scaler = StandardScaler()
-            # df[numeric_cols] = scaler.fit_transform(df[numeric_cols])
+            return df
 
+        except Exception as e:
+            raise ValueError(f"Ошибка предобработки: {str(e)}")
 
-            return df
+    @staticmethod
+    def preprocess_stream(chunks, sequential=False, on_chunk=None, resample_rule='D'):
+        """Предобработка динамических данных по частям (например, из
+        DataManager.iter_chunks) с постоянным расходом памяти.
+
+        Части должны идти в порядке времени. Результат тот же, что у
+        preprocess_data(df, 'dynamic') для всего набора в памяти.
+        on_chunk(rows_seen) вызывается после каждой части.
+        """
+        try:
+            resampler = StreamingResampler(rule=resample_rule)
+            for chunk in chunks:
+                resampler.update(chunk)
+                if on_chunk is not None:
+                    on_chunk(resampler.rows_seen)
+            df = resampler.result()
+
+            numeric_cols = df.select_dtypes(include=np.number).columns
+            if sequential:
+                return DataProcessor._filter_outliers_sequential(df, numeric_cols)
+            return DataProcessor.filter_outliers(df, numeric_cols)
 
         except Exception as e:
-            raise ValueError(f"Ошибка предобработки: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Ошибка предобработки: {str(e)}")
+
+    @staticmethod
+    def filter_outliers(df, numeric_cols):
+        """Медианы и квантили 5/95% всех столбцов одним вызовом quantile,
+        выбросы удаляются одной маской за один проход"""
+        if numeric_cols.empty:
+            return df
+
+        values = df[numeric_cols]
+        stats = values.quantile([0.05, 0.5, 0.95])
+        has_nan = values.isna().any()
+        bounds = stats.loc[[0.05, 0.95]]
+        if has_nan.any():
+            values = values.fillna(stats.loc[0.5])
+            # Квантили столбцов с пропусками считаются уже после заполнения медианой
+            nan_cols = has_nan.index[has_nan.to_numpy()]
+            bounds[nan_cols] = values[nan_cols].quantile([0.05, 0.95])
+            df = df.copy()
+            df[numeric_cols] = values
+
+        q1, q3 = bounds.loc[0.05], bounds.loc[0.95]
+        iqr = q3 - q1
+        mask = ((values >= q1 - 1.5*iqr) & (values <= q3 + 1.5*iqr)).all(axis=1)
+        return df[mask]
+
+    @staticmethod
+    def _filter_outliers_sequential(df, numeric_cols):
+        """Прежний построчный порядок фильтрации: столбец за столбцом"""
+        for col in numeric_cols:
+            df = df.copy()
+            df[col] = df[col].fillna(df[col].median())
+            q1 = df[col].quantile(0.05)
+            q3 = df[col].quantile(0.95)
+            iqr = q3 - q1
+            df = df[(df[col] >= q1 - 1.5*iqr) & (df[col] <= q3 + 1.5*iqr)]
+        return df
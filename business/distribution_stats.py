@@ -0,0 +1,89 @@
+# business/distribution_stats.py
+import numpy as np
+import pandas as pd
+
+MAX_BINS = 100      # Предел числа столбцов гистограммы при автоматическом выборе
+MAX_OUTLIERS = 200  # Выбросов на box-plot партии (самые удаленные от усов)
+
+
+class DistributionStats:
+    """Гистограммы и статистики box-plot, рассчитанные в NumPy.
+
+    На график передаются только столбцы и квартили, поэтому объем фигуры
+    зависит от числа бинов и партий, а не от числа строк. Партии задаются
+    кодами 0..n_batches-1 (pd.factorize) и обрабатываются все сразу.
+    """
+
+    @staticmethod
+    def _clean(values, codes=None):
+        """Значения без пропусков (и без строк с пропущенной партией)"""
+        values = np.asarray(values, dtype=float)
+        mask = ~np.isnan(values)
+        if codes is not None:
+            codes = np.asarray(codes)
+            mask &= codes >= 0
+            return values[mask], codes[mask]
+        return values[mask], np.zeros(mask.sum(), dtype=np.int64)
+
+    @staticmethod
+    def bin_edges(values, bins='auto', max_bins=MAX_BINS):
+        """Границы бинов np.histogram; автоматический выбор ограничен max_bins"""
+        values, _ = DistributionStats._clean(values)
+        if not len(values):
+            return np.array([0.0, 1.0])
+        edges = np.histogram_bin_edges(values, bins=bins)
+        if len(edges) - 1 > max_bins:
+            edges = np.histogram_bin_edges(values, bins=max_bins)
+        return edges
+
+    @staticmethod
+    def histograms(values, edges, codes=None, n_batches=1):
+        """Матрица партия x бин с числом значений; последняя граница включается, как в np.histogram"""
+        values, codes = DistributionStats._clean(values, codes)
+        n_bins = len(edges) - 1
+        index = np.searchsorted(edges, values, side='right') - 1
+        index[values == edges[-1]] = n_bins - 1
+        inside = (index >= 0) & (index < n_bins)
+        flat = codes[inside] * n_bins + index[inside]
+        return np.bincount(flat, minlength=n_batches * n_bins).reshape(n_batches, n_bins)
+
+    @staticmethod
+    def box_stats(values, codes=None, n_batches=1, max_outliers=MAX_OUTLIERS):
+        """Квартили (линейная интерполяция, как quartilemethod='linear' в plotly),
+        среднее, усы на 1.5 IQR и выбросы для каждой партии.
+
+        Возвращает DataFrame с индексом 0..n_batches-1 и столбцами q1, median,
+        q3, mean, lowerfence, upperfence, outliers (массив). У партии без
+        значений статистики - NaN.
+        """
+        values, codes = DistributionStats._clean(values, codes)
+        series = pd.Series(values)
+        grouped = series.groupby(codes, sort=True)
+        quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack() \
+            .reindex(columns=[0.25, 0.5, 0.75])  # Пустой набор - столбцы без значений
+        stats = pd.DataFrame({
+            'q1': quartiles[0.25],
+            'median': quartiles[0.5],
+            'q3': quartiles[0.75],
+            'mean': grouped.mean(),
+        }).reindex(range(n_batches))
+
+        # Границы усов для каждой строки по ее партии
+        iqr = stats['q3'] - stats['q1']
+        low = (stats['q1'] - 1.5 * iqr).to_numpy()[codes]
+        high = (stats['q3'] + 1.5 * iqr).to_numpy()[codes]
+        inside = (values >= low) & (values <= high)
+        stats['lowerfence'] = series[inside].groupby(codes[inside]).min()
+        stats['upperfence'] = series[inside].groupby(codes[inside]).max()
+
+        # Выбросы: по max_outliers самых удаленных от усов в каждой партии
+        out_values, out_codes = values[~inside], codes[~inside]
+        distance = np.maximum(low[~inside] - out_values, out_values - high[~inside])
+        order = np.lexsort((-distance, out_codes))
+        sorted_codes = out_codes[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_codes, sorted_codes, side='left')
+        keep = order[rank < max_outliers]
+        # keep упорядочен по партиям - разбиение по границам кодов
+        bounds = np.searchsorted(out_codes[keep], np.arange(1, n_batches))
+        stats['outliers'] = np.split(out_values[keep], bounds)
+        return stats
@@ -0,0 +1,182 @@
+# business/forecast_engines.py
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+class StatsmodelsModel:
+    """Обертка над результатами statsmodels с интерфейсом модели pmdarima:
+    predict(n_periods, return_conf_int) и update(y)"""
+
+    def __init__(self, results, refit=None):
+        self.results = results
+        self._refit = refit  # Для моделей без append: повторная подгонка по полному ряду
+        self._values = np.asarray(results.model.endog, dtype=float).ravel()
+
+    def predict(self, n_periods, return_conf_int=True, alpha=0.05):
+        prediction = self.results.get_prediction(
+            start=len(self._values), end=len(self._values) + n_periods - 1
+        )
+        frame = prediction.summary_frame(alpha=alpha)
+        mean = frame['mean'].to_numpy()
+        if not return_conf_int:
+            return mean
+        lower = frame.filter(regex='lower').iloc[:, 0].to_numpy()
+        upper = frame.filter(regex='upper').iloc[:, 0].to_numpy()
+        return mean, np.column_stack([lower, upper])
+
+    def update(self, y):
+        y = np.asarray(y, dtype=float)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            if self._refit is None:
+                self.results = self.results.append(y, refit=False)
+            else:
+                self.results = self._refit(np.concatenate([self._values, y]))
+        self._values = np.concatenate([self._values, y])
+
+
+class ForecastEngine:
+    """Общий интерфейс моделей прогноза: fit(series) возвращает модель с
+    методами predict(n_periods, return_conf_int) и update(y).
+    params входят в ключ кэша моделей. in_process - подгонка настолько
+    быстрая, что запуск пула процессов обходится дороже самого прогноза."""
+    name = None
+    in_process = False
+
+    def __init__(self, **options):
+        self.options = options
+
+    @property
+    def params(self):
+        return {'engine': self.name, **self.options}
+
+    def fit(self, series):
+        raise NotImplementedError
+
+
+class AutoArimaEngine(ForecastEngine):
+    """Полный пошаговый подбор порядка ARIMA (pmdarima)"""
+    name = 'auto_arima'
+
+    def fit(self, series):
+        from pmdarima import auto_arima
+
+        return auto_arima(
+            series,
+            seasonal=False,
+            trace=False,
+            stepwise=True,
+            **self.options
+        )
+
+
+class FastArimaEngine(ForecastEngine):
+    """ARIMA с ограниченным перебором порядков и бюджетом времени на ряд.
+
+    Порядки перебираются от простых к сложным, лучший выбирается по AIC.
+    Когда бюджет исчерпан, перебор останавливается; если не удалось
+    подобрать ни одной модели, используется фиксированный порядок.
+    """
+    name = 'fast_arima'
+    in_process = True
+
+    def __init__(self, max_p=2, max_q=2, time_budget=0.5, fallback_order=(1, 1, 1)):
+        super().__init__(max_p=max_p, max_q=max_q, time_budget=time_budget,
+                         fallback_order=tuple(fallback_order))
+
+    @staticmethod
+    def _differences(values):
+        """Порядок разности по тесту Дики-Фуллера (0 или 1)"""
+        from statsmodels.tsa.stattools import adfuller
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                return 0 if adfuller(values, autolag='AIC')[1] < 0.05 else 1
+        except (ValueError, np.linalg.LinAlgError):
+            return 1
+
+    @staticmethod
+    def _fit_order(values, order):
+        from statsmodels.tsa.arima.model import ARIMA
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return ARIMA(values, order=order).fit(method_kwargs={'maxiter': 50})
+
+    def fit(self, series):
+        values = series.to_numpy(dtype=float)
+        started = time.monotonic()
+        d = self._differences(values)
+
+        orders = sorted(
+            ((p, d, q) for p in range(self.options['max_p'] + 1)
+             for q in range(self.options['max_q'] + 1) if p or q),
+            key=lambda order: (order[0] + order[2], order)
+        )
+        best = None
+        slowest = 0.0
+        for order in orders:
+            # Следующая подгонка не должна выйти за бюджет
+            elapsed = time.monotonic() - started
+            if elapsed + slowest > self.options['time_budget']:
+                break
+            try:
+                results = self._fit_order(values, order)
+            except (ValueError, np.linalg.LinAlgError):
+                continue
+            finally:
+                slowest = max(slowest, time.monotonic() - started - elapsed)
+            if best is None or results.aic < best.aic:
+                best = results
+
+        if best is None:
+            best = self._fit_order(values, self.options['fallback_order'])
+        return StatsmodelsModel(best)
+
+
+class ExponentialSmoothingEngine(ForecastEngine):
+    """Простое экспоненциальное сглаживание (SES) или модель Холта с
+    аддитивным трендом; подгонка занимает миллисекунды"""
+    in_process = True
+
+    def __init__(self, trend=None, damped=False):
+        super().__init__(trend=trend, damped=damped)
+        self.name = 'holt' if trend else 'ses'
+
+    def _fit_values(self, values):
+        from statsmodels.tsa.exponential_smoothing.ets import ETSModel
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            # Ряд с RangeIndex: get_prediction ETSModel не работает с голым ndarray
+            model = ETSModel(
+                pd.Series(values),
+                error='add',
+                trend=self.options['trend'],
+                damped_trend=bool(self.options['trend']) and self.options['damped']
+            )
+            return model.fit(disp=False)
+
+    def fit(self, series):
+        return StatsmodelsModel(self._fit_values(series.to_numpy(dtype=float)), refit=self._fit_values)
+
+
+# Ключ -> (подпись в интерфейсе, фабрика движка)
+ENGINES = {
+    'auto_arima': ("ARIMA (полный подбор)", AutoArimaEngine),
+    'fast_arima': ("ARIMA (быстрый подбор)", FastArimaEngine),
+    'holt': ("Холт (тренд)", lambda **options: ExponentialSmoothingEngine(trend='add', **options)),
+    'ses': ("Экспоненциальное сглаживание", ExponentialSmoothingEngine),
+}
+DEFAULT_ENGINE = 'auto_arima'
+
+
+def get_engine(name=DEFAULT_ENGINE, **options):
+    """Движок прогноза по ключу из ENGINES"""
+    if name not in ENGINES:
+        raise ValueError(f"Неизвестная модель прогноза: {name}")
+    return ENGINES[name][1](**options)
@@ -0,0 +1,102 @@
+# business/forecasting_service.py
+import pandas as pd
+
+from business.arima_predictor import ARIMAPredictor
+from business.forecast_engines import get_engine
+from business.metrics_engine import ALL_BATCHES
+from business.model_cache import get_model_cache
+
+RESULT_COLUMNS = ['batch', 'param', 'time', 'forecast', 'lower', 'upper', 'error']
+
+
+class ForecastingService:
+    """Прогноз без интерфейса для фоновых и ночных задач.
+
+    Принимает длинную таблицу (партия, время, параметр, значение) и
+    прогнозирует все пары (партия, параметр) за один вызов в пуле процессов.
+    Результат - таблица RESULT_COLUMNS: по строке на шаг прогноза с
+    доверительным интервалом; для ряда, который не удалось спрогнозировать,
+    одна строка с текстом ошибки в столбце error.
+    """
+
+    def __init__(self, engine=None, forecast_steps=5, workers=None, model_cache=None):
+        self.engine = get_engine(engine) if isinstance(engine, str) else \
+            engine if engine is not None else get_engine()
+        self.forecast_steps = forecast_steps
+        self.workers = workers
+        self.model_cache = model_cache if model_cache is not None else get_model_cache()
+
+    @staticmethod
+    def to_long(df, time_col, batch_col=None, params=None):
+        """Широкая таблица (столбец на параметр) -> длинная (batch, time, param, value)"""
+        params = params if params is not None else [
+            col for col in df.columns
+            if col not in (time_col, batch_col) and pd.api.types.is_numeric_dtype(df[col])
+        ]
+        long = df.melt(
+            id_vars=[time_col] + ([batch_col] if batch_col else []),
+            value_vars=params, var_name='param', value_name='value'
+        )
+        if batch_col:
+            long = long.rename(columns={time_col: 'time', batch_col: 'batch'})
+        else:
+            long = long.rename(columns={time_col: 'time'})
+            long['batch'] = ALL_BATCHES
+        return long[['batch', 'time', 'param', 'value']]
+
+    @staticmethod
+    def split(df, batch_col='batch', time_col='time', param_col='param', value_col='value'):
+        """Словарь (партия, параметр) -> DataFrame (time_col, value_col).
+        Пропуски не отбрасываются: пустой ряд попадет в результат с ошибкой."""
+        return {
+            key: group[[time_col, value_col]]
+            for key, group in df.groupby([batch_col, param_col], sort=False)
+        }
+
+    def forecast(self, df, batch_col='batch', time_col='time', param_col='param', value_col='value',
+                 is_cancelled=None, on_result=None):
+        """Прогноз всех пар (партия, параметр) длинной таблицы df.
+
+        on_result(партия, параметр, результат, ошибка) вызывается по мере
+        готовности рядов - для отчета о ходе работы. Ошибка одного ряда не
+        останавливает остальные.
+        """
+        series = self.split(df, batch_col, time_col, param_col, value_col)
+        outputs = {}
+        results = ARIMAPredictor.predict_many(
+            series, value_col, time_col=time_col, forecast_steps=self.forecast_steps,
+            workers=self.workers, is_cancelled=is_cancelled,
+            model_cache=self.model_cache, engine=self.engine
+        )
+        for key, result, error in results:
+            outputs[key] = self._rows(key, result, error)
+            if on_result is not None:
+                on_result(*key, result, error)
+
+        # Порядок рядов как во входной таблице, а не в порядке готовности
+        frames = [outputs[key] for key in series if key in outputs]
+        if not frames:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)[RESULT_COLUMNS]
+
+    @staticmethod
+    def _rows(key, result, error):
+        batch, param = key
+        if error is not None:
+            return pd.DataFrame({
+                'batch': [batch], 'param': [param], 'time': [pd.NaT],
+                'forecast': [float('nan')], 'lower': [float('nan')], 'upper': [float('nan')],
+                'error': [error],
+            })
+        # Первая точка прогноза - последнее значение истории, в результат не входит
+        forecast = result['forecast'].iloc[1:]
+        conf_int = result['conf_int'].iloc[1:]
+        return pd.DataFrame({
+            'batch': batch,
+            'param': param,
+            'time': forecast.index,
+            'forecast': forecast.to_numpy(dtype=float),
+            'lower': conf_int['lower'].to_numpy(dtype=float),
+            'upper': conf_int['upper'].to_numpy(dtype=float),
+            'error': None,
+        })
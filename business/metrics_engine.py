@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+
+from business.quality_calculator import QualityCalculator
+
+ALL_BATCHES = "Все партии"
+SERVICE_COLUMNS = ['id', 'timestamp', 'batch_id', 'product_id', 'date']
+
+NUMERIC_METRICS = [
+    'Среднее', 'Медиана', 'Ст. отклонение',
+    'Минимум', 'Максимум', 'Количество',
+    'За пределами норм', 'Лучшее значение',
+    'Худшее значение', 'Разброс', 'Индекс качества'
+]
+CATEGORICAL_METRICS = [
+    'Количество категорий', 'Самая частая категория', 'Количество значений'
+]
+# Целочисленные метрики: после JSON с пропусками восстанавливаются из float
+COUNT_METRICS = ['Количество', 'За пределами норм', 'Количество категорий', 'Количество значений']
+
+
+class BatchMetricsEngine:
+    """Куб метрик партия x параметр x метрика за один проход groupby('batch_id')"""
+
+    @staticmethod
+    def build_cube(df, constraints, batch_col='batch_id'):
+        """Рассчитывает все метрики таблицы для каждой партии и для всех партий сразу.
+
+        Возвращает DataFrame с индексом (партия, параметр) и столбцами-метриками.
+        Сводка по всем данным хранится под ключом ALL_BATCHES.
+        """
+        params = [col for col in df.columns if col not in SERVICE_COLUMNS and col != batch_col]
+        numeric = [p for p in params if pd.api.types.is_numeric_dtype(df[p])]
+        categorical = [p for p in params if p not in numeric]
+        constraints = {p: c for p, c in constraints.items() if p in numeric}
+
+        # Ключи партий приводятся к строке один раз
+        if batch_col in df.columns:
+            keys = df[batch_col].astype(str).to_numpy()
+            batches = list(pd.unique(keys))
+        else:
+            keys = np.full(len(df), ALL_BATCHES, dtype=object)
+            batches = []
+        batch_order = [ALL_BATCHES] + batches
+
+        cube = pd.DataFrame(
+            index=pd.MultiIndex.from_product([batch_order, params], names=['batch', 'param']),
+            columns=['Тип данных'] + NUMERIC_METRICS + CATEGORICAL_METRICS,
+            dtype=object
+        )
+        cube['Тип данных'] = [
+            'Числовой' if p in numeric else 'Категориальный'
+            for _ in batch_order for p in params
+        ]
+
+        if numeric:
+            BatchMetricsEngine._fill_numeric(cube, df[numeric], keys, batches, constraints)
+        for param in categorical:
+            BatchMetricsEngine._fill_categorical(cube, df[param], keys, batches)
+
+        return cube
+
+    @staticmethod
+    def _with_total(grouped, total, batches):
+        """Добавляет строку сводки по всем партиям к сгруппированному результату"""
+        total = total.to_frame(ALL_BATCHES).T if isinstance(total, pd.Series) else total
+        return pd.concat([total, grouped.reindex(batches)])
+
+    @staticmethod
+    def _fill_numeric(cube, data, keys, batches, constraints):
+        grouped = data.groupby(keys, sort=False)
+        stats = {
+            'Среднее': BatchMetricsEngine._with_total(grouped.mean(), data.mean(), batches),
+            'Медиана': BatchMetricsEngine._with_total(grouped.median(), data.median(), batches),
+            'Ст. отклонение': BatchMetricsEngine._with_total(grouped.std(), data.std(), batches),
+            'Минимум': BatchMetricsEngine._with_total(grouped.min(), data.min(), batches),
+            'Максимум': BatchMetricsEngine._with_total(grouped.max(), data.max(), batches),
+            'Количество': BatchMetricsEngine._with_total(grouped.count(), data.count(), batches),
+        }
+
+        # За пределами норм: матрица нарушений только по параметрам с ограничениями
+        # суммируется одним groupby, у остальных параметров нарушений 0
+        checked = [p for p, c in constraints.items() if c['type'] in ('range', 'min', 'max')]
+        violations = pd.DataFrame(0, index=data.index, columns=checked, dtype=np.int64)
+        for param in checked:
+            config = constraints[param]
+            values = data[param]
+            if config['type'] == 'range':
+                mask = (values < config.get('min', -np.inf)) | (values > config.get('max', np.inf))
+            elif config['type'] == 'min':
+                mask = values < config['value']
+            else:
+                mask = values > config['value']
+            violations[param] = mask.to_numpy(dtype=np.int64)
+        stats['За пределами норм'] = BatchMetricsEngine._with_total(
+            violations.groupby(keys, sort=False).sum(), violations.sum(), batches
+        ).reindex(columns=data.columns, fill_value=0)
+
+        worst = BatchMetricsEngine._range_worst(data, keys, batches, constraints)
+        fixed = [p for p, c in constraints.items() if c['type'] == 'fixed']
+        all_true = BatchMetricsEngine._with_total(
+            data[fixed].astype(bool).groupby(keys, sort=False).all(), data[fixed].all(), batches
+        ) if fixed else pd.DataFrame(index=[ALL_BATCHES] + batches)
+
+        # Агрегаты, по которым нормализуется индекс качества, для всех партий сразу
+        aggregated = pd.DataFrame(index=[ALL_BATCHES] + batches)
+        best = pd.DataFrame(index=aggregated.index, dtype=object)
+        worst_values = pd.DataFrame(index=aggregated.index, dtype=object)
+        for param, config in constraints.items():
+            if config['type'] == 'range':
+                aggregated[param] = worst[param]
+                best[param] = (config['min'] + config['max']) / 2
+                worst_values[param] = worst[param].astype(object)
+            elif config['type'] == 'min':
+                aggregated[param] = stats['Минимум'][param]
+                best[param] = stats['Максимум'][param].astype(object)
+                worst_values[param] = stats['Минимум'][param].astype(object)
+            elif config['type'] == 'max':
+                aggregated[param] = stats['Максимум'][param]
+                best[param] = stats['Минимум'][param].astype(object)
+                worst_values[param] = stats['Максимум'][param].astype(object)
+            elif config['type'] == 'fixed':
+                aggregated[param] = all_true[param]
+                best[param] = True
+                worst_values[param] = False
+        quality = QualityCalculator.score_aggregates(aggregated, constraints) if constraints else aggregated
+
+        # Для 'fixed' лучшее и худшее - bool: разброс считается во float (True - False = 1.0)
+        as_float = lambda frame: frame.apply(pd.to_numeric, errors='coerce').astype(float)
+        spread = as_float(best) - as_float(worst_values)
+        stats.update({
+            'Лучшее значение': best,
+            'Худшее значение': worst_values,
+            'Разброс': spread,
+            'Индекс качества': quality,
+        })
+        for metric, frame in stats.items():
+            BatchMetricsEngine._assign(cube, metric, frame)
+
+    @staticmethod
+    def _range_worst(data, keys, batches, constraints):
+        """Значение с максимальным отклонением от центра диапазона для каждой партии.
+
+        Как и idxmax, при равенстве отклонений берется значение, встречающееся
+        в данных первым.
+        """
+        worst = pd.DataFrame(index=[ALL_BATCHES] + batches)
+        for param, config in constraints.items():
+            if config['type'] != 'range':
+                continue
+            mid = (config['min'] + config['max']) / 2
+            values = data[param].to_numpy(dtype=float)
+            deviation = pd.Series(np.abs(values - mid))
+
+            group_max = deviation.groupby(keys, sort=False).transform('max').to_numpy()
+            hit = deviation.to_numpy() == group_max
+            per_batch = pd.Series(values[hit]).groupby(keys[hit], sort=False).first()
+
+            total_hit = deviation.to_numpy() == deviation.max()
+            total = values[total_hit][0] if total_hit.any() else np.nan
+            worst[param] = pd.concat([pd.Series({ALL_BATCHES: total}), per_batch.reindex(batches)])
+            if pd.api.types.is_integer_dtype(data[param].dtype):
+                worst[param] = worst[param].map(
+                    lambda v: v if pd.isna(v) else data[param].dtype.type(v)
+                ).astype(object)
+        return worst
+
+    @staticmethod
+    def _fill_categorical(cube, values, keys, batches):
+        frame = pd.DataFrame({'batch': keys, 'value': values.to_numpy()})
+        grouped = frame.groupby('batch', sort=False)['value']
+
+        # Самая частая категория: при равных частотах - наименьшее значение, как в mode()
+        counts = frame.dropna().value_counts().rename('n').reset_index()
+        counts = counts.sort_values(['n', 'value'], ascending=[False, True], kind='stable')
+        modes = counts.drop_duplicates('batch').set_index('batch')['value']
+        total_mode = values.mode()
+
+        metrics = pd.DataFrame({
+            'Количество категорий': grouped.nunique(),
+            'Самая частая категория': modes,
+            'Количество значений': grouped.count(),
+        }).reindex(batches)
+        total = pd.DataFrame({
+            'Количество категорий': [values.nunique()],
+            'Самая частая категория': [total_mode.iloc[0] if not total_mode.empty else ''],
+            'Количество значений': [values.count()],
+        }, index=[ALL_BATCHES])
+        metrics = pd.concat([total, metrics])
+
+        for metric in CATEGORICAL_METRICS:
+            BatchMetricsEngine._assign(cube, metric, metrics[metric].to_frame(values.name))
+
+    @staticmethod
+    def _assign(cube, metric, frame):
+        """Записывает таблицу партии x параметры в столбец метрики куба"""
+        if frame.empty or not len(frame.columns):
+            return
+        stacked = frame.astype(object).stack(future_stack=True)
+        rows = cube.index.intersection(stacked.index)
+        cube.loc[rows, metric] = stacked.loc[rows].to_numpy()
+
+    @staticmethod
+    def cube_to_records(cube):
+        """Куб -> список словарей (для сохранения в JSON)"""
+        return cube.reset_index().to_dict(orient='records')
+
+    @staticmethod
+    def cube_from_records(records):
+        """Восстановление куба из списка словарей"""
+        cube = pd.DataFrame.from_records(records).set_index(['batch', 'param'])
+        columns = ['Тип данных'] + NUMERIC_METRICS + CATEGORICAL_METRICS
+        cube = cube.reindex(columns=columns).astype(object)
+        for metric in COUNT_METRICS:
+            cube[metric] = pd.Series([v if pd.isna(v) else int(v) for v in cube[metric]],
+                                     index=cube.index, dtype=object)
+        return cube
+
+    @staticmethod
+    def batch_frame(cube, batch):
+        """DataFrame метрик одной партии в формате выгрузки (строка на параметр)"""
+        batch = batch if batch in cube.index.get_level_values('batch') else ALL_BATCHES
+        metrics = []
+        for param, row in cube.loc[batch].iterrows():
+            param_metrics = {'Параметр': param, 'Тип данных': row['Тип данных']}
+            if row['Тип данных'] == 'Числовой':
+                best = row['Лучшее значение']
+                worst = row['Худшее значение']
+                quality = row['Индекс качества']
+                param_metrics.update({
+                    metric: row[metric] for metric in NUMERIC_METRICS[:7]
+                })
+                param_metrics.update({
+                    'Лучшее значение': '' if pd.isna(best) else best,
+                    'Худшее значение': '' if pd.isna(worst) else worst,
+                    'Разброс': 0 if pd.isna(row['Разброс']) else row['Разброс'],
+                    'Индекс качества': '' if pd.isna(quality) else quality
+                })
+            else:
+                param_metrics.update({
+                    metric: row[metric] for metric in CATEGORICAL_METRICS
+                })
+            metrics.append(param_metrics)
+        return pd.DataFrame(metrics)
@@ -0,0 +1,153 @@
+# business/model_cache.py
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def series_key(series, params):
+    """SHA-256 от значений и индекса ряда и параметров модели"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(series, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """LRU-кэш обученных моделей прогноза.
+
+    Ключ - хэш ряда и параметров модели, поэтому повторный прогноз на том же
+    ряду не требует подбора порядка. Если ряд отличается от закэшированного
+    только добавленными в конец точками, lookup возвращает модель вместе с
+    числом уже учтенных точек, и модель достаточно дообучить. Модели могут
+    дополнительно сохраняться на диск (QC_MODEL_CACHE_DIR), тогда кэш общий
+    для процессов пула и переживает перезапуск приложения.
+    """
+
+    def __init__(self, max_entries=64, cache_dir=None, max_bytes=None):
+        self.max_entries = max_entries
+        cache_dir = cache_dir or os.getenv("QC_MODEL_CACHE_DIR")
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(os.getenv("QC_MODEL_CACHE_MAX_MB", "256")) * 1024 * 1024
+        self._entries = OrderedDict()  # ключ -> (параметры, ряд, модель)
+        self._lock = threading.Lock()
+
+    def lookup(self, series, params):
+        """(модель, число учтенных точек) или (None, 0).
+
+        Точное совпадение дает модель для всего ряда, иначе ищется модель
+        для самого длинного начала ряда с теми же параметрами.
+        """
+        key = series_key(series, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][2], len(series)
+
+        model = self._load(key)
+        if model is not None:
+            self._remember(key, params, series, model)
+            return model, len(series)
+
+        best, best_len = None, 0
+        with self._lock:
+            for cached_params, cached, model in self._entries.values():
+                n = len(cached)
+                if cached_params != params or not best_len < n < len(series):
+                    continue
+                if cached.index.equals(series.index[:n]) and \
+                        np.array_equal(cached.to_numpy(dtype=float), series.to_numpy(dtype=float)[:n]):
+                    best, best_len = model, n
+        return best, best_len
+
+    def put(self, series, params, model):
+        key = series_key(series, params)
+        self._remember(key, params, series, model)
+        self._store(key, model)
+
+    def _remember(self, key, params, series, model):
+        with self._lock:
+            self._entries[key] = (params, series.copy(), model)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- Диск ----------------------------------------------------------------
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.pkl"
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+            os.utime(path)  # Отметка последнего обращения для LRU
+            return model
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            path.unlink(missing_ok=True)
+            return None
+
+    def _store(self, key, model):
+        """Сохранение на диск; ошибки записи кэша не критичны"""
+        if self.cache_dir is None or self.max_bytes <= 0:
+            return
+        path = self._path(key)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            tmp.unlink(missing_ok=True)
+            return
+        self._evict()
+
+    def _evict(self):
+        """Удаляет самые старые файлы, пока кэш не уложится в лимит"""
+        entries = []
+        for path in self.cache_dir.glob('*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= size
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob('*.pkl'):
+                path.unlink(missing_ok=True)
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_model_cache():
+    """Общий для процесса кэш моделей"""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = ModelCache()
+        return _instance
@@ -1,93 +1,162 @@
+import numpy as np
 import pandas as pd
 
 class QualityCalculator:
-    
+
     @staticmethod
-    def calculate_quality_index(df, constraints, analysis_type="static"):
-        normalized_scores = {}
-        
-        # Проход по всем параметрам с ограничениями
-        for param, config in constraints.items():
-            values = df[param]
-            constraint_type = config['type']
-            gamma = config.get('gamma', 1)  # Параметр из конфига
+    def reduce_parameters(df, constraints):
+        """Одна проходка по данным: агрегаты для всех параметров с ограничениями.
 
-            print(123)
+        Возвращает DataFrame (индекс - параметр) с колонками 'min', 'max' и
+        'worst' (для 'range' - значение с максимальным отклонением от центра,
+        для 'fixed' - логическое И по столбцу).
+        """
+        params = list(constraints.keys())
+        reduction = pd.DataFrame(index=pd.Index(params, dtype=object),
+                                 columns=['min', 'max', 'worst'], dtype=object)
+        if not params:
+            return reduction
 
-            # Агрегация значений
-            if constraint_type == 'range':
-                a, b = config['min'], config['max']
-                mid = (a + b)/2
-                aggregated = values.loc[values.apply(lambda p: abs(p - mid)).idxmax()]
-                
-            elif constraint_type == 'min':
-                print('прием как слышно:',config )
-                a = config['value']
-                aggregated = values.min()
-                print(aggregated)
-                
-            elif constraint_type == 'max':
-                b = config['value']
-                aggregated = values.max()
-                
-            elif constraint_type == 'fixed':
-                aggregated = values.all()  # Логическое И для булевых
+        fixed = [p for p in params if constraints[p]['type'] == 'fixed']
+        numeric = [p for p in params if constraints[p]['type'] != 'fixed']
 
-            print('# Нормализация')   
-            # Нормализация
-            if constraint_type == 'range':
-                a, b = config['min'], config['max']
-                c = (a + b)/2
-                if a < aggregated < b:
-                    score = ((c - abs(aggregated - c))**gamma) / c
-                else:
-                    score = 0.0
-                    
-            elif constraint_type == 'min':
-                a = config['value']
-                score = 1 - (1/(aggregated - a + 1))**gamma if aggregated >= a else 0.0
-                
+        if numeric:
+            # Матрица строки x параметры, все вычисления векторизованы по оси столбцов
+            values = df[numeric].to_numpy(dtype=float)
+            mins = np.full(len(numeric), np.nan)
+            maxs = np.full(len(numeric), np.nan)
+            worst = np.full(len(numeric), np.nan)
+
+            if len(values):
+                # fmin/fmax пропускают NaN так же, как pandas min()/max()
+                mins = np.fmin.reduce(values, axis=0)
+                maxs = np.fmax.reduce(values, axis=0)
+
+                mids = np.array([
+                    (constraints[p]['min'] + constraints[p]['max']) / 2
+                    if constraints[p]['type'] == 'range' else np.nan
+                    for p in numeric
+                ])
+                range_cols = np.flatnonzero(~np.isnan(mids))
+                if len(range_cols):
+                    deviation = np.abs(values[:, range_cols] - mids[range_cols])
+                    deviation[np.isnan(deviation)] = -np.inf
+                    rows = deviation.argmax(axis=0)
+                    worst[range_cols] = values[rows, range_cols]
+
+            for i, param in enumerate(numeric):
+                dtype = df[param].dtype
+                reduction.loc[param, 'min'] = QualityCalculator._as_column_type(mins[i], dtype)
+                reduction.loc[param, 'max'] = QualityCalculator._as_column_type(maxs[i], dtype)
+                reduction.loc[param, 'worst'] = QualityCalculator._as_column_type(worst[i], dtype)
+
+        if fixed:
+            # Логическое И для булевых
+            reduction.loc[fixed, 'worst'] = df[fixed].all().to_numpy()
+
+        return reduction
+
+    @staticmethod
+    def _as_column_type(value, dtype):
+        """Возвращает агрегат в типе исходного столбца (целые остаются целыми)"""
+        if np.isnan(value):
+            return value
+        if pd.api.types.is_integer_dtype(dtype):
+            return np.dtype(dtype).type(value)
+        return np.float64(value)
+
+    @staticmethod
+    def score_aggregates(aggregated, constraints):
+        """Нормализация агрегированных значений, векторизованная по параметрам.
+
+        aggregated - словарь (параметр -> значение) или DataFrame, где строки -
+        партии, а столбцы - параметры. Возвращает Series или DataFrame.
+        """
+        params = list(constraints.keys())
+        if isinstance(aggregated, pd.DataFrame):
+            values = aggregated[params].astype(float).to_numpy()
+        else:
+            values = np.array([[float(aggregated[p]) for p in params]]).reshape(1, len(params))
+
+        types = np.array([constraints[p]['type'] for p in params])
+        gamma = np.array([constraints[p].get('gamma', 1) for p in params], dtype=float)
+        lower = np.array([constraints[p].get('min', constraints[p].get('value', np.nan))
+                          for p in params], dtype=float)
+        upper = np.array([constraints[p].get('max', constraints[p].get('value', np.nan))
+                          for p in params], dtype=float)
+        scores = np.zeros_like(values)
+
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            # Допустимый диапазон
+            is_range = types == 'range'
+            mid = (lower + upper) / 2
+            inside = is_range & (lower < values) & (values < upper)
+            range_scores = ((mid - np.abs(values - mid)) ** gamma) / mid
+            scores = np.where(inside, range_scores, scores)
+
+            # Минимальное значение
+            is_min = (types == 'min') & (values >= lower)
+            min_scores = 1 - (1 / (values - lower + 1)) ** gamma
+            scores = np.where(is_min, min_scores, scores)
+
+            # Максимальное значение
+            is_max = (types == 'max') & (values <= upper)
+            max_scores = 1 - (1 / (1 + upper - values)) ** gamma
+            scores = np.where(is_max, max_scores, scores)
+
+        # Булевы -> 0.0/1.0
+        scores = np.where(types == 'fixed', values, scores)
+
+        if isinstance(aggregated, pd.DataFrame):
+            return pd.DataFrame(scores, index=aggregated.index, columns=params)
+        return pd.Series(scores[0], index=params, dtype=float)
+
+    @staticmethod
+    def calculate_quality_index(df, constraints, analysis_type="static", reduction=None):
+        if reduction is None:
+            reduction = QualityCalculator.reduce_parameters(df, constraints)
+
+        # Агрегированное значение, по которому нормализуется каждый параметр
+        aggregated = {}
+        for param, config in constraints.items():
+            constraint_type = config['type']
+            if constraint_type == 'min':
+                aggregated[param] = reduction.loc[param, 'min']
             elif constraint_type == 'max':
-                b = config['value']
-                score = 1 - (1/(1 + b - aggregated))**gamma if aggregated <= b else 0.0
-                
-            elif constraint_type == 'fixed':
-                score = float(aggregated)  # Булевы -> 0.0/1.0
-                
-            normalized_scores[param] = score
+                aggregated[param] = reduction.loc[param, 'max']
+            else:
+                aggregated[param] = reduction.loc[param, 'worst']
 
         # Возвращаем вектор нормализованных значений
-        return pd.Series(normalized_scores)
-    
+        return QualityCalculator.score_aggregates(aggregated, constraints)
+
     @staticmethod
-    def calculate_actual_best_worst(df, constraints):
+    def calculate_actual_best_worst(df, constraints, reduction=None):
+        if reduction is None:
+            reduction = QualityCalculator.reduce_parameters(df, constraints)
+
         best_worst = {}
-        
+
         for param, config in constraints.items():
-            values = df[param]
             constraint_type = config['type']
-            
+
             if constraint_type == 'range':
-                a, b = config['min'], config['max']
-                mid = (a + b) / 2
                 # Худшее значение: максимальное отклонение от центра
-                worst_idx = values.apply(lambda p: abs(p - mid)).idxmax()
-                best = mid
-                worst = values.loc[worst_idx]
-                
+                best = (config['min'] + config['max']) / 2
+                worst = reduction.loc[param, 'worst']
+
             elif constraint_type == 'min':
-                print("Прием как слышно")
-                best = values.max()
-                worst = values.min()
-                
+                best = reduction.loc[param, 'max']
+                worst = reduction.loc[param, 'min']
+
             elif constraint_type == 'max':
-                best = values.min()
-                worst = values.max()
-                
+                best = reduction.loc[param, 'min']
+                worst = reduction.loc[param, 'max']
+
             elif constraint_type == 'fixed':
                 best = True
                 worst = False
-                
+
             best_worst[param] = {'best': best, 'worst': worst}
-            
-        return best_worst
\ No newline at end of file
+
+        return best_worst
@@ -0,0 +1,105 @@
+# business/rollups.py
+import pandas as pd
+
+from business.metrics_engine import ALL_BATCHES
+
+# Уровни детализации от самого подробного к самому грубому
+LEVELS = ['raw', 'min', 'h', 'D', 'W']
+LEVEL_NAMES = {
+    'raw': "Исходные",
+    'min': "Минута",
+    'h': "Час",
+    'D': "Сутки",
+    'W': "Неделя",
+}
+
+
+def time_bins(times, rule):
+    """Начало интервала rule для каждой метки времени (недели - с понедельника)"""
+    if rule == 'W':
+        return times.to_period('W').start_time
+    return times.floor(rule)
+
+
+class TimeRollups:
+    """Многоуровневые агрегаты временных рядов (сумма, количество, минимум,
+    максимум) по партиям, рассчитываемые один раз на набор данных.
+
+    Каждый следующий уровень строится из предыдущего, а не из исходных
+    строк. Смена параметра или партии на графике - выборка из готового
+    уровня без повторной группировки.
+    """
+
+    def __init__(self, df, time_col, batch_col=None, params=None):
+        self.time_col = time_col
+        self.params = params if params is not None else [
+            col for col in df.columns
+            if col not in (time_col, batch_col) and pd.api.types.is_numeric_dtype(df[col])
+        ]
+        times = pd.DatetimeIndex(pd.to_datetime(df[time_col], errors='coerce'))
+        values = df[self.params]
+
+        # Исходный уровень: среднее по совпадающим меткам времени, как groupby(time_col)
+        parts = [self._aggregate(values.groupby(times))]
+        parts[0].index = pd.MultiIndex.from_arrays(
+            [[ALL_BATCHES] * len(parts[0]), parts[0].index], names=['batch', time_col]
+        )
+        self.batches = []
+        if batch_col is not None:
+            keys = df[batch_col].astype(str).to_numpy()
+            self.batches = list(pd.unique(keys))
+            parts.append(self._aggregate(values.groupby([keys, times])))
+
+        raw = pd.concat(parts)
+        raw.index.names = ['batch', time_col]
+        self.levels = {'raw': raw}
+        for previous, rule in zip(LEVELS, LEVELS[1:]):
+            self.levels[rule] = self._coarsen(self.levels[previous], rule)
+
+    @staticmethod
+    def _aggregate(grouped):
+        return pd.concat({
+            'sum': grouped.sum(),
+            'count': grouped.count(),
+            'min': grouped.min(),
+            'max': grouped.max(),
+        }, axis=1)
+
+    def _coarsen(self, frame, rule):
+        batches = frame.index.get_level_values('batch')
+        bins = time_bins(frame.index.get_level_values(self.time_col), rule)
+        keys = [batches, bins]
+        coarse = pd.concat({
+            'sum': frame['sum'].groupby(keys).sum(),
+            'count': frame['count'].groupby(keys).sum(),
+            'min': frame['min'].groupby(keys).min(),
+            'max': frame['max'].groupby(keys).max(),
+        }, axis=1)
+        coarse.index.names = ['batch', self.time_col]
+        return coarse
+
+    def _level_frame(self, level, batch):
+        frame = self.levels[level]
+        if batch not in frame.index.levels[0]:
+            return frame.iloc[:0].droplevel('batch')
+        return frame.xs(batch, level='batch')
+
+    def pick_level(self, batch=ALL_BATCHES, max_points=2000, start=None, end=None):
+        """Самый подробный уровень, у которого в окне [start, end] не больше max_points точек"""
+        for level in LEVELS:
+            index = self._level_frame(level, batch).index
+            lo = 0 if start is None else index.searchsorted(pd.Timestamp(start), side='left')
+            hi = len(index) if end is None else index.searchsorted(pd.Timestamp(end), side='right')
+            if hi - lo <= max_points:
+                return level
+        return LEVELS[-1]
+
+    def series(self, param, batch=ALL_BATCHES, level='raw', stat='mean'):
+        """Временной ряд статистики stat ('mean', 'min', 'max', 'count') параметра"""
+        frame = self._level_frame(level, batch)
+        if stat == 'mean':
+            counts = frame[('count', param)]
+            result = frame[('sum', param)] / counts.where(counts > 0)
+        else:
+            result = frame[(stat, param)]
+        return result.rename(param)
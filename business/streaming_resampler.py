@@ -0,0 +1,119 @@
+# business/streaming_resampler.py
+import numpy as np
+import pandas as pd
+
+TIME_COLUMNS = ['timestamp', 'date', 'time']
+DATE_RANGE = ('2000-01-01', '2030-12-31')
+
+
+class StreamingResampler:
+    """Ресемплинг динамических данных по частям файла (по умолчанию - по суткам).
+
+    Поддерживаются шаги фиксированной длины ('min', 'h', 'D', '2D' и т.п.) и
+    недели с днем окончания ('W', 'W-MON'); месяцы и кварталы - нет.
+
+    Части подаются в порядке времени. Для каждого интервала копятся суммы и
+    количества значений, поэтому память зависит от числа интервалов, а не от
+    числа строк. Между частями переносится состояние открытого (последнего)
+    интервала: накопленные суммы и хэши строк для удаления дубликатов,
+    которые попали в разные части. Результат совпадает с resample(rule).mean()
+    и interpolate(method='time') над всем набором в памяти.
+    """
+
+    def __init__(self, time_col=None, rule='D'):
+        offset = pd.tseries.frequencies.to_offset(rule)
+        self._step = None     # Длина интервала фиксированной длины
+        self._weekday = None  # День окончания недели для 'W'
+        # В pandas 3 Day не является Tick, поэтому проверяются оба типа
+        if isinstance(offset, pd.offsets.Day):
+            self._step = pd.Timedelta(days=offset.n)
+        elif isinstance(offset, pd.offsets.Tick):
+            self._step = pd.Timedelta(offset)
+        elif isinstance(offset, pd.offsets.Week) and offset.n == 1 and offset.weekday is not None:
+            self._weekday = offset.weekday
+        else:
+            raise ValueError(f"Потоковый ресемплинг не поддерживает шаг {rule}")
+        self.rule = rule
+        self._origin = None
+        self.time_col = time_col
+        self.numeric_cols = None
+        self._sums = None
+        self._counts = None
+        self._open_bin = None
+        self._open_hashes = set()
+        self.rows_seen = 0
+
+    def _row_hashes(self, chunk):
+        """Хэши строк; числовые столбцы приводятся к float64, чтобы понижение
+        типов в разных частях не влияло на сравнение"""
+        normalized = chunk.copy()
+        for col in normalized.select_dtypes(include=np.number).columns:
+            normalized[col] = normalized[col].astype(np.float64)
+        return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+    def update(self, chunk):
+        """Добавляет очередную часть данных"""
+        self.rows_seen += len(chunk)
+        if self.time_col is None:
+            self.time_col = next((col for col in TIME_COLUMNS if col in chunk.columns), None)
+            if self.time_col is None:
+                raise ValueError("Не найден столбец времени")
+
+        # Дубликаты внутри части и с открытым интервалом предыдущей части
+        hashes = self._row_hashes(chunk)
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        if self._open_hashes:
+            keep &= ~np.isin(hashes, list(self._open_hashes))
+        chunk, hashes = chunk[keep], hashes[keep]
+
+        times = pd.to_datetime(chunk[self.time_col], errors='coerce')
+        valid = (times.notna() & times.between(*DATE_RANGE)).to_numpy()
+        chunk, hashes, times = chunk[valid], hashes[valid], times[valid]
+        if chunk.empty:
+            return
+
+        if self.numeric_cols is None:
+            self.numeric_cols = [
+                col for col in chunk.select_dtypes(include=np.number).columns
+                if col != self.time_col
+            ]
+
+        bins = self._bins(times)
+        values = chunk[self.numeric_cols].astype(np.float64)
+        grouped = values.groupby(bins.to_numpy())
+        sums, counts = grouped.sum(), grouped.count()
+        self._sums = sums if self._sums is None else self._sums.add(sums, fill_value=0)
+        self._counts = counts if self._counts is None else self._counts.add(counts, fill_value=0)
+
+        # Переносим хэши только последнего интервала - дубликат из следующей части
+        # при упорядоченных данных может относиться только к нему
+        last_bin = bins.max()
+        bin_hashes = set(hashes[(bins == last_bin).to_numpy()].tolist())
+        if last_bin == self._open_bin:
+            self._open_hashes |= bin_hashes
+        else:
+            self._open_bin, self._open_hashes = last_bin, bin_hashes
+
+    def _bins(self, times):
+        """Метки интервалов, как у resample(rule): интервалы фиксированной длины
+        отсчитываются от полуночи первого дня (origin='start_day'), неделя
+        помечается днем окончания и включает его целиком"""
+        if self._weekday is not None:
+            days = times.dt.normalize()
+            ahead = (self._weekday - days.dt.dayofweek) % 7
+            return days + pd.to_timedelta(ahead, unit='D')
+        if self._origin is None:
+            self._origin = times.min().normalize()
+        return self._origin + (times - self._origin) // self._step * self._step
+
+    def result(self):
+        """Средние по интервалам с интерполяцией пропущенных интервалов по времени"""
+        if self._sums is None:
+            return pd.DataFrame(columns=self.numeric_cols or [])
+
+        means = self._sums / self._counts.where(self._counts > 0)
+        full_range = pd.date_range(means.index.min(), means.index.max(),
+                                   freq=self._step if self._step is not None else self.rule)
+        means = means.reindex(full_range)
+        means.index.name = self.time_col
+        return means.interpolate(method='time')
@@ -0,0 +1,203 @@
+# cli.py
+"""Пакетный расчет без графического интерфейса.
+
+Пример:
+    python cli.py data/*.csv -c constraints.yaml -o results --format csv --db
+
+Для каждого файла выполняются предобработка, расчет индекса качества и
+метрик по партиям; результаты пишутся в каталог и/или в PostgreSQL.
+Файлы обрабатываются параллельно в пуле процессов. PyQt не импортируется.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from business.data_processor import DataProcessor
+from business.metrics_engine import BatchMetricsEngine, ALL_BATCHES
+from business.quality_calculator import QualityCalculator
+from business.streaming_resampler import StreamingResampler
+from data.data_manager import DataManager
+from data.database import json_safe
+from data.metrics_exporter import MetricsExporter, EXPORT_FORMATS
+from data.result_store import ResultStore
+
+CONSTRAINT_KEYS = {
+    'range': ('min', 'max'),
+    'min': ('value',),
+    'max': ('value',),
+    'fixed': ('value',),
+}
+
+
+def load_constraints(path):
+    """Ограничения из JSON или YAML в формате панели ограничений:
+    {параметр: {'type': 'range', 'min': ..., 'max': ...}} или
+    {параметр: {'type': 'min' | 'max' | 'fixed', 'value': ...}}"""
+    with open(path, encoding='utf-8') as f:
+        if str(path).lower().endswith(('.yaml', '.yml')):
+            import yaml
+            constraints = yaml.safe_load(f)
+        else:
+            constraints = json.load(f)
+
+    if not isinstance(constraints, dict) or not constraints:
+        raise ValueError("Файл ограничений должен содержать словарь параметр -> ограничение")
+    for param, config in constraints.items():
+        keys = CONSTRAINT_KEYS.get(config.get('type')) if isinstance(config, dict) else None
+        if keys is None:
+            raise ValueError(f"{param}: тип ограничения должен быть одним из {list(CONSTRAINT_KEYS)}")
+        missing = [key for key in keys if key not in config]
+        if missing:
+            raise ValueError(f"{param}: не заданы {', '.join(missing)}")
+        if config['type'] == 'range' and config['min'] > config['max']:
+            raise ValueError(f"{param}: минимум больше максимума")
+    return constraints
+
+
+def process_file(task):
+    """Рабочая функция пула: полный расчет одного файла.
+    Возвращает (путь, сводка, ошибка); ошибка одного файла не останавливает остальные."""
+    path, constraints, options = task
+    try:
+        analysis_type = options['analysis_type']
+        # По умолчанию читаются все столбцы, как в интерфейсе: метрики включают и
+        # параметры без ограничений. --constrained-only оставляет служебные
+        # столбцы и столбцы с ограничениями - остальные не разбираются вовсе
+        usecols = DataManager.constrained_columns(path, constraints, extra=(options['batch_col'],)) \
+            if options['constrained_only'] else None
+        if analysis_type == 'dynamic' and options['stream']:
+            df = DataProcessor.preprocess_stream(
+                DataManager.iter_chunks(path, usecols=usecols), resample_rule=options['resample']
+            )
+        else:
+            df = DataManager.load_data(path, usecols=usecols, use_cache=options['use_cache'])
+            df = DataProcessor.preprocess_data(df, analysis_type, resample_rule=options['resample'])
+
+        constraints = {p: c for p, c in constraints.items() if p in df.columns}
+        if not constraints:
+            raise ValueError("В файле нет параметров с ограничениями")
+
+        digest = ResultStore.data_digest(df)
+        quality_hash = ResultStore.content_key(df, constraints, analysis_type, 'quality_index', data_digest=digest)
+        metrics_hash = ResultStore.content_key(df, constraints, analysis_type, 'metrics_cube',
+                                               data_digest=digest, batch_col=options['batch_col'])
+
+        db = None
+        if options['db']:
+            from data.database import PostgreSQLManager
+            db = PostgreSQLManager()
+        try:
+            # Индекс качества дешевле поиска в базе и всегда рассчитывается заново;
+            # куб метрик для тех же данных и ограничений берется из базы
+            quality_index = QualityCalculator.calculate_quality_index(df, constraints, analysis_type)
+            quality = {
+                'quality_index': quality_index.to_dict(),
+                'best_worst': QualityCalculator.calculate_actual_best_worst(df, constraints),
+            }
+            cached_cube = db.load_results(metrics_hash) if db is not None else None
+            if cached_cube is not None:
+                cube = BatchMetricsEngine.cube_from_records(cached_cube['cube'])
+            else:
+                cube = BatchMetricsEngine.build_cube(df, constraints, batch_col=options['batch_col'])
+
+            if db is not None:
+                db.save_results(constraints, quality, analysis_type, commit=False, content_hash=quality_hash)
+                db.save_results(constraints, {'cube': BatchMetricsEngine.cube_to_records(cube)},
+                                analysis_type, commit=False, content_hash=metrics_hash)
+                db.conn.commit()
+        finally:
+            if db is not None:
+                db.close()
+
+        if options['output']:
+            out_dir = Path(options['output'])
+            out_dir.mkdir(parents=True, exist_ok=True)
+            stem = Path(path).stem
+            with open(out_dir / f"{stem}_quality.json", 'w', encoding='utf-8') as f:
+                # NaN -> null, значения numpy -> числа JSON
+                json.dump(json_safe(quality), f, ensure_ascii=False, indent=2)
+            batches = [b for b in cube.index.get_level_values('batch').unique()
+                       if b != ALL_BATCHES]
+            fmt = options['format']
+            # Файлы уже обрабатываются в пуле процессов - экспорт идет в этом же процессе
+            MetricsExporter.export(cube, batches, str(out_dir / f"{stem}_metrics.{fmt}"), fmt=fmt, workers=1)
+
+        values = list(quality['quality_index'].values())
+        summary = {
+            'rows': len(df),
+            'params': len(constraints),
+            'quality_index': sum(values) / len(values),
+        }
+        return path, summary, None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный расчет индекса качества без интерфейса")
+    parser.add_argument('files', nargs='+', help="Файлы данных (CSV, Excel, Parquet, Feather)")
+    parser.add_argument('-c', '--constraints', required=True, help="Ограничения в JSON или YAML")
+    parser.add_argument('-t', '--type', dest='analysis_type', choices=['static', 'dynamic'], default='static',
+                        help="Тип анализа")
+    parser.add_argument('-o', '--output', help="Каталог для результатов")
+    parser.add_argument('-f', '--format', choices=list(EXPORT_FORMATS), default='csv',
+                        help="Формат выгрузки метрик")
+    parser.add_argument('--db', action='store_true', help="Сохранять результаты в PostgreSQL")
+    parser.add_argument('-j', '--workers', type=int, default=int(os.getenv("QC_CLI_WORKERS", "0")) or None,
+                        help="Число процессов (по умолчанию - все ядра)")
+    parser.add_argument('--resample', default='D', help="Шаг ресемплинга динамических данных")
+    parser.add_argument('--stream', action='store_true',
+                        help="Динамические данные читать по частям (файл упорядочен по времени)")
+    parser.add_argument('--batch-col', default='batch_id', help="Столбец партии")
+    parser.add_argument('--constrained-only', action='store_true',
+                        help="Читать только служебные столбцы и столбцы с ограничениями "
+                             "(метрики параметров без ограничений не рассчитываются)")
+    parser.add_argument('--no-cache', action='store_true', help="Не использовать кэш разобранных файлов")
+    args = parser.parse_args(argv)
+    if not args.output and not args.db:
+        parser.error("укажите --output и/или --db")
+    if args.stream:
+        try:
+            StreamingResampler(rule=args.resample)
+        except ValueError as e:
+            parser.error(f"--resample: {e}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    constraints = load_constraints(args.constraints)
+    options = {
+        'analysis_type': args.analysis_type,
+        'output': args.output,
+        'format': args.format,
+        'db': args.db,
+        'resample': args.resample,
+        'stream': args.stream,
+        'batch_col': args.batch_col,
+        'constrained_only': args.constrained_only,
+        'use_cache': not args.no_cache,
+    }
+    tasks = [(path, constraints, options) for path in args.files]
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=min(args.workers or os.cpu_count() or 1, len(tasks))) as executor:
+        futures = [executor.submit(process_file, task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), start=1):
+            path, summary, error = future.result()
+            if error is not None:
+                failed += 1
+                print(f"[{done}/{len(tasks)}] {path}: ошибка: {error}", file=sys.stderr)
+            else:
+                print(f"[{done}/{len(tasks)}] {path}: строк {summary['rows']}, "
+                      f"параметров {summary['params']}, индекс качества {summary['quality_index']:.4f}")
+
+    print(f"Обработано файлов: {len(tasks) - failed}, с ошибками: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,207 @@
+import numpy as np
 import pandas as pd
 
+from data.dataset_cache import DatasetCache
+
+SERVICE_COLUMNS = ['id', 'timestamp', 'time', 'date', 'batch_id', 'product_id']
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.feather', '.arrow', '.ipc')
+
+
 class DataManager:
+    DEFAULT_CHUNKSIZE = 200_000
+    STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024  # Файлы крупнее читаются по частям
+    CATEGORY_MAX_RATIO = 0.5  # Доля уникальных значений, ниже которой строки -> category
+
+    _cache = None
+
+    @staticmethod
+    def get_cache():
+        """Общий для процесса кэш разобранных файлов"""
+        if DataManager._cache is None:
+            DataManager._cache = DatasetCache()
+        return DataManager._cache
+
+    @staticmethod
+    def load_data(file_path, usecols=None, chunksize=None, on_chunk=None, use_cache=True):
+        """Загрузка файла целиком или по частям.
+
+        Parquet и Feather/Arrow IPC читаются напрямую. CSV и Excel после
+        разбора сохраняются в колоночный кэш, и повторное открытие того же
+        файла читает кэш вместо разбора.
+
+        Если задан chunksize, файл читается частями с понижением типов,
+        on_chunk(partial_df, rows_loaded) вызывается после каждой части
+        (первая часть подходит для предпросмотра), а итоговый DataFrame
+        собирается из частей. usecols ограничивает набор читаемых столбцов.
+        """
+        lower_path = file_path.lower()
+        if lower_path.endswith(PARQUET_EXTENSIONS + ARROW_EXTENSIONS):
+            if chunksize is None:
+                df = DataManager._read_columnar(file_path, usecols)
+                if on_chunk is not None:
+                    on_chunk(df, len(df))
+                return df
+            return DataManager._load_chunked(file_path, usecols, chunksize, on_chunk)
+
+        cache = DataManager.get_cache() if use_cache else None
+        if cache is not None:
+            df = cache.get(file_path, columns=usecols)
+            if df is not None:
+                if on_chunk is not None:
+                    on_chunk(df, len(df))
+                return df
+
+        if chunksize is None:
+            if lower_path.endswith('.csv'):
+                df = pd.read_csv(file_path, usecols=usecols)
+            else:
+                df = pd.read_excel(file_path, usecols=usecols)
+        else:
+            df = DataManager._load_chunked(file_path, usecols, chunksize, on_chunk)
+
+        # В кэш попадает только полный набор столбцов
+        if cache is not None and usecols is None:
+            cache.put(file_path, df)
+        return df
+
     @staticmethod
-    def load_data(file_path):
-        if file_path.endswith('.csv'):
-            return pd.read_csv(file_path)
+    def _load_chunked(file_path, usecols, chunksize, on_chunk):
+        chunks = []
+        rows_loaded = 0
+        for chunk in DataManager.iter_chunks(file_path, chunksize=chunksize, usecols=usecols):
+            chunks.append(chunk)
+            rows_loaded += len(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk, rows_loaded)
+        return DataManager._concat_chunks(chunks)
+
+    @staticmethod
+    def _read_columnar(file_path, usecols):
+        """Чтение Parquet или Feather/Arrow IPC (последний - через memory map)"""
+        if file_path.lower().endswith(PARQUET_EXTENSIONS):
+            return pd.read_parquet(file_path, columns=usecols)
+        import pyarrow.feather as feather
+        return feather.read_table(file_path, columns=usecols, memory_map=True).to_pandas()
+
+    @staticmethod
+    def iter_chunks(file_path, chunksize=DEFAULT_CHUNKSIZE, usecols=None):
+        """Генератор частей файла с выведенными и пониженными типами"""
+        lower_path = file_path.lower()
+        if lower_path.endswith('.csv'):
+            reader = pd.read_csv(file_path, chunksize=chunksize, usecols=usecols)
+        elif lower_path.endswith(PARQUET_EXTENSIONS):
+            reader = DataManager._iter_parquet(file_path, chunksize, usecols)
+        elif lower_path.endswith(ARROW_EXTENSIONS):
+            df = DataManager._read_columnar(file_path, usecols)
+            reader = (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
         else:
-            return pd.read_excel(file_path)
\ No newline at end of file
+            reader = DataManager._iter_excel(file_path, chunksize, usecols)
+
+        for chunk in reader:
+            yield DataManager.downcast(chunk)
+
+    @staticmethod
+    def _iter_parquet(file_path, chunksize, usecols):
+        """Чтение Parquet пакетами строк"""
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize, columns=usecols):
+            yield batch.to_pandas()
+
+    @staticmethod
+    def _iter_excel(file_path, chunksize, usecols):
+        """Потоковое чтение первого листа Excel через openpyxl в режиме read_only"""
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [str(name) for name in header]
+            positions = list(range(len(header))) if usecols is None else \
+                [header.index(name) for name in usecols]
+            columns = [header[i] for i in positions]
+
+            buffer = []
+            for row in rows:
+                buffer.append([row[i] if i < len(row) else None for i in positions])
+                if len(buffer) >= chunksize:
+                    yield DataManager._excel_frame(buffer, columns)
+                    buffer = []
+            if buffer:
+                yield DataManager._excel_frame(buffer, columns)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _excel_frame(rows, columns):
+        """Строки листа -> DataFrame с выводом типов, как у read_excel"""
+        return pd.DataFrame(rows, columns=columns).infer_objects()
+
+    @staticmethod
+    def downcast(df):
+        """Понижает типы без потери точности: целые - до минимальной разрядности,
+        float64 - до float32 только если значения представимы точно,
+        строки с малым числом уникальных значений - в category."""
+        for col in df.columns:
+            values = df[col]
+            if pd.api.types.is_bool_dtype(values):
+                continue
+            if pd.api.types.is_integer_dtype(values):
+                df[col] = pd.to_numeric(values, downcast='integer')
+            elif pd.api.types.is_float_dtype(values) and values.dtype == np.float64:
+                as_float32 = values.to_numpy().astype(np.float32)
+                if np.array_equal(as_float32.astype(np.float64), values.to_numpy(), equal_nan=True):
+                    df[col] = as_float32
+            elif len(values) and str(col).lower() not in ('timestamp', 'time', 'date') \
+                    and (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+                if values.nunique(dropna=True) <= DataManager.CATEGORY_MAX_RATIO * len(values):
+                    df[col] = values.astype('category')
+        return df
+
+    @staticmethod
+    def _concat_chunks(chunks):
+        """Склеивает части, объединяя категории столбцов типа category"""
+        if not chunks:
+            return pd.DataFrame()
+        if len(chunks) == 1:
+            return chunks[0]
+
+        categorical = [
+            col for col in chunks[0].columns
+            if all(isinstance(chunk[col].dtype, pd.CategoricalDtype) for chunk in chunks)
+        ]
+        merged = {
+            col: pd.api.types.union_categoricals([chunk[col] for chunk in chunks])
+            for col in categorical
+        }
+        df = pd.concat(chunks, ignore_index=True)
+        for col, values in merged.items():
+            df[col] = values
+        return df
+
+    @staticmethod
+    def read_columns(file_path):
+        """Читает только заголовок файла"""
+        lower_path = file_path.lower()
+        if lower_path.endswith('.csv'):
+            return list(pd.read_csv(file_path, nrows=0).columns)
+        elif lower_path.endswith(PARQUET_EXTENSIONS):
+            import pyarrow.parquet as pq
+            return list(pq.read_schema(file_path).names)
+        elif lower_path.endswith(ARROW_EXTENSIONS):
+            import pyarrow.feather as feather
+            return list(feather.read_table(file_path, memory_map=True).column_names)
+        else:
+            return list(pd.read_excel(file_path, nrows=0).columns)
+
+    @staticmethod
+    def constrained_columns(file_path, constraints, extra=()):
+        """Служебные столбцы, столбцы с ограничениями и extra, присутствующие в файле"""
+        return [
+            col for col in DataManager.read_columns(file_path)
+            if str(col).lower() in SERVICE_COLUMNS or col in constraints or col in extra
+        ]
@@ -1,32 +1,134 @@
 # data/database.py
 import psycopg2
-from psycopg2 import sql, errors
+import psycopg2.extras
+from psycopg2 import sql, errors, pool
 import pandas as pd
+import numpy as np
+import io
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from typing import Optional
 
 # Загрузка переменных окружения из .env файла
 load_dotenv()
 
+# Пул соединений общий для всего процесса и создается при первом обращении,
+# чтобы запуск приложения не ждал базу данных
+_pool: Optional[pool.ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+_schema_ready = False
+_last_used = {}  # id(соединения) -> время последнего возврата в пул
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "30"))
+
+
+def json_safe(value):
+    """Приводит значения numpy/pandas к типам JSON; NaN -> null (JSONB не принимает NaN)"""
+    if isinstance(value, dict):
+        return {str(k): json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(v) for v in value]
+    if isinstance(value, (pd.Timestamp, np.datetime64)) or value is pd.NaT:
+        # До item(): datetime64[ns] превращается в целое число наносекунд
+        return None if pd.isna(value) else str(pd.Timestamp(value))
+    if value is pd.NA:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def get_pool() -> pool.ThreadedConnectionPool:
+    """Вернуть пул соединений, создав его при первом вызове"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            try:
+                _pool = pool.ThreadedConnectionPool(
+                    minconn=int(os.getenv("DB_POOL_MIN", "1")),
+                    maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+                    host=os.getenv("DB_HOST"),
+                    port=os.getenv("DB_PORT"),
+                    dbname=os.getenv("DB_NAME"),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    connect_timeout=int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+                )
+            except psycopg2.OperationalError as e:
+                raise ConnectionError(f"Ошибка подключения к PostgreSQL: {str(e)}") from e
+        return _pool
+
+
+def close_pool() -> None:
+    """Закрыть все соединения пула (при завершении приложения)"""
+    global _pool, _schema_ready
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _schema_ready = False
+        _last_used.clear()
+
+
 class PostgreSQLManager:
     def __init__(self):
         self.conn: Optional[psycopg2.extensions.connection] = None
+        self._pool: Optional[pool.ThreadedConnectionPool] = None
         self._connect()
-        self._create_tables()
+        try:
+            self._ensure_schema()
+        except Exception:
+            self.close()
+            raise
 
     def _connect(self) -> None:
-        """Установить соединение с PostgreSQL"""
+        """Взять проверенное соединение из пула"""
+        self._pool = get_pool()
+        # Одна повторная попытка: соединение из пула могло быть разорвано сервером
+        for attempt in range(2):
+            try:
+                conn = self._pool.getconn()
+            except pool.PoolError as e:
+                raise ConnectionError(f"Нет свободных соединений с PostgreSQL: {str(e)}") from e
+            except psycopg2.OperationalError as e:
+                raise ConnectionError(f"Ошибка подключения к PostgreSQL: {str(e)}") from e
+
+            if self._is_healthy(conn):
+                self.conn = conn
+                return
+            self._pool.putconn(conn, close=True)
+            _last_used.pop(id(conn), None)
+
+        raise ConnectionError("Ошибка подключения к PostgreSQL: соединение недоступно")
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        """Проверка соединения; запрос к серверу - только после долгого простоя"""
+        if conn.closed:
+            return False
+        if time.monotonic() - _last_used.get(id(conn), 0.0) < HEALTH_CHECK_INTERVAL:
+            return True
         try:
-            self.conn = psycopg2.connect(
-                host=os.getenv("DB_HOST"),
-                port=os.getenv("DB_PORT"),
-                dbname=os.getenv("DB_NAME"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD")
-            )
-        except psycopg2.OperationalError as e:
-            raise ConnectionError(f"Ошибка подключения к PostgreSQL: {str(e)}") from e
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _ensure_schema(self) -> None:
+        """Создать таблицы один раз на процесс"""
+        global _schema_ready
+        if _schema_ready:
+            return
+        with _pool_lock:
+            if not _schema_ready:
+                self._create_tables()
+                _schema_ready = True
 
     def _create_tables(self) -> None:
         """Создать таблицы для сырых данных и результатов"""
@@ -53,11 +155,62 @@ class PostgreSQLManager:
                     );
                 """)
                 
+                # Нормализованное хранение: заголовок загрузки и измерения в длинном формате
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS uploads (
+                        id SERIAL PRIMARY KEY,
+                        upload_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        analysis_type VARCHAR(7) NOT NULL CHECK (analysis_type IN ('static', 'dynamic')),
+                        columns JSONB NOT NULL,
+                        row_count BIGINT NOT NULL DEFAULT 0
+                    );
+                """)
+
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS measurements (
+                        upload_id INTEGER NOT NULL REFERENCES uploads (id) ON DELETE CASCADE,
+                        row_num BIGINT NOT NULL,
+                        batch_id TEXT,
+                        product_id TEXT,
+                        timestamp TIMESTAMP,
+                        param TEXT NOT NULL,
+                        value DOUBLE PRECISION,
+                        value_text TEXT
+                    );
+                """)
+
                 # Индексы для оптимизации
                 cursor.execute("""
                     CREATE INDEX IF NOT EXISTS idx_raw_data_type 
                     ON raw_data (analysis_type);
                 """)
+
+                # Результаты адресуются хэшем содержимого данных и ограничений
+                cursor.execute("""
+                    ALTER TABLE analysis_results
+                    ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+                """)
+
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_analysis_results_hash
+                    ON analysis_results (content_hash);
+                """)
+
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_analysis_results_parameters
+                    ON analysis_results USING GIN (parameters jsonb_path_ops);
+                """)
+
+                # Исходные имена служебных столбцов и типы столбцов загрузки
+                cursor.execute("""
+                    ALTER TABLE uploads
+                    ADD COLUMN IF NOT EXISTS layout JSONB;
+                """)
+
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_measurements_upload_batch_ts
+                    ON measurements (upload_id, batch_id, timestamp);
+                """)
                 
                 self.conn.commit()
                 
@@ -65,10 +218,25 @@ class PostgreSQLManager:
             self.conn.rollback()
             raise RuntimeError(f"Ошибка создания таблиц: {str(e)}") from e
 
-    def save_raw_data(self, df: pd.DataFrame, analysis_type: str) -> None:
-        """Сохранение сырых данных с указанием типа анализа"""
+    COPY_CHUNK_ROWS = 100_000  # Строк исходной таблицы на один буфер COPY
+    MEASUREMENT_COLUMNS = ('upload_id', 'row_num', 'batch_id', 'product_id',
+                           'timestamp', 'param', 'value', 'value_text')
+
+    def save_raw_data(self, df: pd.DataFrame, analysis_type: str,
+                      storage: str = 'normalized', commit: bool = True) -> Optional[int]:
+        """Сохранение сырых данных с указанием типа анализа.
+
+        storage='normalized' - строки загружаются в таблицу measurements через
+        COPY FROM STDIN, возвращается id загрузки. storage='jsonb' - прежний
+        режим: весь DataFrame одним значением JSONB в raw_data.
+        commit=False оставляет транзакцию открытой для пакетной записи.
+        """
         if analysis_type not in ('static', 'dynamic'):
             raise ValueError("Недопустимый тип анализа. Допустимые значения: 'static', 'dynamic'")
+        if storage == 'normalized':
+            return self._copy_raw_data(df, analysis_type, commit)
+        if storage != 'jsonb':
+            raise ValueError("Недопустимый режим хранения. Допустимые значения: 'normalized', 'jsonb'")
 
         try:
             data_json = df.to_json(orient='records', date_format='iso')
@@ -81,37 +249,226 @@ class PostgreSQLManager:
                     """),
                     (analysis_type, data_json)
                 )
-                self.conn.commit()
+                if commit:
+                    self.conn.commit()
                 
         except psycopg2.Error as e:
             self.conn.rollback()
             raise RuntimeError(f"Ошибка сохранения данных: {str(e)}") from e
+        return None
+
+    def _copy_raw_data(self, df: pd.DataFrame, analysis_type: str, commit: bool = True) -> int:
+        """Загрузка строк в measurements потоком CSV через COPY.
+
+        Партия, изделие и время хранятся в отдельных столбцах measurements,
+        остальные столбцы (включая исходный id) - парами param/value. Исходные
+        имена служебных столбцов и типы сохраняются в uploads.layout.
+        """
+        batch_col = next((c for c in df.columns if str(c).lower() in ('batch_id', 'batch')), None)
+        product_col = next((c for c in df.columns if str(c).lower() == 'product_id'), None)
+        time_col = next((c for c in df.columns if str(c).lower() in ('timestamp', 'date', 'time')), None)
+        service = {c for c in (batch_col, product_col, time_col) if c is not None}
+        params = [c for c in df.columns if c not in service]
+        numeric = [c for c in params if pd.api.types.is_numeric_dtype(df[c])]
+        text = [c for c in params if c not in numeric]
+        layout = {
+            'keys': {
+                'batch_id': None if batch_col is None else str(batch_col),
+                'product_id': None if product_col is None else str(product_col),
+                'timestamp': None if time_col is None else str(time_col),
+            },
+            'dtypes': {str(c): str(df[c].dtype) for c in df.columns},
+        }
+
+        copy_sql = sql.SQL("COPY measurements ({}) FROM STDIN WITH (FORMAT csv)").format(
+            sql.SQL(', ').join(map(sql.Identifier, self.MEASUREMENT_COLUMNS))
+        )
+
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                        INSERT INTO uploads (analysis_type, columns, row_count, layout)
+                        VALUES (%s, %s, %s, %s)
+                        RETURNING id
+                    """,
+                    (analysis_type, psycopg2.extras.Json([str(c) for c in df.columns]), len(df),
+                     psycopg2.extras.Json(layout))
+                )
+                upload_id = cursor.fetchone()[0]
+
+                for start in range(0, len(df), self.COPY_CHUNK_ROWS):
+                    chunk = df.iloc[start:start + self.COPY_CHUNK_ROWS]
+                    buffer = self._measurements_csv(
+                        chunk, upload_id, start, batch_col, product_col, time_col, numeric, text
+                    )
+                    cursor.copy_expert(copy_sql.as_string(self.conn), buffer)
+
+                if commit:
+                    self.conn.commit()
+                return upload_id
+
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            raise RuntimeError(f"Ошибка сохранения данных: {str(e)}") from e
+
+    @staticmethod
+    def _measurements_csv(chunk, upload_id, start, batch_col, product_col, time_col, numeric, text):
+        """Часть DataFrame -> CSV-буфер строк measurements (строка на пару строка x параметр).
+        Пропуски записываются пустым полем - COPY читает его как NULL"""
+        def as_text(values):
+            return values.astype(str).where(values.notna(), None).to_numpy()
+
+        keys = pd.DataFrame({
+            'upload_id': upload_id,
+            'row_num': np.arange(start, start + len(chunk)),
+            'batch_id': as_text(chunk[batch_col]) if batch_col is not None else None,
+            'product_id': as_text(chunk[product_col]) if product_col is not None else None,
+            'timestamp': pd.to_datetime(chunk[time_col], errors='coerce').to_numpy() if time_col is not None else None,
+        })
+
+        parts = []
+        if numeric:
+            # bool (и nullable boolean/Int64) -> float: COPY в DOUBLE PRECISION не принимает True/False
+            numbers = pd.DataFrame(
+                chunk[numeric].to_numpy(dtype=np.float64, na_value=np.nan), columns=numeric
+            )
+            values = pd.concat([keys, numbers], axis=1)
+            values = values.melt(id_vars=list(keys.columns), var_name='param', value_name='value')
+            values['value_text'] = None
+            parts.append(values)
+        if text:
+            text_values = chunk[text].apply(lambda col: col.map(lambda v: v if pd.isna(v) else str(v)))
+            values = pd.concat([keys, text_values.reset_index(drop=True)], axis=1)
+            values = values.melt(id_vars=list(keys.columns), var_name='param', value_name='value_text')
+            values['value'] = None
+            parts.append(values)
+
+        buffer = io.StringIO()
+        if parts:
+            long = pd.concat(parts, ignore_index=True)
+            long[list(PostgreSQLManager.MEASUREMENT_COLUMNS)].to_csv(
+                buffer, header=False, index=False, date_format='%Y-%m-%d %H:%M:%S.%f'
+            )
+        buffer.seek(0)
+        return buffer
+
+    def load_raw_data(self, upload_id: int, batch_id: Optional[str] = None) -> pd.DataFrame:
+        """Чтение загрузки из measurements в исходном широком формате"""
+        query = """
+            SELECT row_num, batch_id, product_id, timestamp, param, value, value_text
+            FROM measurements
+            WHERE upload_id = %s
+        """
+        args = [upload_id]
+        if batch_id is not None:
+            query += " AND batch_id = %s"
+            args.append(batch_id)
+
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT columns, layout FROM uploads WHERE id = %s", (upload_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise ValueError(f"Загрузка {upload_id} не найдена")
+                columns, layout = row
+                cursor.execute(query, args)
+                rows = cursor.fetchall()
+            self.conn.commit()
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            raise RuntimeError(f"Ошибка чтения данных: {str(e)}") from e
+
+        return PostgreSQLManager._wide_frame(rows, columns, layout)
+
+    @staticmethod
+    def _wide_frame(rows, columns, layout=None):
+        """Строки measurements -> исходная широкая таблица: имена служебных
+        столбцов и целочисленные типы восстанавливаются по layout загрузки"""
+        long = pd.DataFrame(rows, columns=['row_num', 'batch_id', 'product_id', 'timestamp',
+                                           'param', 'value', 'value_text'])
+        long['value'] = long['value'].where(long['value_text'].isna(), long['value_text'])
+
+        keys = long.drop_duplicates('row_num').set_index('row_num')[['batch_id', 'product_id', 'timestamp']]
+        if layout:
+            names = {key: name for key, name in layout['keys'].items() if name is not None}
+            keys = keys[list(names)].rename(columns=names)
+        else:
+            # Загрузки без layout: служебные столбцы под именами measurements
+            keys = keys.dropna(axis=1, how='all')
+        wide = long.pivot(index='row_num', columns='param', values='value')
+        wide = wide[[c for c in columns if c in wide.columns]].infer_objects()
+        df = keys.join(wide).sort_index().reset_index(drop=True).rename_axis(columns=None)
+
+        if layout:
+            df = df[[c for c in columns if c in df.columns]]
+            for col, dtype in layout['dtypes'].items():
+                # Числа хранятся в DOUBLE PRECISION (bool - как 0/1): целые и bool
+                # возвращаются к исходному типу. Типы numpy - только без пропусков,
+                # nullable (Int64, boolean) принимают пропуски
+                if col not in wide.columns:
+                    continue
+                nullable = dtype.startswith(('Int', 'UInt')) or dtype == 'boolean'
+                if nullable or (dtype.startswith(('int', 'uint', 'bool')) and not df[col].isna().any()):
+                    df[col] = df[col].astype(dtype)
+        return df
 
-    def save_results(self, params: dict, results: dict, analysis_type: str) -> None:
-        """Сохранение результатов расчета"""
+    def save_results(self, params: dict, results: dict, analysis_type: str, commit: bool = True,
+                     content_hash: Optional[str] = None) -> None:
+        """Сохранение результатов расчета; повторный результат с тем же хэшем не дублируется"""
         try:
             with self.conn.cursor() as cursor:
                 cursor.execute(
                     sql.SQL("""
                         INSERT INTO analysis_results 
-                            (analysis_type, parameters, results)
-                        VALUES (%s, %s, %s)
+                            (analysis_type, parameters, results, content_hash)
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (content_hash) DO NOTHING
                     """),
                     (analysis_type, 
-                     psycopg2.extras.Json(params), 
-                     psycopg2.extras.Json(results))
+                     psycopg2.extras.Json(json_safe(params)), 
+                     psycopg2.extras.Json(json_safe(results)),
+                     content_hash)
                 )
-                self.conn.commit()
+                if commit:
+                    self.conn.commit()
                 
         except psycopg2.Error as e:
             self.conn.rollback()
             raise RuntimeError(f"Ошибка сохранения результатов: {str(e)}") from e
 
+    def load_results(self, content_hash: str) -> Optional[dict]:
+        """Результаты расчета по хэшу содержимого или None"""
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT results FROM analysis_results WHERE content_hash = %s",
+                    (content_hash,)
+                )
+                row = cursor.fetchone()
+            self.conn.commit()
+            return row[0] if row else None
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            raise RuntimeError(f"Ошибка чтения результатов: {str(e)}") from e
+
     def close(self) -> None:
-        """Безопасное закрытие соединения"""
-        if self.conn and not self.conn.closed:
-            self.conn.close()
-            self.conn = None
+        """Вернуть соединение в пул"""
+        conn, self.conn = self.conn, None
+        if conn is None or self._pool is None or self._pool.closed:
+            return
+        try:
+            broken = bool(conn.closed)
+            if not broken and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            self._pool.putconn(conn, close=broken)
+            if broken:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+        except (psycopg2.Error, pool.PoolError):
+            _last_used.pop(id(conn), None)
+            self._pool.putconn(conn, close=True)
 
     def __enter__(self):
         return self
@@ -120,4 +477,7 @@ class PostgreSQLManager:
         self.close()
 
     def __del__(self):
-        self.close()
\ No newline at end of file
+        try:
+            self.close()
+        except Exception:
+            pass
\ No newline at end of file
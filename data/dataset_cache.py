@@ -0,0 +1,85 @@
+# data/dataset_cache.py
+import hashlib
+import os
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # Без pyarrow кэш просто отключен
+    pa = None
+    feather = None
+
+
+class DatasetCache:
+    """Локальный колоночный кэш разобранных файлов в формате Arrow IPC (Feather v2).
+
+    Ключ - путь к файлу, время изменения и размер, поэтому измененный файл
+    разбирается заново. Файлы кэша пишутся без сжатия и читаются через
+    memory map. Общий размер ограничен, при переполнении удаляются давно
+    не использованные записи (LRU по времени последнего обращения).
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = Path(cache_dir or os.getenv(
+            "QC_CACHE_DIR", Path.home() / ".cache" / "quality_control" / "datasets"
+        ))
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(os.getenv("QC_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+    @property
+    def enabled(self):
+        return feather is not None and self.max_bytes > 0
+
+    def _entry_path(self, file_path):
+        stat = os.stat(file_path)
+        key = f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+        return self.cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.arrow"
+
+    def get(self, file_path, columns=None):
+        """Возвращает DataFrame из кэша или None, если записи нет"""
+        if not self.enabled:
+            return None
+        entry = self._entry_path(file_path)
+        if not entry.exists():
+            return None
+        try:
+            table = feather.read_table(entry, columns=columns, memory_map=True)
+            os.utime(entry)  # Отметка последнего обращения для LRU
+            return table.to_pandas()
+        except (OSError, pa.ArrowException, KeyError):
+            entry.unlink(missing_ok=True)
+            return None
+
+    def put(self, file_path, df):
+        """Сохраняет разобранный DataFrame; ошибки записи кэша не критичны"""
+        if not self.enabled:
+            return
+        entry = self._entry_path(file_path)
+        tmp = entry.with_suffix('.tmp')
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            feather.write_feather(df.reset_index(drop=True), tmp, compression='uncompressed')
+            if tmp.stat().st_size > self.max_bytes:
+                tmp.unlink()
+                return
+            os.replace(tmp, entry)
+        except (OSError, pa.ArrowException, ValueError, TypeError):
+            tmp.unlink(missing_ok=True)
+            return
+        self._evict()
+
+    def _evict(self):
+        """Удаляет самые старые записи, пока кэш не уложится в лимит"""
+        entries = sorted(self.cache_dir.glob('*.arrow'), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            entry.unlink(missing_ok=True)
+
+    def clear(self):
+        """Полная очистка кэша"""
+        for entry in self.cache_dir.glob('*.arrow'):
+            entry.unlink(missing_ok=True)
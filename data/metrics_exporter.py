@@ -0,0 +1,153 @@
+# data/metrics_exporter.py
+import io
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from business.metrics_engine import BatchMetricsEngine, ALL_BATCHES
+
+# Форматы выгрузки: ключ -> (подпись в интерфейсе, фильтр диалога сохранения)
+EXPORT_FORMATS = {
+    'zip': ("ZIP: Excel по партиям", "ZIP Archives (*.zip)"),
+    'xlsx': ("Одна книга Excel", "Excel Files (*.xlsx)"),
+    'csv': ("CSV (все партии)", "CSV Files (*.csv)"),
+    'parquet': ("Parquet (все партии)", "Parquet Files (*.parquet)"),
+}
+
+EXCEL_MAX_ROWS = 1_048_575  # Лимит строк листа Excel без заголовка
+
+
+def sanitize_filename(name):
+    """Очищает имя файла от недопустимых символов"""
+    cleaned = re.sub(r'[\\/*?:"<>|]', "_", str(name))
+    return cleaned[:50].strip()
+
+
+def _serialize_batch(task):
+    """Рабочая функция пула: метрики партии -> байты .xlsx"""
+    batch, batch_cube = task
+    df = BatchMetricsEngine.batch_frame(batch_cube, batch)
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine='openpyxl')
+    return batch, buffer.getvalue()
+
+
+class ExportCancelled(Exception):
+    """Экспорт прерван пользователем"""
+
+
+class MetricsExporter:
+    """Выгрузка куба метрик по партиям в ZIP, одну книгу Excel, CSV или Parquet"""
+
+    @staticmethod
+    def export(cube, batches, path, fmt='zip', include_all=True, workers=None,
+               progress=None, is_cancelled=None):
+        """Экспортирует метрики партий в файл path. Возвращает число выгруженных партий.
+
+        Для ZIP партии сериализуются в пуле из workers процессов; workers=1 -
+        в текущем процессе, без пула (например, внутри рабочего процесса).
+        progress(done, total, label) вызывается по мере готовности партий,
+        is_cancelled() опрашивается между партиями; при отмене частично
+        записанный файл удаляется и выбрасывается ExportCancelled.
+        """
+        progress = progress or (lambda done, total, label: None)
+        is_cancelled = is_cancelled or (lambda: False)
+        batches = list(batches) + ([ALL_BATCHES] if include_all else [])
+
+        try:
+            if fmt == 'zip':
+                return MetricsExporter._export_zip(cube, batches, path, workers, progress, is_cancelled)
+            if fmt in ('xlsx', 'csv', 'parquet'):
+                return MetricsExporter._export_table(cube, batches, path, fmt, progress, is_cancelled)
+            raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+        except ExportCancelled:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    @staticmethod
+    def _export_zip(cube, batches, path, workers, progress, is_cancelled):
+        """Партии сериализуются в пуле процессов и сразу пишутся в архив без временных файлов"""
+        parts = dict(iter(cube.groupby(level='batch', sort=False)))
+        tasks = ((batch, parts[batch]) for batch in batches)
+        used_names = set()
+        total = len(batches)
+
+        def write(results):
+            for done, (batch, data) in enumerate(results, start=1):
+                if is_cancelled():
+                    raise ExportCancelled()
+
+                name = "Все_партии" if batch == ALL_BATCHES else sanitize_filename(batch)
+                unique_name, suffix = name, 2
+                while unique_name in used_names:
+                    unique_name, suffix = f"{name}_{suffix}", suffix + 1
+                used_names.add(unique_name)
+
+                zipf.writestr(f"{unique_name}.xlsx", data)
+                progress(done, total, f"Обработка партии: {batch}...")
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            if workers is not None and workers <= 1:
+                write(map(_serialize_batch, tasks))
+                return total
+
+            # spawn, а не fork: экспорт запускается из рабочего потока процесса
+            # с Qt, и fork копирует захваченные другими потоками блокировки
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                try:
+                    write(executor.map(_serialize_batch, tasks, chunksize=8))
+                except ExportCancelled:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+        return total
+
+    @staticmethod
+    def long_frame(cube, batches):
+        """Все метрики в длинном формате: строка на пару (партия, параметр)"""
+        frame = cube.loc[batches].reset_index()
+        frame = frame.rename(columns={'batch': 'Партия', 'param': 'Параметр'})
+
+        # Приводим столбцы к однородным типам для CSV/Parquet
+        for column in frame.columns:
+            if column in ('Партия', 'Параметр', 'Тип данных'):
+                continue
+            if column == 'Самая частая категория':
+                frame[column] = frame[column].map(lambda v: v if pd.isna(v) else str(v))
+            else:
+                frame[column] = pd.to_numeric(frame[column].map(
+                    lambda v: float(v) if isinstance(v, bool) else v
+                ), errors='coerce')
+        return frame.dropna(axis=1, how='all')
+
+    @staticmethod
+    def _export_table(cube, batches, path, fmt, progress, is_cancelled):
+        total = len(batches)
+        progress(0, total, "Подготовка данных...")
+        frame = MetricsExporter.long_frame(cube, batches)
+        if is_cancelled():
+            raise ExportCancelled()
+
+        if fmt == 'csv':
+            frame.to_csv(path, index=False, encoding='utf-8-sig')
+        elif fmt == 'parquet':
+            frame.to_parquet(path, index=False)
+        else:
+            # Лист Excel ограничен по числу строк - большие выгрузки делятся на листы
+            with pd.ExcelWriter(path, engine='openpyxl') as writer:
+                for sheet, start in enumerate(range(0, max(len(frame), 1), EXCEL_MAX_ROWS), start=1):
+                    if is_cancelled():
+                        raise ExportCancelled()
+                    part = frame.iloc[start:start + EXCEL_MAX_ROWS]
+                    part.to_excel(writer, sheet_name=f"Метрики_{sheet}", index=False)
+                    progress(min(total, (start + len(part)) * total // max(len(frame), 1)),
+                             total, f"Запись листа {sheet}...")
+
+        progress(total, total, "Готово")
+        return total
@@ -0,0 +1,364 @@
+# data/persistence_queue.py
+import logging
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import deque
+from itertools import count
+from pathlib import Path
+
+import psycopg2
+
+from data.database import PostgreSQLManager
+
+logger = logging.getLogger(__name__)
+
+
+def _is_transient(error):
+    """Ошибка связана с недоступностью базы, и запись стоит повторить"""
+    if isinstance(error, (ConnectionError, psycopg2.OperationalError, psycopg2.InterfaceError)):
+        return True
+    cause = error.__cause__
+    return isinstance(cause, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+class PersistenceQueue:
+    """Фоновая запись в PostgreSQL через ограниченную очередь.
+
+    Задания из очереди пишутся пакетами в одной транзакции. При недоступной
+    базе запись повторяется с экспоненциальной задержкой, после исчерпания
+    попыток задания сохраняются в локальный журнал на диске и переигрываются,
+    когда соединение восстанавливается. Задания, которые база отвергла
+    (ошибка не связана с соединением), переносятся в подкаталог failed
+    журнала для разбора и не переигрываются.
+
+    При запуске поток один раз проверяет соединение; пока база недоступна,
+    задания сразу уходят в журнал, а запись пробуется одной попыткой без
+    повторов не чаще, чем позволяет растущая задержка.
+
+    Все обращения к диску выполняются в рабочем потоке. Раз в
+    QC_QUEUE_STATS_INTERVAL секунд (по умолчанию 60) поток пишет в лог
+    метрики очереди, если они изменились.
+    """
+
+    def __init__(self, maxsize=100, batch_size=10, max_retries=3, base_delay=0.5,
+                 max_delay=30.0, journal_dir=None, manager_factory=PostgreSQLManager):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._overflow = deque()  # Задания сверх maxsize, ждут записи в журнал рабочим потоком
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.journal_dir = Path(journal_dir or os.getenv(
+            "QC_JOURNAL_DIR", Path.home() / ".cache" / "quality_control" / "journal"
+        ))
+        self._manager_factory = manager_factory
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._sequence = count()
+        self.stats_interval = float(os.getenv("QC_QUEUE_STATS_INTERVAL", "60"))
+        self._next_stats = time.monotonic() + self.stats_interval
+        self._logged_stats = None
+
+        # База считается недоступной, пока не пройдет первая проверка соединения
+        self._db_available = False
+        self._next_probe = 0.0
+        self._probe_delay = base_delay
+
+        self._stats = {
+            'written': 0,
+            'failed': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'last_latency': None,
+            'avg_latency': None,
+        }
+
+    # --- Публичный интерфейс -------------------------------------------------
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="persistence-queue", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit_raw_data(self, df, analysis_type, storage='normalized'):
+        """Поставить сохранение сырых данных в очередь (не блокирует вызывающий поток)"""
+        return self._submit({
+            'kind': 'raw_data',
+            'args': (df, analysis_type),
+            'kwargs': {'storage': storage},
+        })
+
+    def submit_results(self, params, results, analysis_type, **kwargs):
+        """Поставить сохранение результатов расчета в очередь"""
+        return self._submit({
+            'kind': 'results',
+            'args': (params, results, analysis_type),
+            'kwargs': kwargs,
+        })
+
+    @property
+    def db_available(self):
+        """Последняя попытка записи в базу прошла успешно"""
+        with self._lock:
+            return self._db_available
+
+    def stats(self):
+        """Метрики очереди: глубина, журнал, счетчики и задержка записи (с)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['db_available'] = self._db_available
+        stats['queue_depth'] = self._queue.qsize() + len(self._overflow)
+        stats['journal_depth'] = len(self._journal_entries())
+        stats['failed_depth'] = len(self._journal_entries(failed=True))
+        return stats
+
+    def stop(self, timeout=5.0):
+        """Остановить поток; незаписанные задания остаются в журнале"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._thread is not None and self._thread.is_alive():
+            # Поток еще пишет пакет: оставшиеся задания он сам сохранит в журнал,
+            # запись из двух потоков сразу привела бы к дублям
+            logger.warning("Поток записи не остановился за %.1f с, задания будут сохранены им в журнал",
+                           timeout)
+            return
+        self._drain()
+
+    # --- Рабочий поток -------------------------------------------------------
+
+    def _submit(self, job):
+        job['enqueued_at'] = time.monotonic()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            # Очередь переполнена - задание уйдет в журнал, но запись на диск
+            # выполнит рабочий поток, а не вызывающий (поток интерфейса)
+            self._overflow.append(job)
+            return False
+        return True
+
+    def _spill_overflow(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._overflow.popleft())
+            except IndexError:
+                break
+        if batch:
+            self._spill(batch)
+
+    def _drain(self):
+        """Все незаписанные задания - в журнал"""
+        self._spill_overflow()
+        while True:
+            try:
+                self._spill([self._queue.get_nowait()])
+            except queue.Empty:
+                break
+
+    def _probe(self):
+        """Одна попытка соединения без повторов, не раньше назначенного времени"""
+        if time.monotonic() < self._next_probe:
+            return
+        try:
+            self._manager_factory().close()
+        except Exception as e:
+            logger.debug("База данных недоступна: %s", e)
+            self._mark_unavailable()
+        else:
+            self._mark_available()
+
+    def _run(self):
+        self._probe()
+        while not self._stop.is_set():
+            self._spill_overflow()
+            self._log_stats()
+            try:
+                job = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                if not self._db_available:
+                    self._probe()
+                self._replay_journal()
+                continue
+
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not self._db_available and time.monotonic() < self._next_probe:
+                self._spill(batch)
+                continue
+            self._write_with_retry(batch)
+        self._drain()
+
+    def _write_with_retry(self, batch):
+        delay = self.base_delay
+        # Недоступная база проверяется одной попыткой, повторы - только после успешной записи
+        retries = self.max_retries if self.db_available else 0
+        for attempt in range(retries + 1):
+            try:
+                self._write(batch)
+                self._mark_available()
+                self._record_written(batch)
+                return
+            except Exception as e:
+                if not _is_transient(e):
+                    if len(batch) > 1:
+                        # Транзакция пакета отменена целиком - задания пишутся по одному,
+                        # чтобы отложить только отвергнутые базой
+                        for job in batch:
+                            self._write_with_retry([job])
+                        return
+                    logger.error("Ошибка записи в базу данных, задание перенесено в %s: %s",
+                                 self.journal_dir / 'failed', e)
+                    self._spill(batch, failed=True)
+                    return
+                if attempt == retries or self._stop.wait(delay):
+                    break
+                delay = min(delay * 2, self.max_delay)
+
+        logger.warning("База данных недоступна, задания сохранены в журнал")
+        self._mark_unavailable()
+        self._spill(batch)
+
+    def _write(self, batch):
+        """Записывает пакет заданий одной транзакцией"""
+        db = self._manager_factory()
+        try:
+            for job in batch:
+                kwargs = dict(job['kwargs'], commit=False)
+                if job['kind'] == 'raw_data':
+                    db.save_raw_data(*job['args'], **kwargs)
+                else:
+                    db.save_results(*job['args'], **kwargs)
+            db.conn.commit()
+        finally:
+            db.close()
+
+    def _record_written(self, batch):
+        now = time.monotonic()
+        with self._lock:
+            for job in batch:
+                latency = now - job['enqueued_at'] if 'enqueued_at' in job else None
+                self._stats['written'] += 1
+                if latency is None:
+                    continue
+                self._stats['last_latency'] = latency
+                avg = self._stats['avg_latency']
+                # Экспоненциальное скользящее среднее
+                self._stats['avg_latency'] = latency if avg is None else 0.9 * avg + 0.1 * latency
+
+    def _mark_available(self):
+        with self._lock:
+            self._db_available = True
+            self._probe_delay = self.base_delay
+
+    def _mark_unavailable(self):
+        with self._lock:
+            self._db_available = False
+            self._next_probe = time.monotonic() + self._probe_delay
+            self._probe_delay = min(self._probe_delay * 2, self.max_delay)
+
+    # --- Журнал на диске -----------------------------------------------------
+
+    def _journal_entries(self, failed=False):
+        directory = self.journal_dir / 'failed' if failed else self.journal_dir
+        if not directory.exists():
+            return []
+        return sorted(directory.glob('*.pkl'))
+
+    def _spill(self, batch, failed=False):
+        """Сохраняет задания в журнал; failed=True - в каталог отвергнутых заданий"""
+        directory = self.journal_dir / 'failed' if failed else self.journal_dir
+        directory.mkdir(parents=True, exist_ok=True)
+        for job in batch:
+            job = {k: v for k, v in job.items() if k != 'enqueued_at'}
+            name = f"{time.time_ns():020d}_{next(self._sequence):06d}"
+            tmp = directory / f"{name}.tmp"
+            with open(tmp, 'wb') as f:
+                pickle.dump(job, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, directory / f"{name}.pkl")
+        with self._lock:
+            self._stats['failed' if failed else 'spilled'] += len(batch)
+
+    def _replay_journal(self):
+        """Переигрывает журнал по одному заданию, пока база доступна"""
+        if time.monotonic() < self._next_probe:
+            return
+        for entry in self._journal_entries():
+            if self._stop.is_set() or not self._queue.empty():
+                return
+            try:
+                with open(entry, 'rb') as f:
+                    job = pickle.load(f)
+                self._write([job])
+            except Exception as e:
+                if _is_transient(e):
+                    self._mark_unavailable()
+                    return
+                logger.error("Задание журнала %s перенесено в %s: %s",
+                             entry.name, self.journal_dir / 'failed', e)
+                failed_dir = self.journal_dir / 'failed'
+                failed_dir.mkdir(parents=True, exist_ok=True)
+                os.replace(entry, failed_dir / entry.name)
+                with self._lock:
+                    self._stats['failed'] += 1
+                continue
+            else:
+                self._mark_available()
+                with self._lock:
+                    self._stats['replayed'] += 1
+            entry.unlink(missing_ok=True)
+
+
+    def _log_stats(self):
+        """Периодическая строка лога с метриками очереди (только при изменениях)"""
+        if time.monotonic() < self._next_stats:
+            return
+        self._next_stats = time.monotonic() + self.stats_interval
+        stats = self.stats()
+        snapshot = {k: v for k, v in stats.items() if k not in ('last_latency', 'avg_latency')}
+        if snapshot == self._logged_stats:
+            return
+        self._logged_stats = snapshot
+        latency = stats['avg_latency']
+        logger.info(
+            "Очередь записи: база %s, в очереди %d, в журнале %d, отвергнуто %d; "
+            "записано %d, переиграно %d, средняя задержка %s",
+            "доступна" if stats['db_available'] else "недоступна",
+            stats['queue_depth'], stats['journal_depth'], stats['failed_depth'],
+            stats['written'], stats['replayed'],
+            f"{latency:.2f} с" if latency is not None else "-"
+        )
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_persistence_queue():
+    """Общая для процесса очередь записи, поток запускается при первом обращении"""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = PersistenceQueue().start()
+        return _instance
+
+
+def shutdown_persistence_queue():
+    """Останавливает очередь при завершении приложения"""
+    global _instance
+    with _instance_lock:
+        if _instance is not None:
+            _instance.stop()
+            _instance = None
@@ -0,0 +1,75 @@
+# data/result_store.py
+import hashlib
+import json
+
+import pandas as pd
+
+from data.database import PostgreSQLManager
+from data.persistence_queue import get_persistence_queue
+
+
+class ResultStore:
+    """Результаты анализа, адресуемые хэшем содержимого данных и ограничений.
+
+    Повторный расчет на тех же данных с теми же ограничениями читается из
+    analysis_results вместо пересчета. Запись идет через фоновую очередь.
+    Поиск перед расчетом используется только для дорогих результатов (куб
+    метрик): хэширование всего набора и запрос к базе дороже, например,
+    расчета индекса качества. Индекс качества только сохраняется, в фоне.
+    """
+
+    @staticmethod
+    def data_digest(df):
+        """SHA-256 только от содержимого DataFrame (можно вычислить один раз на набор данных)"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([[str(c) for c in df.columns], [str(t) for t in df.dtypes]]).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def content_key(df, constraints, analysis_type, kind, data_digest=None, batch_col=None):
+        """SHA-256 от содержимого DataFrame, ограничений, типа анализа и вида результата;
+        batch_col - столбец партии для результатов по партиям"""
+        digest = hashlib.sha256()
+        header = {
+            'kind': kind,
+            'analysis_type': analysis_type,
+            'constraints': constraints,
+            'data': data_digest or ResultStore.data_digest(df),
+        }
+        if batch_col is not None:
+            header['batch_col'] = batch_col
+        digest.update(json.dumps(header, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def lookup(content_hash):
+        """Результаты по хэшу или None; при недоступной базе поиск не выполняется"""
+        if not get_persistence_queue().db_available:
+            return None
+        try:
+            with PostgreSQLManager() as db:
+                return db.load_results(content_hash)
+        except Exception:
+            return None
+
+    @staticmethod
+    def store_quality(df, constraints, analysis_type, quality_index, best_worst, data_digest=None):
+        """Сохранение индекса качества (Series) и лучших/худших значений под
+        хэшем содержимого; возвращает хэш"""
+        content_hash = ResultStore.content_key(df, constraints, analysis_type, 'quality_index',
+                                               data_digest=data_digest)
+        ResultStore.store(
+            content_hash,
+            constraints,
+            {'quality_index': quality_index.to_dict(), 'best_worst': best_worst},
+            analysis_type
+        )
+        return content_hash
+
+    @staticmethod
+    def store(content_hash, params, results, analysis_type):
+        """Сохранение результатов в фоне; дубликаты по хэшу отбрасываются базой"""
+        get_persistence_queue().submit_results(
+            params, results, analysis_type, content_hash=content_hash
+        )
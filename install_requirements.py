@@ -4,7 +4,6 @@ import sys
 required_packages = [
     "pandas",
     "numpy",
-    "scikit-learn",
     "statsmodels",
     "pmdarima",
     "PyQt5",
@@ -13,6 +12,7 @@ required_packages = [
     "python-dotenv",
     "plotly",
     "openpyxl",
+    "pyarrow",
     "seaborn"
 ]
 
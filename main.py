@@ -1,9 +1,64 @@
+import time
+
+# Отсчет времени запуска - до импорта остальных модулей
+_STARTED = time.perf_counter()
+
+import logging
+import os
 import sys
+from datetime import datetime
+
+from PyQt5.QtCore import Qt, QCoreApplication, QTimer
 from PyQt5.QtWidgets import QApplication
 from presentation.main_window import MainWindow
 
+logger = logging.getLogger(__name__)
+
+
+def report_startup(imported, shown):
+    """Время запуска до первого цикла событий (окно отрисовано).
+
+    Пишется в лог и, если задан QC_STARTUP_LOG, дописывается строкой CSV
+    (дата, импорт, создание окна, всего; мс), чтобы отслеживать динамику.
+    """
+    ready = time.perf_counter()
+    timings = [(imported - _STARTED) * 1000, (shown - imported) * 1000, (ready - _STARTED) * 1000]
+    logger.info("Запуск: импорт %.0f мс, окно %.0f мс, всего %.0f мс", *timings)
+    path = os.getenv("QC_STARTUP_LOG")
+    if path:
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(f"{datetime.now().isoformat(timespec='seconds')},{timings[0]:.0f},"
+                        f"{timings[1]:.0f},{timings[2]:.0f}\n")
+        except OSError:
+            pass
+
+
+def shutdown_services():
+    """Остановка фоновых служб при выходе. Модули базы данных и прогноза
+    импортируются при первом использовании - останавливаются только загруженные"""
+    queue_module = sys.modules.get('data.persistence_queue')
+    if queue_module is not None:
+        queue_module.shutdown_persistence_queue()
+    database = sys.modules.get('data.database')
+    if database is not None:
+        database.close_pool()
+    predictor = sys.modules.get('business.arima_predictor')
+    if predictor is not None:
+        predictor.shutdown_forecast_pool()
+
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    imported = time.perf_counter()
+    # QtWebEngine импортируется вместе со страницами результатов уже после
+    # создания QApplication - для этого контексты OpenGL должны быть общими
+    QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    shown = time.perf_counter()
+    QTimer.singleShot(0, lambda: report_startup(imported, shown))
+    app.aboutToQuit.connect(window.task_runner.shutdown)
+    app.aboutToQuit.connect(shutdown_services)
+    sys.exit(app.exec_())
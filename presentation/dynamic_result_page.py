@@ -2,29 +2,20 @@ from PyQt5.QtWidgets import (QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBo
                              QPushButton, QFileDialog, QMessageBox, QLabel, QGroupBox, QFormLayout, QComboBox, QLineEdit, 
                             QGridLayout, QScrollArea, QCheckBox, QTableWidget,QTableWidgetItem, QStackedWidget, QHeaderView, QSizePolicy, QProgressDialog)
 from PyQt5.QtGui import QIcon, QFont, QFontMetrics
-from PyQt5.QtCore import Qt
-from presentation.widgets.table_widget import TableWidget
-from presentation.widgets.plot_widget import PlotWidget
-from business.data_processor import DataProcessor
-from business.quality_calculator import QualityCalculator
-from data.data_manager import DataManager
-from data.database import PostgreSQLManager
+from PyQt5.QtCore import Qt, QTimer
+from presentation.widgets.plotly_view import PlotlyView
+from presentation.figure_cache import FigureCache, constraint_key
 from business.arima_predictor import ARIMAPredictor
-
-from presentation.widgets.constraints_panel import ConstraintsPanel
+from business.forecast_engines import ENGINES, DEFAULT_ENGINE, get_engine
+from business.rollups import TimeRollups, LEVELS, LEVEL_NAMES
+from business.metrics_engine import ALL_BATCHES
 
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.express as px  
-from PyQt5.QtWebEngineWidgets import QWebEngineView
+from plotly.colors import qualitative
 import pandas as pd
-import numpy as np
 
-import tempfile
-import shutil
-import zipfile
-import os
-import re
+import json
+
 
 def hex_to_rgb(hex_color):
     """Конвертирует HEX цвет в RGB tuple"""
@@ -32,12 +23,24 @@ def hex_to_rgb(hex_color):
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
 class DynamicResultsPage(QWidget):
+    PLOT_MAX_POINTS = 2000   # Точек на линию графика при автоматической детализации
+    ARIMA_MAX_POINTS = 500   # Длина ряда для прогноза при автоматической детализации
+
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
         self.current_param = None
         self.current_batch = None
-        self.arima_predictor = ARIMAPredictor(self)
+        self.arima_predictor = ARIMAPredictor(
+            on_error=lambda message: QMessageBox.warning(self, "ARIMA Error", message)
+        )
+        self._forecast_fig = None
+        self.figure_cache = FigureCache()
+        # Перерисовка графика прогноза не чаще раза в 300 мс
+        self._forecast_render_timer = QTimer(self)
+        self._forecast_render_timer.setSingleShot(True)
+        self._forecast_render_timer.setInterval(300)
+        self._forecast_render_timer.timeout.connect(self.render_forecast)
         self.init_ui()
         self.setStyleSheet("background-color: #f0f0f0;")
 
@@ -72,6 +75,25 @@ class DynamicResultsPage(QWidget):
         self.batch_selector.addItem("Все партии")
         self.batch_selector.setCurrentIndex(0)
         self.batch_selector.currentIndexChanged.connect(self.update_plots)
+
+        # Выбор детализации временного ряда
+        self.level_label = QLabel("Детализация:")
+        self.level_selector = QComboBox()
+        self.level_selector.addItem("Авто", None)
+        for level in LEVELS:
+            self.level_selector.addItem(LEVEL_NAMES[level], level)
+        self.level_selector.currentIndexChanged.connect(self.update_plots)
+
+        # Модель прогноза: точность против скорости
+        self.engine_label = QLabel("Модель:")
+        self.engine_selector = QComboBox()
+        for key, (label, _) in ENGINES.items():
+            self.engine_selector.addItem(label, key)
+        self.engine_selector.setCurrentIndex(list(ENGINES).index(DEFAULT_ENGINE))
+
+        # Прогноз партий в параллельных процессах
+        self.cb_parallel = QCheckBox("Параллельный прогноз")
+        self.cb_parallel.setChecked(True)
         
         # Кнопка прогноза
         self.btn_forecast = QPushButton("Построить прогноз")
@@ -90,12 +112,17 @@ class DynamicResultsPage(QWidget):
         control_layout.addWidget(self.param_selector, 0, 1)
         control_layout.addWidget(self.batch_label, 1, 0)
         control_layout.addWidget(self.batch_selector, 1, 1)
-        control_layout.addWidget(self.btn_forecast, 0, 2, 2, 1)
+        control_layout.addWidget(self.level_label, 2, 0)
+        control_layout.addWidget(self.level_selector, 2, 1)
+        control_layout.addWidget(self.engine_label, 3, 0)
+        control_layout.addWidget(self.engine_selector, 3, 1)
+        control_layout.addWidget(self.btn_forecast, 0, 2, 3, 1)
+        control_layout.addWidget(self.cb_parallel, 3, 2)
         control_panel.setLayout(control_layout)
         main_layout.addWidget(control_panel)
 
         # График
-        self.plot_container = QWebEngineView()
+        self.plot_container = PlotlyView()
         self.plot_container.setMinimumSize(800, 500)
         main_layout.addWidget(self.plot_container)
 
@@ -142,9 +169,11 @@ class DynamicResultsPage(QWidget):
 
     def get_param_constraints(self, param):
         """Получает ограничения для параметра"""
-        constraints = self.parent.dynamic_constraints.get(param, {})
-        
-        # Возвращаем в формате: (min, max)
+        return self.constraint_limits(self.parent.dynamic_constraints.get(param, {}))
+
+    @staticmethod
+    def constraint_limits(constraints):
+        """Ограничение в формате: (min, max)"""
         if constraints.get('type') == 'range':
             return (constraints.get('min'), constraints.get('max'))
         elif constraints.get('type') == 'min':
@@ -153,215 +182,260 @@ class DynamicResultsPage(QWidget):
             return (None, constraints.get('value'))
         return (None, None)
 
-    def filter_data(self):
-        """Фильтрация с проверкой существования колонки и значений"""
-        df = self.parent.current_dynamic_data
+    def get_rollups(self, df):
+        """Агрегаты временных рядов набора df, рассчитываются один раз на набор"""
         if df is None:
             return None
+        time_col = next((col for col in df.columns if col.lower() in ['timestamp', 'time', 'date']), None)
+        if not time_col:
+            return None
+        batch_col = next((col for col in df.columns if col.lower() in ['batch_id', 'batch']), None)
+        return self.parent.computation_cache.memo(
+            'dynamic', 'rollups', lambda: TimeRollups(df, time_col, batch_col)
+        )
+
+    @staticmethod
+    def resolve_level(rollups, batch, max_points, level=None):
+        """Выбранная пользователем детализация или самая подробная, укладывающаяся в max_points"""
+        return level if level is not None else rollups.pick_level(batch, max_points)
+
+    @staticmethod
+    def resolve_batches(rollups, selected_batch):
+        """Ключи партий для построения: все партии по отдельности или одна выбранная"""
+        if selected_batch in ("Все партии", "") or not rollups.batches:
+            return rollups.batches or [ALL_BATCHES]
+        return [selected_batch]
 
+    def update_plots(self, index=None):
+        """Обновляет график временных рядов (агрегаты и график готовятся в фоне)"""
+        param = self.param_selector.currentText()
+        df = self.parent.current_dynamic_data
+        if df is None or param not in df.columns:
+            return
+
+        selected_batch = self.batch_selector.currentText()
+        selected_level = self.level_selector.currentData()
+
+        # Недавно просмотренный график берется из кэша без фоновой задачи
+        key = self.figure_key(param, selected_batch, selected_level)
+        payload = self.figure_cache.get(key)
+        if payload is not None:
+            self.parent.task_runner.cancel('dynamic_plot')
+            self.plot_container.show_figure(payload)
+            self.prefetch_neighbours()
+            return
+
+        def compute(token, progress):
+            progress(0, 1, "Построение графика...")
+            payload = self.build_figure(df, param, selected_batch, selected_level, key[3])
+            self.figure_cache.put(key, payload)
+            return payload
+
+        def on_finished(payload):
+            self.plot_container.show_figure(payload)
+            self.prefetch_neighbours()
+
+        self.parent.run_task(
+            'dynamic_plot', compute, on_finished,
+            lambda message: QMessageBox.warning(self, "Ошибка", f"Ошибка построения графика: {message}")
+        )
+
+    def figure_key(self, param, batch, level):
+        """Версия набора данных, параметр, партия, ограничение параметра и детализация"""
+        return (
+            self.parent.computation_cache.version('dynamic'),
+            param,
+            batch,
+            constraint_key(self.parent.dynamic_constraints.get(param)),
+            level
+        )
+
+    def build_figure(self, df, param, selected_batch, selected_level, constraint):
+        """JSON графика параметра (вызывается в фоновой задаче).
+        constraint - ограничение параметра из ключа кэша"""
+        rollups = self.get_rollups(df)
+        if rollups is None:
+            raise ValueError("Временная колонка не найдена")
+
+        batches = self.resolve_batches(rollups, selected_batch)
+        # Один уровень для всех линий: сводный ряд не короче ряда любой партии
+        level = self.resolve_level(
+            rollups, ALL_BATCHES if len(batches) > 1 else batches[0],
+            self.PLOT_MAX_POINTS, selected_level
+        )
+
+        fig = go.Figure()
+        colors = qualitative.Plotly
+        for i, batch in enumerate(batches):
+            time_series = rollups.series(param, batch, level)
+            fig.add_trace(go.Scatter(
+                x=time_series.index,
+                y=time_series.values,
+                mode='lines+markers',
+                name='Данные' if batch == ALL_BATCHES else f'Партия {batch}',
+                line=dict(color=colors[i % len(colors)])
+            ))
+        
+        min_limit, max_limit = self.constraint_limits(json.loads(constraint))
+        
+        if min_limit is not None:
+            fig.add_hline(y=min_limit, line=dict(color='red', dash='dash'))
+        
+        if max_limit is not None:
+            fig.add_hline(y=max_limit, line=dict(color='red', dash='dash'))
+
+        fig.update_layout(
+            title=f'Динамика параметра {param} ({LEVEL_NAMES[level].lower()})',
+            xaxis_title='Время',
+            yaxis_title=param,
+            hovermode='x unified'
+        )
+        # JSON готовится в фоне, странице графика остается только Plotly.react
+        return fig.to_json()
+
+    def prefetch_neighbours(self):
+        """Графики соседних параметров и партий строятся в фоне, пока открыт текущий"""
+        df = self.parent.current_dynamic_data
+        param = self.param_selector.currentText()
         batch = self.batch_selector.currentText()
-        if batch == "Все партии" or batch == "":
-            return df
-
-        # Поиск колонки с партиями с учетом возможных вариантов
-        batch_col = None
-        possible_names = ['batch_id', 'batch', 'lot', 'партия', 'lot_id', 'part_number']
-        for col in df.columns:
-            if col.lower() in possible_names:
-                batch_col = col
-                break
-
-        if not batch_col:
-            QMessageBox.warning(self, "Ошибка", 
-                f"Колонка с партиями не найдена! Доступные колонки:\n{', '.join(df.columns)}")
-            return df
-
-        # Проверка существования выбранной партии
-        try:
-            available_batches = df[batch_col].astype(str).unique()
-            if batch not in available_batches:
-                QMessageBox.warning(self, "Ошибка", 
-                    f"Партия '{batch}' не найдена в колонке '{batch_col}'\n"
-                    f"Доступные партии:\n{', '.join(available_batches)}")
-                return df[df[batch_col].astype(str) == batch]
-        except Exception as e:
-            QMessageBox.warning(self, "Ошибка", f"Ошибка проверки партий: {str(e)}")
-            return df
-
-        # Фильтрация данных
-        try:
-            filtered_df = df[df[batch_col].astype(str) == batch]
-            if filtered_df.empty:
-                QMessageBox.warning(self, "Ошибка", 
-                    f"Нет данных для партии '{batch}' в колонке '{batch_col}'")
-            return filtered_df
-        except Exception as e:
-            QMessageBox.warning(self, "Ошибка", f"Ошибка фильтрации: {str(e)}")
-            return df
+        level = self.level_selector.currentData()
 
-    def update_plots(self, index=None):
-        """Обновляет график временных рядов"""
-        try:
-            param = self.param_selector.currentText()
-            df = self.parent.current_dynamic_data
-            
-            if df is None or param not in df.columns:
-                return
+        def neighbours(selector):
+            index = selector.currentIndex()
+            return [selector.itemText(i) for i in (index + 1, index - 1) if 0 <= i < selector.count()]
 
-            time_col = next((col for col in df.columns if col.lower() in ['timestamp', 'time', 'date']), None)
-            if not time_col:
-                QMessageBox.warning(self, "Ошибка", "Временная колонка не найдена")
-                return
+        views = [(p, batch) for p in neighbours(self.param_selector)] + \
+                [(param, b) for b in neighbours(self.batch_selector)]
+        pending = []
+        for view_param, view_batch in views:
+            key = self.figure_key(view_param, view_batch, level)
+            if key not in self.figure_cache:
+                pending.append((view_param, view_batch, key))
+        if df is None or not pending:
+            return
 
-            batch_col = next((col for col in df.columns if col.lower() in ['batch_id', 'batch']), None)
-            selected_batch = self.batch_selector.currentText()
-            
-            fig = go.Figure()
-            batches = []
-            
-            if selected_batch == "Все партии" and batch_col:
-                batches = df[batch_col].unique()
-                colors = px.colors.qualitative.Plotly
-                
-                for i, batch in enumerate(batches):
-                    batch_df = df[df[batch_col] == batch]
-                    batch_df[time_col] = pd.to_datetime(batch_df[time_col])
-                    batch_df = batch_df.sort_values(time_col)
-                    
-                    time_series = batch_df.groupby(time_col)[param].mean()
-                    
-                    fig.add_trace(go.Scatter(
-                        x=time_series.index,
-                        y=time_series.values,
-                        mode='lines+markers',
-                        name=f'Партия {batch}',
-                        line=dict(color=colors[i % len(colors)])
-                    ))
-            else:
-                df[time_col] = pd.to_datetime(df[time_col])
-                df = df.sort_values(time_col)
-                time_series = df.groupby(time_col)[param].mean()
-                
-                fig.add_trace(go.Scatter(
-                    x=time_series.index,
-                    y=time_series.values,
-                    mode='lines+markers',
-                    name='Данные',
-                    line=dict(color='#1f77b4')))
-            
-            min_limit, max_limit = self.get_param_constraints(param)
-            
-            if min_limit is not None:
-                fig.add_hline(y=min_limit, line=dict(color='red', dash='dash'))
-            
-            if max_limit is not None:
-                fig.add_hline(y=max_limit, line=dict(color='red', dash='dash'))
-
-            fig.update_layout(
-                title=f'Динамика параметра {param}',
-                xaxis_title='Время',
-                yaxis_title=param,
-                hovermode='x unified'
-            )
-            self.plot_container.setHtml(fig.to_html(include_plotlyjs='cdn'))
-            
-        except Exception as e:
-            QMessageBox.warning(self, "Ошибка", f"Ошибка построения графика: {str(e)}")
+        def compute(token, progress):
+            for view_param, view_batch, key in pending:
+                token.raise_if_cancelled()
+                self.figure_cache.put(key, self.build_figure(df, view_param, view_batch, level, key[3]))
+
+        self.parent.task_runner.submit('dynamic_prefetch', compute)
 
     def run_forecast(self):
-        """Запускает прогнозирование ARIMA для всех выбранных партий"""
-        try:
-            param = self.param_selector.currentText()
-            df = self.parent.current_dynamic_data
-            
-            if df is None or param not in df.columns:
-                return
+        """Запускает прогнозирование выбранной моделью для всех партий в фоне.
 
-            time_col = next((col for col in df.columns if col.lower() in ['timestamp', 'time', 'date']), None)
-            batch_col = next((col for col in df.columns if col.lower() in ['batch_id', 'batch']), None)
-            selected_batch = self.batch_selector.currentText()
-            
-            fig = go.Figure()
-            forecasts = []
-            batches = []
-
-            if selected_batch == "Все партии" and batch_col:
-                batches = df[batch_col].unique()
-            else:
-                batches = [selected_batch]
-
-            colors = px.colors.qualitative.Plotly
-            confidence_alphas = [0.2, 0.15, 0.1]
-
-            for batch_idx, batch in enumerate(batches):
-                try:
-                    if selected_batch == "Все партии":
-                        batch_df = df[df[batch_col] == batch]
-                    else:
-                        batch_df = self.filter_data()
-
-                    if batch_df.empty:
-                        continue
-
-                    time_series = batch_df.groupby(time_col)[param].mean().reset_index()
-                    
-                    result = self.arima_predictor.predict(time_series, param, time_col=time_col)
-                    if not result:
-                        continue
-
-                    color = colors[batch_idx % len(colors)]
-                    
-                    # Исторические данные
-                    fig.add_trace(go.Scatter(
-                        x=result['history'].index,
-                        y=result['history'].values,
-                        mode='lines+markers',
-                        name=f'История ({batch})',
-                        line=dict(color=color, width=2)
-                    ))
-
-                    # Прогноз
-                    fig.add_trace(go.Scatter(
-                        x=result['forecast'].index,
-                        y=result['forecast'].values,
-                        mode='lines+markers',
-                        name=f'Прогноз ({batch})',
-                        line=dict(color=color, width=3, dash='dash'),
-                        marker=dict(symbol='diamond')
-                    ))
-
-                    # Доверительный интервал
-                    fig.add_trace(go.Scatter(
-                        x=result['conf_int'].index.tolist() + result['conf_int'].index[::-1].tolist(),
-                        y=result['conf_int']['lower'].tolist() + result['conf_int']['upper'][::-1].tolist(),
-                        fill='toself',
-                        fillcolor=f'rgba{(*hex_to_rgb(color), 0.2)}',
-                        line=dict(color='rgba(255,255,255,0)'),
-                        name=f'95% ДИ ({batch})',
-                        showlegend=False
-                    ))
-
-                except Exception as e:
-                    QMessageBox.warning(self, "Ошибка", f"Ошибка прогноза для партии {batch}: {str(e)}")
-                    continue
-
-            # Добавление ограничений
-            min_limit, max_limit = self.get_param_constraints(param)
-            if min_limit is not None:
-                fig.add_hline(y=min_limit, line=dict(color='red', dash='dash'))
-            
-            if max_limit is not None:
-                fig.add_hline(y=max_limit, line=dict(color='red', dash='dash'))
-
-            fig.update_layout(
-                title=f'Прогноз {param} с ограничениями',
-                xaxis_title='Дата',
-                yaxis_title=param,
-                hovermode='x unified',
-                margin=dict(l=50, r=50, t=80, b=50)
+        Партии прогнозируются в пуле процессов, график дополняется по мере
+        готовности прогнозов.
+        """
+        param = self.param_selector.currentText()
+        df = self.parent.current_dynamic_data
+        if df is None or param not in df.columns:
+            return
+
+        selected_batch = self.batch_selector.currentText()
+        selected_level = self.level_selector.currentData()
+        workers = None if self.cb_parallel.isChecked() else 1
+        engine = get_engine(self.engine_selector.currentData())
+
+        # Ограничения и оформление рисуются сразу, трассы партий добавляются по готовности
+        fig = go.Figure()
+        min_limit, max_limit = self.get_param_constraints(param)
+        if min_limit is not None:
+            fig.add_hline(y=min_limit, line=dict(color='red', dash='dash'))
+        
+        if max_limit is not None:
+            fig.add_hline(y=max_limit, line=dict(color='red', dash='dash'))
+
+        fig.update_layout(
+            title=f'Прогноз {param} с ограничениями',
+            xaxis_title='Дата',
+            yaxis_title=param,
+            hovermode='x unified',
+            margin=dict(l=50, r=50, t=80, b=50)
+        )
+        self._forecast_fig = fig
+        colors = qualitative.Plotly
+
+        def compute(token, progress):
+            rollups = self.get_rollups(df)
+            if rollups is None:
+                raise ValueError("Временная колонка не найдена")
+            time_col = rollups.time_col
+            batches = self.resolve_batches(rollups, selected_batch)
+
+            # Ряд берется из готовых агрегатов на уровне, подходящем для модели
+            series = {}
+            for batch in batches:
+                level = self.resolve_level(rollups, batch, self.ARIMA_MAX_POINTS, selected_level)
+                time_series = rollups.series(param, batch, level).dropna()
+                if not time_series.empty:
+                    series[batch] = time_series.reset_index()
+
+            errors = []
+            results = ARIMAPredictor.predict_many(
+                series, param, time_col=time_col, workers=workers,
+                is_cancelled=lambda: token.cancelled, engine=engine
             )
-            self.plot_container.setHtml(fig.to_html(include_plotlyjs='cdn'))
-
-        except Exception as e:
-            QMessageBox.warning(self, "Ошибка", f"Ошибка прогноза: {str(e)}")
-
+            for done, (batch, result, error) in enumerate(results, start=1):
+                progress(done, len(series), "Прогноз по партиям...")
+                if error is not None:
+                    errors.append(f"{batch}: {error}")
+                else:
+                    progress.publish((batches.index(batch), batch, result))
+            token.raise_if_cancelled()
+            return errors
+
+        def on_partial(item):
+            batch_idx, batch, result = item
+            self.add_forecast_traces(fig, result, batch, colors[batch_idx % len(colors)])
+            if not self._forecast_render_timer.isActive():
+                self._forecast_render_timer.start()
+
+        def on_finished(errors):
+            self._forecast_render_timer.stop()
+            self.render_forecast()
+            if errors:
+                QMessageBox.warning(self, "Ошибка", "Ошибка прогноза для партий:\n" + "\n".join(errors))
+
+        self.parent.run_task(
+            'forecast', compute, on_finished,
+            lambda message: QMessageBox.warning(self, "Ошибка", f"Ошибка прогноза: {message}"),
+            on_partial=on_partial
+        )
+
+    def render_forecast(self):
+        if self._forecast_fig is not None:
+            self.plot_container.show_figure(self._forecast_fig)
+
+    @staticmethod
+    def add_forecast_traces(fig, result, batch, color):
+        """История, прогноз и доверительный интервал одной партии"""
+        # Исторические данные
+        fig.add_trace(go.Scatter(
+            x=result['history'].index,
+            y=result['history'].values,
+            mode='lines+markers',
+            name=f'История ({batch})',
+            line=dict(color=color, width=2)
+        ))
+
+        # Прогноз
+        fig.add_trace(go.Scatter(
+            x=result['forecast'].index,
+            y=result['forecast'].values,
+            mode='lines+markers',
+            name=f'Прогноз ({batch})',
+            line=dict(color=color, width=3, dash='dash'),
+            marker=dict(symbol='diamond')
+        ))
+
+        # Доверительный интервал
+        fig.add_trace(go.Scatter(
+            x=result['conf_int'].index.tolist() + result['conf_int'].index[::-1].tolist(),
+            y=result['conf_int']['lower'].tolist() + result['conf_int']['upper'][::-1].tolist(),
+            fill='toself',
+            fillcolor=f'rgba{(*hex_to_rgb(color), 0.2)}',
+            line=dict(color='rgba(255,255,255,0)'),
+            name=f'95% ДИ ({batch})',
+            showlegend=False
+        ))
@@ -0,0 +1,56 @@
+# presentation/figure_cache.py
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def constraint_key(config):
+    """Неизменяемое представление ограничения параметра для ключа кэша"""
+    return json.dumps(config or {}, sort_keys=True, default=str)
+
+
+class FigureCache:
+    """LRU-кэш готовых фигур страницы (JSON для PlotlyView.show_figure)
+    с лимитом по памяти (QC_FIGURE_CACHE_MB на страницу, по умолчанию 64).
+
+    Ключ включает версию набора данных, поэтому после загрузки новых данных
+    старые фигуры не используются и вытесняются по мере заполнения.
+    Доступ защищен блокировкой: фигуры соседних вкладок строятся в фоне.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(os.getenv("QC_FIGURE_CACHE_MB", "64")) * 1024 * 1024
+        self._entries = OrderedDict()  # ключ -> JSON фигуры
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return  # Фигура больше всего кэша не сохраняется
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = payload
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
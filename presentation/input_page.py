@@ -5,27 +5,13 @@ from PyQt5.QtWidgets import (QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBo
 from PyQt5.QtGui import QIcon, QFont, QFontMetrics
 from PyQt5.QtCore import Qt
 from presentation.widgets.table_widget import TableWidget
-from presentation.widgets.plot_widget import PlotWidget
 from business.data_processor import DataProcessor
-from business.quality_calculator import QualityCalculator
 from data.data_manager import DataManager
-from data.database import PostgreSQLManager
-from business.arima_predictor import ARIMAPredictor
 
 from presentation.widgets.constraints_panel import ConstraintsPanel
 
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.express as px  
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-import pandas as pd
-import numpy as np
-
-import tempfile
-import shutil
-import zipfile
 import os
-import re
+
 
 class InputPage(QWidget):
     def __init__(self, parent):
@@ -123,111 +109,181 @@ class InputPage(QWidget):
         return widget
 
     def load_data(self, analysis_type):
-        """Загрузка и обработка данных для выбранного типа анализа"""
+        """Загрузка данных для выбранного типа анализа в фоновом потоке"""
         file_path, _ = QFileDialog.getOpenFileName(
             self,
             "Выберите файл данных",
             "",
-            "Data Files (*.csv *.xlsx)"
+            "Data Files (*.csv *.xlsx *.parquet *.feather *.arrow)"
         )
         
         if not file_path:
             return  # Пользователь отменил выбор файла
 
-        try:
-            # Загрузка данных из файла
-            df = DataManager.load_data(file_path)
-            
+        table = self.static_table if analysis_type == "static" else self.dynamic_table
+
+        def compute(token, progress):
+            # Большие файлы читаются по частям, предпросмотр заполняется по первой части;
+            # между частями проверяется отмена (повторная загрузка отменяет текущую)
+            if os.path.getsize(file_path) <= DataManager.STREAMING_THRESHOLD_BYTES:
+                progress(0, 1, "Загрузка данных...")
+                return DataManager.load_data(file_path)
+
+            def on_chunk(chunk, rows_loaded):
+                token.raise_if_cancelled()
+                if rows_loaded == len(chunk):
+                    progress.publish(chunk)
+                progress(0, 1, f"Загружено строк: {rows_loaded:,}")
+
+            return DataManager.load_data(
+                file_path,
+                chunksize=DataManager.DEFAULT_CHUNKSIZE,
+                on_chunk=on_chunk
+            )
+
+        def on_finished(df):
             # Извлечение списка параметров (исключая служебные колонки)
-            params = [col for col in df.columns 
-                    if col.lower() not in ['id', 'timestamp', 'time', 'date',"batch_id", 'product_id']]
-            
+            params = [col for col in df.columns
+                    if str(col).lower() not in ['id', 'timestamp', 'time', 'date',"batch_id", 'product_id']]
+
             # Обновление интерфейса для соответствующего типа анализа
             if analysis_type == "static":
                 # Обновление панели ограничений
                 self.static_constraints_panel.update_params(params)
-                
+
                 # Сохранение данных и обновление таблицы
-                self.parent.current_static_data = df
+                self.parent.set_data('static', df)
                 self.btn_next_static.setEnabled(True)
-                self.static_table.display_data(df, max_rows=50)
-                
+                self.static_table.display_data(df)
+
                 # Очистка предыдущих ограничений при новой загрузке
                 self.static_constraints_panel.clear_constraints()
             else:
                 # Обновление панели ограничений
                 self.dynamic_constraints_panel.update_params(params)
-                
+
                 # Сохранение данных и обновление таблицы
-                self.parent.current_dynamic_data = df
+                self.parent.set_data('dynamic', df)
                 self.btn_next_dynamic.setEnabled(True)
-                self.dynamic_table.display_data(df, max_rows=50)
-                
+                self.dynamic_table.display_data(df)
+
                 # Очистка предыдущих ограничений при новой загрузке
                 self.dynamic_constraints_panel.clear_constraints()
 
-            # Автоматическое сохранение сырых данных в PostgreSQL
-            db = None
-            try:
-                db = PostgreSQLManager()
-                db.save_raw_data(df, analysis_type)
-            except Exception as e:
-                QMessageBox.warning(self, "Database Warning", 
-                                f"Ошибка сохранения в базу данных: {str(e)}")
-            finally:
-                if db:
-                    db.close()
+            # Автоматическое сохранение сырых данных в PostgreSQL в фоновом потоке;
+            # при недоступной базе данные сохраняются в локальный журнал.
+            # Модули базы (psycopg2) импортируются при первом сохранении, а не при запуске
+            from data.persistence_queue import get_persistence_queue
 
-        except Exception as e:
-            QMessageBox.critical(
+            get_persistence_queue().submit_raw_data(df, analysis_type)
+
+        self.parent.run_task(
+            f"load_{analysis_type}", compute, on_finished,
+            lambda message: QMessageBox.critical(
                 self,
                 "Критическая ошибка",
-                f"Непредвиденная ошибка: {str(e)}\n\n"
-            )
+                f"Непредвиденная ошибка: {message}\n\n"
+            ),
+            on_partial=table.display_data
+        )
 
-    def process_data(self, analysis_type):
+    def process_data(self, analysis_type, on_done=None):
+        """Предобработка и расчет индекса в фоне; on_done вызывается после расчета"""
         try:
-            if analysis_type == "static":
-                if self.parent.current_static_data is None:
-                    raise ValueError("Нет данных для обработки")
-                processed_df = DataProcessor.preprocess_data(self.parent.current_static_data)
-                self.parent.current_static_data = processed_df
-                self.static_table.display_data(processed_df, max_rows=50)
-                self.calculate_index('static')
-            else:
-                if self.parent.current_dynamic_data is None:
-                    raise ValueError("Нет данных для обработки")
-                processed_df = DataProcessor.preprocess_data(self.parent.current_dynamic_data)
-                self.parent.current_dynamic_data = processed_df
-                self.dynamic_table.display_data(processed_df, max_rows=50)
-                self.calculate_index('dynamic')
-            
+            data = self.parent.current_static_data if analysis_type == "static" else self.parent.current_dynamic_data
+            if data is None:
+                raise ValueError("Нет данных для обработки")
+
+            # Уже обработанные данные повторно не предобрабатываются
+            cache = self.parent.computation_cache
+            if cache.is_processed(analysis_type, data):
+                self.calculate_index(analysis_type, on_done)
+                return
+
+            def compute(token, progress):
+                progress(0, 1, "Предобработка данных...")
+                return DataProcessor.preprocess_data(data)
+
+            def on_finished(processed_df):
+                # Пока шла обработка, загрузили другой файл - обрабатываются новые данные
+                current = self.parent.current_static_data if analysis_type == "static" else self.parent.current_dynamic_data
+                if current is not data:
+                    self._restart_stale(analysis_type, on_done)
+                    return
+                self.parent.set_data(analysis_type, processed_df)
+                cache.mark_processed(analysis_type, processed_df)
+                table = self.static_table if analysis_type == "static" else self.dynamic_table
+                table.display_data(processed_df)
+                self.calculate_index(analysis_type, on_done)
+
+            self.parent.run_task(
+                f"process_{analysis_type}", compute, on_finished,
+                lambda message: QMessageBox.critical(self, "Ошибка", f"Ошибка обработки: {message}")
+            )
+
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка обработки: {str(e)}")
 
-    def calculate_index(self, analysis_type):
+    def calculate_index(self, analysis_type, on_done=None):
         try:
-            constraints = self.parent.static_constraints if analysis_type == "static" else self.parent.dynamic_constraints
+            constraints = dict(self.parent.static_constraints if analysis_type == "static" else self.parent.dynamic_constraints)
             data = self.parent.current_static_data if analysis_type == "static" else self.parent.current_dynamic_data
         
             if data is None:
                 raise ValueError("Сначала загрузите данные")
+            cache = self.parent.computation_cache
 
-            # Преобразуем результат в DataFrame
-            result_series = QualityCalculator.calculate_quality_index(
-                data,
-                constraints=constraints,
-                analysis_type=analysis_type
-            )
-            result_df = result_series.to_frame().T  # Конвертируем Series в DataFrame
+            def compute(token, progress):
+                progress(0, 1, "Расчет индекса качества...")
+                # Пересчитываются только параметры без агрегатов в кэше вычислений.
+                # Поиск в базе перед расчетом не выполняется: он дороже самого расчета
+                return cache.quality(analysis_type, data, constraints)
 
-            # Сохраняем результаты расчета
-            if analysis_type == "static":
-                self.parent.static_quality_index = result_df
-                self.parent.static_best_worst = QualityCalculator.calculate_actual_best_worst(data, constraints)
-            else:
-                self.parent.dynamic_quality_index = result_df
-                self.parent.dynamic_best_worst = QualityCalculator.calculate_actual_best_worst(data, constraints)
+            def store(result_series, best_worst):
+                # Хэш набора данных считается один раз на версию, запись - через очередь
+                def compute_store(token, progress):
+                    from data.result_store import ResultStore
+
+                    digest = cache.memo(analysis_type, 'data_digest', lambda: ResultStore.data_digest(data))
+                    return ResultStore.store_quality(
+                        data, constraints, analysis_type, result_series, best_worst, data_digest=digest
+                    )
+                self.parent.task_runner.submit(f"store_index_{analysis_type}", compute_store)
+
+            def on_finished(result):
+                current = self.parent.current_static_data if analysis_type == "static" else self.parent.current_dynamic_data
+                if current is not data:
+                    self._restart_stale(analysis_type, on_done)
+                    return
+                result_series, best_worst = result
+
+                # Преобразуем результат в DataFrame
+                result_df = result_series.to_frame().T  # Конвертируем Series в DataFrame
+
+                # Сохраняем результаты расчета
+                if analysis_type == "static":
+                    self.parent.static_quality_index = result_df
+                    self.parent.static_best_worst = best_worst
+                else:
+                    self.parent.dynamic_quality_index = result_df
+                    self.parent.dynamic_best_worst = best_worst
+                store(result_series, best_worst)
+                if on_done is not None:
+                    on_done()
+
+            self.parent.run_task(
+                f"index_{analysis_type}", compute, on_finished,
+                lambda message: QMessageBox.critical(self, "Ошибка", f"Ошибка расчета: {message}")
+            )
             
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка расчета: {str(e)}")
+
+    def _restart_stale(self, analysis_type, on_done):
+        """Результат рассчитан для замененных данных: расчет повторяется для текущих"""
+        self.parent.statusBar().showMessage("Данные изменились во время расчета, расчет запущен заново", 5000)
+        if on_done is not None:
+            # Переход к результатам: новые данные сначала проходят предобработку
+            self.process_data(analysis_type, on_done)
+        else:
+            self.calculate_index(analysis_type)
@@ -4,26 +4,10 @@ from PyQt5.QtWidgets import (QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBo
                             QGridLayout, QScrollArea, QCheckBox, QTableWidget,QTableWidgetItem, QStackedWidget, QHeaderView, QSizePolicy, QProgressDialog)
 from PyQt5.QtGui import QIcon, QFont, QFontMetrics
 from PyQt5.QtCore import Qt
-from presentation.widgets.table_widget import TableWidget
-from presentation.widgets.plot_widget import PlotWidget
-from business.data_processor import DataProcessor
-from business.quality_calculator import QualityCalculator
-from data.data_manager import DataManager
-from data.database import PostgreSQLManager
-from business.arima_predictor import ARIMAPredictor
+from business.computation_cache import ComputationCache
+from presentation.task_runner import TaskRunner
 from presentation.input_page import InputPage
-from presentation.dynamic_result_page import DynamicResultsPage
-from presentation.metrics_table_page import MetricsTablePage
-from presentation.static_result_page import StaticResultsPage
 
-from presentation.widgets.constraints_panel import ConstraintsPanel
-
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.express as px  
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-import pandas as pd
-import numpy as np
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -37,14 +21,13 @@ class MainWindow(QMainWindow):
         self.current_dynamic_data = None
         self.static_constraints = {}
         self.dynamic_constraints = {}
+        self.computation_cache = ComputationCache()
+        self.task_runner = TaskRunner(self)
         
-        # Создаем страницы результатов ПЕРЕД вызовом init_ui()
+        # При запуске создается только страница ввода; страницы результатов
+        # (и plotly/QtWebEngine вместе с ними) - при первом переходе на них
         self.input_page = InputPage(self)
-        self.static_results_page = StaticResultsPage(self)
-        self.dynamic_results_page = DynamicResultsPage(self)
-
-        # Добавляем новую страницу
-        self.metrics_table_page = MetricsTablePage(self)
+        self._pages = {}
 
         self.static_quality_index = None
         self.static_best_worst = None
@@ -58,45 +41,100 @@ class MainWindow(QMainWindow):
         # Создаем стек виджетов
         self.stacked_widget = QStackedWidget()
         
-        # Добавляем ВСЕ страницы
         self.stacked_widget.addWidget(self.input_page)
-        self.stacked_widget.addWidget(self.static_results_page)
-        self.stacked_widget.addWidget(self.dynamic_results_page)
-        self.stacked_widget.addWidget(self.metrics_table_page)
-        
         self.setCentralWidget(self.stacked_widget)
 
+    def _page(self, name):
+        """Страница результатов, создаваемая при первом обращении"""
+        page = self._pages.get(name)
+        if page is None:
+            if name == 'static':
+                from presentation.static_result_page import StaticResultsPage
+                page = StaticResultsPage(self)
+            elif name == 'dynamic':
+                from presentation.dynamic_result_page import DynamicResultsPage
+                page = DynamicResultsPage(self)
+            else:
+                from presentation.metrics_table_page import MetricsTablePage
+                page = MetricsTablePage(self)
+            self._pages[name] = page
+            self.stacked_widget.addWidget(page)
+        return page
+
+    @property
+    def static_results_page(self):
+        return self._page('static')
+
+    @property
+    def dynamic_results_page(self):
+        return self._page('dynamic')
+
+    @property
+    def metrics_table_page(self):
+        return self._page('metrics')
+
+    def set_data(self, analysis_type, df):
+        """Заменяет набор данных и сбрасывает рассчитанные по нему агрегаты"""
+        if analysis_type == 'static':
+            self.current_static_data = df
+        else:
+            self.current_dynamic_data = df
+        self.computation_cache.invalidate(analysis_type)
+
+    def run_task(self, key, fn, on_finished=None, on_failed=None, on_partial=None):
+        """Запуск тяжелой операции в фоне с прогрессом в строке состояния.
+
+        Повторный запуск с тем же ключом отменяет предыдущий.
+        """
+        def finished(result):
+            self.statusBar().clearMessage()
+            if on_finished is not None:
+                on_finished(result)
+
+        def failed(message):
+            self.statusBar().clearMessage()
+            if on_failed is not None:
+                on_failed(message)
+
+        return self.task_runner.submit(
+            key, fn,
+            on_finished=finished,
+            on_failed=failed,
+            on_progress=self.show_progress,
+            on_partial=on_partial,
+            on_cancelled=self.statusBar().clearMessage
+        )
+
+    def show_progress(self, done, total, label):
+        if total > 1:
+            label = f"{label} {done}/{total}"
+        self.statusBar().showMessage(label)
 
     def show_results(self, analysis_type):
-        try:
-            if analysis_type == 'static':
-                page = self.static_results_page
-                self.input_page.process_data("static")
-                data = self.current_static_data
-                page.update_params_list()
-                page.update_plots()
-                self.stacked_widget.setCurrentIndex(1)
-            elif analysis_type == 'dynamic':
-                page = self.dynamic_results_page
-                self.input_page.process_data("dynamic")
-                data = self.current_dynamic_data
+        data = self.current_static_data if analysis_type == 'static' else self.current_dynamic_data
+        if data is None or data.empty:
+            QMessageBox.warning(self, "Ошибка", "Данные не загружены")
+            return
+
+        def show_page():
+            try:
+                if analysis_type == 'static':
+                    page = self.static_results_page
+                else:
+                    page = self.dynamic_results_page
                 page.update_params_list()
                 page.update_plots()
-                self.stacked_widget.setCurrentIndex(2)
-                
-            if data is None or data.empty:
-                QMessageBox.warning(self, "Ошибка", "Данные не загружены")
-                return
+                self.stacked_widget.setCurrentWidget(page)
+            except Exception as e:
+                QMessageBox.critical(self, "Ошибка", f"Ошибка отображения: {str(e)}")
+                self.stacked_widget.setCurrentWidget(self.input_page)
 
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка отображения: {str(e)}")
-            self.stacked_widget.setCurrentIndex(0)
+        self.input_page.process_data(analysis_type, on_done=show_page)
 
     def show_input(self):
-        self.stacked_widget.setCurrentIndex(0)
+        self.stacked_widget.setCurrentWidget(self.input_page)
 
     def show_metrics_table(self):
         """Показывает страницу с таблицей метрик"""
         self.metrics_table_page.update_batches()
-        self.metrics_table_page.update_table()
         self.stacked_widget.setCurrentWidget(self.metrics_table_page)
\ No newline at end of file
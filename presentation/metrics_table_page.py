@@ -4,33 +4,19 @@ from PyQt5.QtWidgets import (QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBo
                             QGridLayout, QScrollArea, QCheckBox, QTableWidget,QTableWidgetItem, QStackedWidget, QHeaderView, QSizePolicy, QProgressDialog)
 from PyQt5.QtGui import QIcon, QFont, QFontMetrics
 from PyQt5.QtCore import Qt
-from presentation.widgets.table_widget import TableWidget
-from presentation.widgets.plot_widget import PlotWidget
-from business.data_processor import DataProcessor
-from business.quality_calculator import QualityCalculator
-from data.data_manager import DataManager
-from data.database import PostgreSQLManager
-from business.arima_predictor import ARIMAPredictor
-
-from presentation.widgets.constraints_panel import ConstraintsPanel
-
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import plotly.express as px  
-from PyQt5.QtWebEngineWidgets import QWebEngineView
+from business.metrics_engine import BatchMetricsEngine, ALL_BATCHES, NUMERIC_METRICS
+from data.result_store import ResultStore
+from data.metrics_exporter import MetricsExporter, ExportCancelled, EXPORT_FORMATS, sanitize_filename
+from presentation.task_runner import TaskCancelled
+
 import pandas as pd
-import numpy as np
 
-import tempfile
-import shutil
-import zipfile
-import os
-import re
 
 class MetricsTablePage(QWidget):
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
+        self.metrics_cube = None  # Куб партия x параметр x метрика
         self.init_ui()
         self.setStyleSheet("background-color: #f0f0f0;")
 
@@ -89,10 +75,16 @@ class MetricsTablePage(QWidget):
         
         self.cb_include_all = QCheckBox("Включая сводку по всем партиям")
         self.cb_include_all.setChecked(True)
+
+        # Формат выгрузки
+        self.format_combo = QComboBox()
+        for fmt, (label, _) in EXPORT_FORMATS.items():
+            self.format_combo.addItem(label, fmt)
         
         btn_layout.addWidget(self.btn_back)
         btn_layout.addStretch()
         # btn_layout.addWidget(self.cb_include_all)
+        btn_layout.addWidget(self.format_combo)
         btn_layout.addWidget(self.btn_export)
         
         main_layout.addLayout(btn_layout)
@@ -107,55 +99,97 @@ class MetricsTablePage(QWidget):
             QPushButton:hover { background-color: #45a049; }
         """)
 
-        # self.format_combo.setStyleSheet("""
-        #     QComboBox {
-        #         padding: 5px;
-        #         min-width: 120px;
-        #     }
-        # """)
+        self.format_combo.setStyleSheet("""
+            QComboBox {
+                padding: 5px;
+                min-width: 120px;
+            }
+        """)
 
     def update_batches(self):
-        """Обновляет список партий"""
+        """Обновляет список партий и пересчитывает куб метрик в фоне"""
+        self.batch_combo.blockSignals(True)
         self.batch_combo.clear()
+        self.batch_combo.blockSignals(False)
         df = self.parent.current_static_data
-        if df is not None and 'batch_id' in df.columns:
-            self.batch_combo.addItem("Все партии")
-            batches = df['batch_id'].astype(str).unique().tolist()
-            self.batch_combo.addItems(batches)
+        self.metrics_cube = None
+        if df is None:
+            return
+        constraints = dict(self.parent.static_constraints)
+
+        def compute(token, progress):
+            progress(0, 1, "Расчет метрик по партиям...")
+            return self.load_or_build_cube(df, constraints)
+
+        def on_finished(cube):
+            if self.parent.current_static_data is not df:
+                return
+            self.metrics_cube = cube
+            self.batch_combo.blockSignals(True)
+            if 'batch_id' in df.columns:
+                self.batch_combo.addItem(ALL_BATCHES)
+                self.batch_combo.addItems(self.get_available_batches())
+            self.batch_combo.blockSignals(False)
+            self.update_table()
+
+        self.parent.run_task(
+            'metrics_cube', compute, on_finished,
+            lambda message: QMessageBox.critical(self, "Ошибка", f"Ошибка расчета метрик: {message}")
+        )
+
+    def get_metrics_cube(self):
+        """Возвращает куб метрик, рассчитывая его при первом обращении"""
+        if self.metrics_cube is None and self.parent.current_static_data is not None:
+            self.metrics_cube = self.load_or_build_cube(
+                self.parent.current_static_data, self.parent.static_constraints
+            )
+        return self.metrics_cube
+
+    def load_or_build_cube(self, df, constraints):
+        """Куб метрик из сохраненных результатов или новый расчет с сохранением"""
+        digest = self.parent.computation_cache.memo('static', 'data_digest', lambda: ResultStore.data_digest(df))
+        content_hash = ResultStore.content_key(
+            df, constraints, 'static', 'metrics_cube', data_digest=digest, batch_col='batch_id'
+        )
+        cached = ResultStore.lookup(content_hash)
+        if cached is not None:
+            return BatchMetricsEngine.cube_from_records(cached['cube'])
+
+        cube = BatchMetricsEngine.build_cube(df, constraints)
+        ResultStore.store(
+            content_hash, constraints, {'cube': BatchMetricsEngine.cube_to_records(cube)}, 'static'
+        )
+        return cube
 
     def update_table(self):
-        df = self.parent.current_static_data
-        if df is None:
+        # Куб рассчитывается в фоне, таблица заполнится по его готовности
+        cube = self.metrics_cube
+        if cube is None:
             return
 
-        # Фильтрация по партии
+        # Выбор партии в кубе
         batch = self.batch_combo.currentText()
-        if batch != "Все партии" and 'batch_id' in df.columns:
-            df = df[df['batch_id'].astype(str) == batch]
+        batches = cube.index.get_level_values('batch')
+        if batch not in batches:
+            batch = ALL_BATCHES
+        batch_metrics = cube.loc[batch]
 
-        # Рассчет метрик индекса качества
+        # Индекс качества и лучшие/худшие значения выбранной партии
         constraints = self.parent.static_constraints
-        result_series = QualityCalculator.calculate_quality_index(
-            df,
-            constraints=constraints,
-            analysis_type='static'
-        )
-        result_df = result_series.to_frame().T 
-        self.parent.static_quality_index = result_df
-        self.parent.static_best_worst = QualityCalculator.calculate_actual_best_worst(df, constraints)
-
-        quality_indexes = self.parent.static_quality_index
-        best_worst = self.parent.static_best_worst
+        constrained = [p for p in constraints if p in batch_metrics.index]
+        self.parent.static_quality_index = batch_metrics.loc[constrained, 'Индекс качества'] \
+            .astype(float).to_frame().T
+        self.parent.static_best_worst = {
+            param: {
+                'best': batch_metrics.at[param, 'Лучшее значение'],
+                'worst': batch_metrics.at[param, 'Худшее значение']
+            }
+            for param in constrained
+        }
 
         # Подготовка данных
-        params = [col for col in df.columns 
-                if col not in ['id', 'timestamp', 'batch_id', 'product_id', 'date']]
-        metrics = [
-            'Среднее', 'Медиана', 'Ст. отклонение', 
-            'Минимум', 'Максимум', 'Количество',
-            'За пределами норм', 'Лучшее значение', 
-            'Худшее значение', 'Разброс', 'Индекс качества'
-        ]
+        params = list(batch_metrics.index)
+        metrics = NUMERIC_METRICS
 
         # Настройка таблицы
         self.table.setRowCount(len(metrics))
@@ -165,61 +199,38 @@ class MetricsTablePage(QWidget):
 
         # Заполнение данных
         for col_idx, param in enumerate(params):
-            if pd.api.types.is_numeric_dtype(df[param]):
-                data = df[param]
-                constraints = self.parent.static_constraints.get(param, {})
-                
+            row = batch_metrics.loc[param]
+            if row['Тип данных'] == 'Числовой':
                 # Базовые метрики
-                self.table.setItem(0, col_idx, QTableWidgetItem(f"{data.mean():.2f}"))
-                self.table.setItem(1, col_idx, QTableWidgetItem(f"{data.median():.2f}"))
-                self.table.setItem(2, col_idx, QTableWidgetItem(f"{data.std():.2f}"))
-                self.table.setItem(3, col_idx, QTableWidgetItem(f"{data.min():.2f}"))
-                self.table.setItem(4, col_idx, QTableWidgetItem(f"{data.max():.2f}"))
-                self.table.setItem(5, col_idx, QTableWidgetItem(str(data.count())))
-                
+                for row_idx, metric in enumerate(metrics[:5]):
+                    self.table.setItem(row_idx, col_idx, QTableWidgetItem(f"{row[metric]:.2f}"))
+                self.table.setItem(5, col_idx, QTableWidgetItem(str(int(row['Количество']))))
+
                 # За пределами норм
-                out_of_bounds = self.calculate_out_of_bounds(data, constraints)
-                self.table.setItem(6, col_idx, QTableWidgetItem(str(out_of_bounds)))
-                
+                self.table.setItem(6, col_idx, QTableWidgetItem(str(int(row['За пределами норм']))))
+
                 # Лучшее/худшее
-                best = best_worst.get(param, {}).get('best', '')
-                worst_val = best_worst.get(param, {}).get('worst', '')
+                is_constrained = param in constraints
+                best = row['Лучшее значение'] if is_constrained else ''
+                worst_val = row['Худшее значение'] if is_constrained else ''
                 self.table.setItem(7, col_idx, QTableWidgetItem(str(best)))
                 self.table.setItem(8, col_idx, QTableWidgetItem(str(worst_val)))
-                
+
                 # Разброс
                 spread = ''
-                if isinstance(best, (int, float)) and isinstance(worst_val, (int, float)):
-                    spread = f"{best - worst_val:.2f}"
+                if is_constrained and not pd.isna(row['Разброс']):
+                    spread = f"{row['Разброс']:.2f}"
                 self.table.setItem(9, col_idx, QTableWidgetItem(spread))
-                
+
                 # Индекс качества
-                if quality_indexes is not None and param in quality_indexes.columns:
-                    self.table.setItem(10, col_idx, QTableWidgetItem(f"{quality_indexes[param].values[0]:.2f}"))
+                if is_constrained:
+                    self.table.setItem(10, col_idx, QTableWidgetItem(f"{row['Индекс качества']:.2f}"))
             else:
                 for row_idx in range(len(metrics)):
                     self.table.setItem(row_idx, col_idx, QTableWidgetItem(""))
 
         self.table.resizeColumnsToContents()
 
-    def calculate_out_of_bounds(self, data, constraints):
-        """Рассчитывает количество значений за пределами ограничений"""
-        if not constraints:
-            return 0
-            
-        if constraints.get('type') == 'range':
-            min_val = constraints.get('min', -np.inf)
-            max_val = constraints.get('max', np.inf)
-            return ((data < min_val) | (data > max_val)).sum()
-            
-        elif constraints.get('type') == 'min':
-            return (data < constraints['value']).sum()
-            
-        elif constraints.get('type') == 'max':
-            return (data > constraints['value']).sum()
-            
-        return 0
-
     def get_table_data(self):
         """Преобразует данные таблицы в DataFrame"""
         try:
@@ -259,144 +270,107 @@ class MetricsTablePage(QWidget):
             return pd.DataFrame()
     
     def export_all_batches(self):
-        """Экспорт метрик для всех партий в ZIP-архив"""
-        try:
-            # Получаем список всех партий
-            batches = self.get_available_batches()
-            
-            # Создаем временную директорию
-            temp_dir = tempfile.mkdtemp()
-            exported_files = []
+        """Экспорт метрик для всех партий в фоновом потоке"""
+        if self.parent.task_runner.is_running('export'):
+            return  # Предыдущий экспорт еще выполняется
 
-            # Прогресс-диалог
-            progress = QProgressDialog("Экспорт данных...", "Отмена", 0, len(batches), self)
-            progress.setWindowModality(Qt.WindowModal)
-
-            for i, batch in enumerate(batches):
-                progress.setValue(i)
-                progress.setLabelText(f"Обработка партии: {batch}...")
-                
-                if progress.wasCanceled():
-                    break
-
-                # Генерируем данные для партии
-                df = self.generate_batch_metrics(batch)
-                
-                # Создаем безопасное имя файла
-                safe_name = self.sanitize_filename(batch)
-                file_path = os.path.join(temp_dir, f"{safe_name}.xlsx")
-                
-                # Сохраняем в Excel
-                df.to_excel(file_path, index=False, engine='openpyxl')
-                exported_files.append(file_path)
-
-            # Добавляем общую сводку
-            if self.cb_include_all.isChecked():
-                df_all = self.generate_batch_metrics("Все партии")
-                file_path = os.path.join(temp_dir, "Все_партии.xlsx")
-                df_all.to_excel(file_path, index=False, engine='openpyxl')
-                exported_files.append(file_path)
-
-            progress.close()
-
-            # Предлагаем сохранить архив
-            zip_path, _ = QFileDialog.getSaveFileName(
+        try:
+            df = self.parent.current_static_data
+            if df is None:
+                raise ValueError("Нет данных для экспорта")
+            constraints = dict(self.parent.static_constraints)
+            cube = self.metrics_cube
+            fmt = self.format_combo.currentData()
+            include_all = self.cb_include_all.isChecked()
+
+            # Предлагаем сохранить файл
+            path, _ = QFileDialog.getSaveFileName(
                 self,
-                "Сохранить архив с метриками",
+                "Сохранить метрики",
                 "",
-                "ZIP Archives (*.zip)"
+                EXPORT_FORMATS[fmt][1]
             )
-            
-            if not zip_path:
-                shutil.rmtree(temp_dir)
+            if not path:
                 return
 
-            # Создаем ZIP-архив
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file in exported_files:
-                    zipf.write(file, os.path.basename(file))
-
-            # Удаляем временные файлы
-            shutil.rmtree(temp_dir)
-
-            QMessageBox.information(
-                self,
-                "Экспорт завершен",
-                f"Архив успешно сохранен:\n{zip_path}\n\n"
-                f"Экспортировано партий: {len(exported_files)}"
+            # Прогресс-диалог; число партий уточняется, когда куб готов
+            progress = QProgressDialog("Экспорт данных...", "Отмена", 0, 0, self)
+            progress.setWindowModality(Qt.WindowModal)
+            progress.setMinimumDuration(0)
+
+            def compute(token, report):
+                # Куб, если он еще не рассчитан, строится здесь же, а не в потоке интерфейса
+                export_cube = cube
+                if export_cube is None:
+                    report(0, 0, "Расчет метрик...")
+                    export_cube = self.load_or_build_cube(df, constraints)
+                token.raise_if_cancelled()
+                batches = [b for b in export_cube.index.get_level_values('batch').unique()
+                           if b != ALL_BATCHES] if 'batch_id' in df.columns else []
+                try:
+                    return MetricsExporter.export(
+                        export_cube, batches, path,
+                        fmt=fmt,
+                        include_all=include_all,
+                        progress=report,
+                        is_cancelled=lambda: token.cancelled
+                    )
+                except ExportCancelled:
+                    raise TaskCancelled()
+
+            def on_progress(done, total, label):
+                progress.setMaximum(total)
+                progress.setValue(done)
+                progress.setLabelText(label)
+
+            def on_finished(count):
+                progress.close()
+                QMessageBox.information(
+                    self,
+                    "Экспорт завершен",
+                    f"Файл успешно сохранен:\n{path}\n\n"
+                    f"Экспортировано партий: {count}"
+                )
+
+            def on_failed(message):
+                progress.close()
+                QMessageBox.critical(
+                    self,
+                    "Ошибка экспорта",
+                    f"Произошла ошибка при экспорте:\n{message}"
+                )
+
+            token = self.parent.task_runner.submit(
+                'export', compute,
+                on_finished=on_finished,
+                on_failed=on_failed,
+                on_progress=on_progress,
+                on_cancelled=progress.close
             )
+            # Токен отмены потокобезопасен, задача проверяет его между партиями
+            progress.canceled.connect(token.cancel)
 
         except Exception as e:
             QMessageBox.critical(
                 self,
                 "Ошибка экспорта",
-                f"Произошла ошибка при создании архива:\n{str(e)}"
+                f"Произошла ошибка при экспорте:\n{str(e)}"
             )
-            if 'temp_dir' in locals():
-                shutil.rmtree(temp_dir, ignore_errors=True)
 
     def get_available_batches(self):
         """Возвращает список всех уникальных партий"""
-        df = self.parent.current_static_data
+        cube = self.get_metrics_cube()
         batches = []
-        
-        if df is not None and 'batch_id' in df.columns:
-            batches = df['batch_id'].astype(str).unique().tolist()
-        
+
+        if cube is not None and 'batch_id' in self.parent.current_static_data.columns:
+            batches = [b for b in cube.index.get_level_values('batch').unique() if b != ALL_BATCHES]
+
         return batches
     
     def generate_batch_metrics(self, batch_name):
-        """Генерирует DataFrame с метриками для указанной партии"""
-        df = self.parent.current_static_data.copy()
-        
-        if batch_name != "Все партии" and 'batch_id' in df.columns:
-            df = df[df['batch_id'].astype(str) == batch_name]
-
-        # Рассчет метрик
-        constraints = self.parent.static_constraints
-        quality_index = QualityCalculator.calculate_quality_index(
-            df, constraints, 'static'
-        )
-        best_worst = QualityCalculator.calculate_actual_best_worst(df, constraints)
-
-        # Сбор данных
-        metrics = []
-        params = [col for col in df.columns 
-                if col not in ['id', 'timestamp', 'batch_id', 'product_id', 'date']]
-        
-        for param in params:
-            param_metrics = {
-                'Параметр': param,
-                'Тип данных': 'Числовой' if pd.api.types.is_numeric_dtype(df[param]) else 'Категориальный'
-            }
-            
-            if pd.api.types.is_numeric_dtype(df[param]):
-                data = df[param]
-                param_metrics.update({
-                    'Среднее': data.mean(),
-                    'Медиана': data.median(),
-                    'Ст. отклонение': data.std(),
-                    'Минимум': data.min(),
-                    'Максимум': data.max(),
-                    'Количество': data.count(),
-                    'За пределами норм': self.calculate_out_of_bounds(data, constraints.get(param, {})),
-                    'Лучшее значение': best_worst.get(param, {}).get('best', ''),
-                    'Худшее значение': best_worst.get(param, {}).get('worst', ''),
-                    'Разброс': best_worst.get(param, {}).get('best', 0) - best_worst.get(param, {}).get('worst', 0),
-                    'Индекс качества': quality_index.get(param, '')
-                })
-            else:
-                param_metrics.update({
-                    'Количество категорий': df[param].nunique(),
-                    'Самая частая категория': df[param].mode()[0] if not df[param].empty else '',
-                    'Количество значений': df[param].count()
-                })
-            
-            metrics.append(param_metrics)
-        
-        return pd.DataFrame(metrics)
+        """Возвращает DataFrame с метриками для указанной партии из куба метрик"""
+        return BatchMetricsEngine.batch_frame(self.get_metrics_cube(), batch_name)
 
     def sanitize_filename(self, name):
         """Очищает имя файла от недопустимых символов"""
-        cleaned = re.sub(r'[\\/*?:"<>|]', "_", str(name))
-        return cleaned[:50].strip()
\ No newline at end of file
+        return sanitize_filename(name)
\ No newline at end of file
@@ -4,36 +4,23 @@ from PyQt5.QtWidgets import (QMainWindow, QTabWidget, QWidget, QVBoxLayout, QHBo
                             QGridLayout, QScrollArea, QCheckBox, QTableWidget,QTableWidgetItem, QStackedWidget, QHeaderView, QSizePolicy, QProgressDialog)
 from PyQt5.QtGui import QIcon, QFont, QFontMetrics
 from PyQt5.QtCore import Qt
-from presentation.widgets.table_widget import TableWidget
-from presentation.widgets.plot_widget import PlotWidget
-from business.data_processor import DataProcessor
-from business.quality_calculator import QualityCalculator
-from data.data_manager import DataManager
-from data.database import PostgreSQLManager
-from business.arima_predictor import ARIMAPredictor
-
-from presentation.widgets.constraints_panel import ConstraintsPanel
+from presentation.widgets.plotly_view import PlotlyView
+from presentation.figure_cache import FigureCache, constraint_key
+from business.distribution_stats import DistributionStats
 
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import plotly.express as px  
-from PyQt5.QtWebEngineWidgets import QWebEngineView
+from plotly.colors import qualitative
 import pandas as pd
 import numpy as np
 
-import tempfile
-import shutil
-import zipfile
-import os
-import re
-
 
 class StaticResultsPage(QWidget):
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
         self.current_param = None
-        self.stats_cache = {}
+        self.figure_cache = FigureCache()
         self.params = []  # Список доступных параметров
         self.init_ui()
         self.setStyleSheet("background-color: #f0f0f0;")
@@ -81,7 +68,7 @@ class StaticResultsPage(QWidget):
         plot_wrapper.setLayout(QVBoxLayout())
         plot_wrapper.layout().setContentsMargins(0, 0, 0, 0)
         
-        self.plot_container = QWebEngineView()
+        self.plot_container = PlotlyView()
         self.plot_container.setSizePolicy(
             QSizePolicy.Expanding, 
             QSizePolicy.Expanding
@@ -290,7 +277,41 @@ class StaticResultsPage(QWidget):
         if df is None or param not in df.columns:
             return
 
-        constraints = self.parent.static_constraints.get(param, {})
+        dtype = 'numeric' if pd.api.types.is_numeric_dtype(df[param]) else 'categorical'
+
+        self._update_stats_table(df, param, dtype)
+
+        # Фигура уже просмотренной вкладки берется из кэша без фоновой задачи
+        constraints = dict(self.parent.static_constraints.get(param, {}))
+        key = self.figure_key(param, constraints)
+        payload = self.figure_cache.get(key)
+        if payload is not None:
+            self.parent.task_runner.cancel('static_figure')
+            self.plot_container.show_figure(payload)
+            self.prefetch_neighbours()
+            return
+
+        def compute(token, progress):
+            progress(0, 1, "Построение графиков...")
+            payload = self.build_figure(df, param, constraints)
+            self.figure_cache.put(key, payload)
+            return payload
+
+        def on_finished(payload):
+            self.plot_container.show_figure(payload)
+            self.prefetch_neighbours()
+
+        self.parent.run_task(
+            'static_figure', compute, on_finished,
+            lambda message: QMessageBox.warning(self, "Ошибка", f"Ошибка построения графиков: {message}")
+        )
+
+    def figure_key(self, param, constraints):
+        """Версия набора данных, параметр, партия (все) и ограничение параметра"""
+        return (self.parent.computation_cache.version('static'), param, None, constraint_key(constraints))
+
+    def build_figure(self, df, param, constraints):
+        """JSON фигуры 2x2 для параметра (можно вызывать вне потока интерфейса)"""
         dtype = 'numeric' if pd.api.types.is_numeric_dtype(df[param]) else 'categorical'
 
         # Остальной код визуализации остается без изменений
@@ -319,9 +340,30 @@ class StaticResultsPage(QWidget):
             margin=dict(l=50, r=50, t=80, b=50),
             hovermode='x unified'
         )
-        self.plot_container.setHtml(fig.to_html(include_plotlyjs='cdn'))
-        self._update_stats_table(df, param, dtype)
+        return fig.to_json()
+
+    def prefetch_neighbours(self):
+        """Фигуры соседних вкладок строятся в фоне, пока открыта текущая"""
+        index = self.param_tabs.currentIndex()
+        neighbours = [self.params[i] for i in (index + 1, index - 1) if 0 <= i < len(self.params)]
+        df = self.parent.current_static_data
+        pending = []
+        for param in neighbours:
+            # Ограничения фиксируются сейчас, чтобы фигура соответствовала ключу
+            constraints = dict(self.parent.static_constraints.get(param, {}))
+            key = self.figure_key(param, constraints)
+            if key not in self.figure_cache:
+                pending.append((param, constraints, key))
+        if df is None or not pending:
+            return
+
+        def compute(token, progress):
+            for param, constraints, key in pending:
+                token.raise_if_cancelled()
+                self.figure_cache.put(key, self.build_figure(df, param, constraints))
 
+        # Без отчета в строке состояния: предварительный расчет незаметен для пользователя
+        self.parent.task_runner.submit('static_prefetch', compute)
 
     def _get_titles(self, param, dtype):
         base = [
@@ -343,33 +385,22 @@ class StaticResultsPage(QWidget):
         self._add_hist_batch_comparison(fig, df, param, constraints, row=2, col=2)
 
     def _add_histogram(self, fig, df, param, constraints, row, col):
-        # Расчет выходящих за пределы значений
-        out_of_bounds = 0
-        if constraints:
-            if constraints['type'] == 'range':
-                min_val = constraints['min']
-                max_val = constraints['max']
-                out_of_bounds = df[(df[param] < min_val) | (df[param] > max_val)].shape[0]
-            elif constraints['type'] == 'min':
-                out_of_bounds = df[df[param] < constraints['value']].shape[0]
-            elif constraints['type'] == 'max':
-                out_of_bounds = df[df[param] > constraints['value']].shape[0]
-        
-        fig.add_trace(go.Histogram(
-            x=df[param],
+        # Столбцы считаются np.histogram, на график уходят только счетчики бинов
+        edges = DistributionStats.bin_edges(df[param])
+        counts = DistributionStats.histograms(df[param], edges)[0]
+        fig.add_trace(self._histogram_bars(
+            counts, edges,
             name=param,
             marker_color='#636efa',
             opacity=0.7,
-            hovertemplate=f"<b>{param}</b>: %{{x}}<br>Count: %{{y}}<extra></extra>"
+            hovertemplate=f"<b>{param}</b>: %{{customdata[0]:.4g}} - %{{customdata[1]:.4g}}"
+                          f"<br>Count: %{{y}}<extra></extra>"
         ), row=row, col=col)
         
         # Добавляем подписи осей
         fig.update_xaxes(title_text=param, row=row, col=col)
         fig.update_yaxes(title_text="Количество", row=row, col=col)
-        
-        # Сохраняем метрики для отображения в таблице
-        self.stats_cache[param] = self.stats_cache.get(param, {})
-        self.stats_cache[param]['out_of_bounds'] = int(out_of_bounds)
+
 
         # Добавляем линии ограничений
         if constraints.get('type') == 'range':
@@ -397,12 +428,8 @@ class StaticResultsPage(QWidget):
             )
 
     def _add_boxplot(self, fig, df, param, constraints, row, col):
-        fig.add_trace(go.Box(
-            y=df[param],
-            name=param,
-            boxpoints='outliers',
-            marker_color='#00cc96'
-        ), row=row, col=col)
+        stats = DistributionStats.box_stats(df[param]).iloc[0]
+        self._add_box(fig, stats, param, '#00cc96', row, col)
 
         # fig.update_xaxes(title_text=param, row=row, col=col)
         fig.update_yaxes(title_text="Значение", row=row, col=col)
@@ -430,18 +457,13 @@ class StaticResultsPage(QWidget):
         if 'batch_id' not in df.columns:
             return
         
-        batches = df['batch_id'].unique()
-        colors = px.colors.qualitative.Plotly
+        # Квартили и усы всех партий за один groupby
+        codes, batches = pd.factorize(df['batch_id'])
+        stats = DistributionStats.box_stats(df[param], codes, len(batches))
+        colors = qualitative.Plotly
         
         for i, batch in enumerate(batches):
-            batch_data = df[df['batch_id'] == batch][param]
-            fig.add_trace(go.Box(
-                y=batch_data,
-                name=str(batch),
-                marker_color=colors[i % len(colors)]),
-                row=row,
-                col=col
-            )
+            self._add_box(fig, stats.iloc[i], str(batch), colors[i % len(colors)], row, col)
 
         fig.update_xaxes(title_text="Партия", row=row, col=col)
         fig.update_yaxes(title_text=param, row=row, col=col)
@@ -475,28 +497,20 @@ class StaticResultsPage(QWidget):
         if 'batch_id' not in df.columns:
             return
         
-        batches = df['batch_id'].unique()
-        colors = px.colors.qualitative.Plotly
+        codes, batches = pd.factorize(df['batch_id'])
+        colors = qualitative.Plotly
         
-        # Рассчитываем общие границы для бинов
-        x_min = df[param].min()
-        x_max = df[param].max()
-        n_bins = 20
-        bin_size = (x_max - x_min)/n_bins
+        # Общие для всех партий 20 бинов; счетчики всех партий - одним bincount
+        edges = DistributionStats.bin_edges(df[param], bins=20)
+        counts = DistributionStats.histograms(df[param], edges, codes, len(batches))
 
         # Добавляем гистограммы для каждого батча
         for i, batch in enumerate(batches):
-            batch_data = df[df['batch_id'] == batch][param]
-            fig.add_trace(go.Histogram(
-                x=batch_data,
+            fig.add_trace(self._histogram_bars(
+                counts[i], edges,
                 name=f'Партия {batch}',
                 marker_color=colors[i % len(colors)],
                 opacity=0.6,
-                xbins=dict(
-                    start=x_min,
-                    end=x_max,
-                    size=bin_size
-                ),
                 hoverinfo='y+name'
             ), row=row, col=col)
 
@@ -538,6 +552,43 @@ class StaticResultsPage(QWidget):
                 row=row, col=col
             )
 
+    @staticmethod
+    def _histogram_bars(counts, edges, **kwargs):
+        """Гистограмма из готовых счетчиков: столбец на бин шириной в бин"""
+        return go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=counts,
+            width=np.diff(edges),
+            customdata=np.column_stack([edges[:-1], edges[1:]]),
+            **kwargs
+        )
+
+    @staticmethod
+    def _add_box(fig, stats, name, color, row, col):
+        """Box-plot по готовым квартилям и усам; выбросы - отдельными точками"""
+        if pd.isna(stats['q1']):
+            return
+        fig.add_trace(go.Box(
+            x=[name],
+            q1=[stats['q1']],
+            median=[stats['median']],
+            q3=[stats['q3']],
+            mean=[stats['mean']],
+            lowerfence=[stats['lowerfence']],
+            upperfence=[stats['upperfence']],
+            name=name,
+            marker_color=color
+        ), row=row, col=col)
+        if len(stats['outliers']):
+            fig.add_trace(go.Scatter(
+                x=[name] * len(stats['outliers']),
+                y=stats['outliers'],
+                mode='markers',
+                name=name,
+                marker=dict(color=color, size=4),
+                showlegend=False
+            ), row=row, col=col)
+
     def _add_categorical_visualizations(self, fig, df, param, constraints, unique_values):
         # Столбчатая диаграмма с выделением недопустимых категорий
         self._add_bar_chart(fig, df, param, constraints, row=1, col=1)
@@ -601,7 +652,7 @@ class StaticResultsPage(QWidget):
             if allowed and category not in allowed:
                 color = '#ff7f0e'  # Оранжевый для недопустимых
             else:
-                color = px.colors.qualitative.Plotly[i % 10]
+                color = qualitative.Plotly[i % 10]
                 
             fig.add_trace(go.Bar(
                 x=counts.index,
@@ -625,7 +676,7 @@ class StaticResultsPage(QWidget):
             if allowed and category not in allowed:
                 colors.append('#ff7f0e')  # Оранжевый для недопустимых
             else:
-                colors.append(px.colors.qualitative.Plotly[len(colors) % 10])
+                colors.append(qualitative.Plotly[len(colors) % 10])
         
         fig.add_trace(go.Pie(
             labels=counts.index,
@@ -642,6 +693,17 @@ class StaticResultsPage(QWidget):
             col=col
         )
 
+    @staticmethod
+    def out_of_bounds(values, constraints):
+        """Число значений за пределами ограничения параметра"""
+        if constraints.get('type') == 'range':
+            return int(((values < constraints['min']) | (values > constraints['max'])).sum())
+        if constraints.get('type') == 'min':
+            return int((values < constraints['value']).sum())
+        if constraints.get('type') == 'max':
+            return int((values > constraints['value']).sum())
+        return 0
+
     def _update_stats_table(self, df, param, dtype):
         stats = {}
         best = ''
@@ -667,7 +729,10 @@ class StaticResultsPage(QWidget):
                 'Минимум': df[param].min(),
                 'Максимум': df[param].max(),
                 'Количество': df[param].count(),
-                'За пределами норм': self.stats_cache.get(param, {}).get('out_of_bounds', 0),
+                # Считается по текущим ограничениям: фигура могла быть взята из кэша
+                'За пределами норм': self.out_of_bounds(
+                    df[param], self.parent.static_constraints.get(param, {})
+                ),
                 'Лучшее значение': best,
                 'Худшее значение': worst,
                 'Разброс': spread,
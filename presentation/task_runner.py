@@ -0,0 +1,149 @@
+# presentation/task_runner.py
+import logging
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCancelled(Exception):
+    """Задача отменена или вытеснена более новым запросом"""
+
+
+class CancelToken:
+    """Флаг отмены, который задача опрашивает между шагами"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled()
+
+
+class TaskSignals(QObject):
+    """Сигналы задачи; объект живет в потоке интерфейса, поэтому слоты
+    вызываются в нем же через очередь событий"""
+    progress = pyqtSignal(int, int, str)
+    partial = pyqtSignal(object)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class TaskProgress:
+    """Отчет задачи: progress(done, total, label) и publish(obj) для
+    промежуточных результатов, которые интерфейс показывает до завершения"""
+
+    def __init__(self, signals):
+        self._signals = signals
+
+    def __call__(self, done, total, label):
+        self._signals.progress.emit(done, total, label)
+
+    def publish(self, result):
+        self._signals.partial.emit(result)
+
+
+class Task(QRunnable):
+    def __init__(self, key, fn, token):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.fn = fn
+        self.token = token
+        self.signals = TaskSignals()
+
+    def run(self):
+        try:
+            self.token.raise_if_cancelled()
+            result = self.fn(self.token, TaskProgress(self.signals))
+            self.token.raise_if_cancelled()
+            self.signals.finished.emit(result)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            logger.exception("Ошибка фоновой задачи %s", self.key)
+            self.signals.failed.emit(str(e))
+
+
+class TaskRunner(QObject):
+    """Планировщик тяжелых операций на QThreadPool.
+
+    fn(token, progress) выполняется вне потока интерфейса: token - CancelToken,
+    progress - TaskProgress для отчета о ходе работы и промежуточных
+    результатов. Обработчики on_finished/on_failed/on_progress/on_partial/
+    on_cancelled вызываются в потоке интерфейса. Задачи с одинаковым ключом схлопываются: новая задача
+    отменяет предыдущую, а результат устаревшей задачи отбрасывается.
+    """
+
+    def __init__(self, parent=None, max_threads=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if max_threads:
+            self.pool.setMaxThreadCount(max_threads)
+        self._active = {}
+        self._tasks = set()  # Ссылки на задачи до их завершения в пуле
+
+    def submit(self, key, fn, on_finished=None, on_failed=None, on_progress=None, on_cancelled=None,
+               on_partial=None):
+        """Ставит задачу в пул и возвращает ее CancelToken"""
+        self.cancel(key)
+
+        task = Task(key, fn, CancelToken())
+        self._active[key] = task
+        self._tasks.add(task)
+
+        def current(handler):
+            # Результат вытесненной задачи до интерфейса не доходит
+            def slot(*args):
+                if self._active.get(key) is not task:
+                    return
+                if handler is not None:
+                    handler(*args)
+            return slot
+
+        def done(handler):
+            def slot(*args):
+                if self._active.get(key) is not task:
+                    return
+                del self._active[key]
+                if handler is not None:
+                    handler(*args)
+            return slot
+
+        task.signals.progress.connect(current(on_progress))
+        task.signals.partial.connect(current(on_partial))
+        task.signals.finished.connect(done(on_finished))
+        task.signals.failed.connect(done(on_failed))
+        task.signals.cancelled.connect(done(on_cancelled))
+        for signal in (task.signals.finished, task.signals.failed, task.signals.cancelled):
+            signal.connect(lambda *args: self._tasks.discard(task))
+        self.pool.start(task)
+        return task.token
+
+    def cancel(self, key):
+        """Отменяет задачу с ключом key; еще не начатая задача снимается с очереди"""
+        task = self._active.pop(key, None)
+        if task is None:
+            return
+        task.token.cancel()
+        if self.pool.tryTake(task):
+            self._tasks.discard(task)
+
+    def is_running(self, key):
+        return key in self._active
+
+    def shutdown(self, timeout_ms=5000):
+        """Отменяет все задачи и ждет завершения уже начатых"""
+        for key in list(self._active):
+            self.cancel(key)
+        self.pool.waitForDone(timeout_ms)
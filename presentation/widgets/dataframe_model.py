@@ -0,0 +1,270 @@
+# presentation/widgets/dataframe_model.py
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+COMPARISONS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '!=': operator.ne,
+    '==': operator.eq,
+    '=': operator.eq,
+    '>': operator.gt,
+    '<': operator.lt,
+}
+EXPRESSION_RE = re.compile(r'^\s*(>=|<=|!=|==|=|>|<)?\s*(.*?)\s*$')
+MISSING_WORDS = ('пусто', 'пустые')
+PRESENT_WORDS = ('не пусто', 'непустые')
+
+FILTER_HELP = (
+    "Числа и даты: > 5, <= 2024-01-31, != 0, 1..10 (диапазон)\n"
+    "Текст: подстрока без учета регистра, = значение, != значение\n"
+    "Любой столбец: пусто, не пусто"
+)
+
+
+def missing_mask(values, categories=None):
+    """Маска пропусков столбца без создания объектов для числовых типов"""
+    if categories is not None:
+        return values < 0
+    kind = values.dtype.kind
+    if kind == 'f' or kind == 'c':
+        return np.isnan(values)
+    if kind in 'mM':
+        return np.isnat(values)
+    if kind in 'biu':
+        return np.zeros(len(values), dtype=bool)
+    return pd.isna(values)
+
+
+def column_mask(values, categories, expression):
+    """Булева маска строк столбца, удовлетворяющих выражению фильтра (см. FILTER_HELP).
+
+    Для столбцов category условие проверяется один раз на категориях,
+    строки получают результат по коду. Неверное выражение - ValueError.
+    """
+    expression = expression.strip()
+    lowered = expression.lower()
+    if lowered in MISSING_WORDS:
+        return missing_mask(values, categories)
+    if lowered in PRESENT_WORDS:
+        return ~missing_mask(values, categories)
+
+    if categories is not None:
+        by_category = column_mask(categories, None, expression)
+        # Код -1 (пропуск) попадает на последний элемент - False
+        return np.append(by_category, False)[values]
+
+    kind = values.dtype.kind
+    if kind in 'biufM':
+        if kind == 'M':
+            convert = lambda text: pd.Timestamp(text).to_datetime64()
+        else:
+            convert = float
+        try:
+            if '..' in expression:
+                low, high = (convert(part.strip()) for part in expression.split('..', 1))
+                return (values >= low) & (values <= high)
+            sign, operand = EXPRESSION_RE.match(expression).groups()
+            mask = COMPARISONS[sign or '='](values, convert(operand))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Неверное условие «{expression}»: {e}") from None
+        return mask & ~missing_mask(values) if sign == '!=' else mask
+
+    missing = missing_mask(values)
+    strings = pd.Series(values, copy=False).astype(str).str.lower()
+    sign, operand = EXPRESSION_RE.match(lowered).groups()
+    if sign in ('=', '=='):
+        mask = (strings == operand).to_numpy()
+    elif sign == '!=':
+        mask = (strings != operand).to_numpy()
+    elif sign is None:
+        mask = strings.str.contains(operand, regex=False).to_numpy()
+    else:
+        raise ValueError(f"Сравнение «{sign}» применимо только к числам и датам")
+    return mask & ~missing
+
+
+class DataFrameModel(QAbstractTableModel):
+    """Модель таблицы поверх массивов NumPy столбцов DataFrame.
+
+    Объекты ячеек не создаются: представление запрашивает data() только для
+    видимых строк, и значение форматируется в момент запроса. Для столбцов
+    category хранятся коды и категории, а не массив объектов.
+
+    Сортировка и фильтры не копируют данные: строки представления - это
+    перестановка индексов исходных строк. Перестановка сортировки по
+    столбцу (np.argsort) кэшируется, фильтры - векторные булевы маски.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._headers = []
+        self._columns = []
+        self._total = 0
+        self._rows = 0
+        self._view = None        # Исходные номера строк представления (None - все по порядку)
+        self._sort = None        # (столбец, по убыванию)
+        self._filters = {}       # столбец -> выражение фильтра
+        self._masks = {}         # (столбец, выражение) -> маска
+        self._sort_cache = {}    # столбец -> перестановка по возрастанию
+
+    def set_frame(self, df):
+        self.beginResetModel()
+        self._headers = [str(col) for col in df.columns]
+        self._columns = [self._column(df.iloc[:, i]) for i in range(df.shape[1])]
+        self._total = self._rows = len(df)
+        self._view = None
+        self._sort = None
+        self._filters = {}
+        self._masks = {}
+        self._sort_cache = {}
+        self.endResetModel()
+
+    @staticmethod
+    def _column(series):
+        """(значения, категории); категории заданы только для столбцов category"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series.cat.codes.to_numpy(), series.cat.categories.to_numpy()
+        return series.to_numpy(), None
+
+    @property
+    def total_rows(self):
+        return self._total
+
+    def source_row(self, row):
+        """Номер строки в DataFrame для строки представления"""
+        return int(self._view[row]) if self._view is not None else row
+
+    def value(self, row, col):
+        values, categories = self._columns[col]
+        value = values[self.source_row(row)]
+        if categories is not None:
+            return None if value < 0 else categories[value]
+        return value
+
+    def text(self, row, col):
+        """Значение ячейки в виде строки; пропуски - пустая строка"""
+        value = self.value(row, col)
+        if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+            return ""
+        if isinstance(value, np.datetime64):
+            return str(pd.Timestamp(value))
+        return str(value)
+
+    # --- Сортировка и фильтры ------------------------------------------------
+
+    def _ascending(self, col):
+        """Перестановка строк по возрастанию столбца, пропуски в конце"""
+        if col not in self._sort_cache:
+            values, categories = self._columns[col]
+            if categories is not None:
+                # Коды заменяются рангами категорий по значению; код -1 - последний ранг
+                ranks = np.empty(len(categories) + 1, dtype=np.int64)
+                ranks[pd.Index(categories).argsort()] = np.arange(len(categories))
+                ranks[-1] = len(categories)
+                order = np.argsort(ranks[values], kind='stable')
+            elif values.dtype.kind in 'biufmM':
+                order = np.argsort(values, kind='stable')
+            else:
+                series = pd.Series(values, copy=False)
+                try:
+                    order = series.sort_values(kind='stable', na_position='last').index.to_numpy()
+                except TypeError:
+                    # Значения разных типов сравниваются как строки
+                    series = series.where(series.isna(), series.astype(str))
+                    order = series.sort_values(kind='stable', na_position='last').index.to_numpy()
+            self._sort_cache[col] = order
+        return self._sort_cache[col]
+
+    def _order(self, col, descending):
+        order = self._ascending(col)
+        if not descending:
+            return order
+        values, categories = self._columns[col]
+        present = len(order) - int(missing_mask(values, categories).sum())
+        return np.concatenate([order[:present][::-1], order[present:]])
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Сортировка по столбцу (вызывается представлением); column < 0 - исходный порядок"""
+        self._sort = (column, order == Qt.DescendingOrder) if 0 <= column < len(self._columns) else None
+        self._apply()
+
+    def filter_expression(self, col):
+        return self._filters.get(col, "")
+
+    def set_filter(self, col, expression):
+        """Фильтр столбца; пустое выражение снимает фильтр. Неверное - ValueError"""
+        expression = expression.strip()
+        if expression:
+            self._mask(col, expression)  # Ошибка выражения - до изменения модели
+            self._filters[col] = expression
+        else:
+            self._filters.pop(col, None)
+        self._apply()
+
+    def clear_filters(self):
+        self._filters = {}
+        self._apply()
+
+    def _mask(self, col, expression):
+        key = (col, expression)
+        if key not in self._masks:
+            values, categories = self._columns[col]
+            self._masks[key] = column_mask(values, categories, expression)
+        return self._masks[key]
+
+    def _apply(self):
+        """Пересчет строк представления: перестановка сортировки, затем маска фильтров"""
+        self.beginResetModel()
+        view = self._order(*self._sort) if self._sort is not None else None
+        mask = None
+        for col, expression in self._filters.items():
+            column = self._mask(col, expression)
+            mask = column if mask is None else mask & column
+        if mask is not None:
+            view = np.flatnonzero(mask) if view is None else view[mask[view]]
+        # Маски снятых фильтров больше не нужны
+        self._masks = {key: value for key, value in self._masks.items()
+                       if self._filters.get(key[0]) == key[1]}
+        self._view = view
+        self._rows = self._total if view is None else len(view)
+        self.endResetModel()
+
+    # --- QAbstractTableModel -------------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.text(index.row(), index.column())
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal:
+            if section >= len(self._headers):
+                return None
+            if role == Qt.DisplayRole:
+                # Отфильтрованные столбцы отмечаются звездочкой
+                return self._headers[section] + (" *" if section in self._filters else "")
+            if role == Qt.ToolTipRole and section in self._filters:
+                return f"Фильтр: {self._filters[section]}"
+            return None
+        if role == Qt.DisplayRole:
+            return str(self.source_row(section) + 1)
+        return None
+
+    def flags(self, index):
+        # Только просмотр: ячейки выделяются, но не редактируются
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
@@ -0,0 +1,121 @@
+# presentation/widgets/plotly_view.py
+import html
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from PyQt5.QtCore import QUrl
+from PyQt5.QtWebEngineWidgets import QWebEngineView
+
+logger = logging.getLogger(__name__)
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+{script}
+<style>
+    html, body {{ margin: 0; height: 100%; background: white; }}
+    #plot {{ width: 100%; height: 100%; }}
+</style>
+</head>
+<body>
+<div id="plot"></div>
+<script>
+    function render(figure) {{
+        Plotly.react('plot', figure.data, figure.layout || {{}}, {{responsive: true}});
+    }}
+</script>
+</body>
+</html>
+"""
+
+ERROR_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"></head>
+<body style="font-family: sans-serif; color: #b00020; padding: 16px;">
+Графики недоступны: {reason}
+</body></html>
+"""
+
+
+def plotly_js_path():
+    """Локальный plotly.min.js: QC_PLOTLY_JS, файл из пакета plotly или его
+    копия во временном каталоге (setHtml не принимает страницы больше 2 МБ,
+    поэтому скрипт не встраивается в страницу)"""
+    configured = os.getenv("QC_PLOTLY_JS")
+    if configured:
+        if Path(configured).is_file():
+            return Path(configured)
+        logger.warning("QC_PLOTLY_JS=%s: файл не найден, используется plotly.js из пакета", configured)
+    import plotly
+    bundled = Path(plotly.__file__).parent / 'package_data' / 'plotly.min.js'
+    if bundled.exists():
+        return bundled
+
+    from plotly.offline import get_plotlyjs
+    copy = Path(tempfile.gettempdir()) / 'quality_control' / f'plotly-{plotly.__version__}.min.js'
+    if not copy.exists():
+        copy.parent.mkdir(parents=True, exist_ok=True)
+        copy.write_text(get_plotlyjs(), encoding='utf-8')
+    return copy
+
+
+class PlotlyView(QWebEngineView):
+    """Окно графиков plotly без перезагрузки страницы.
+
+    Страница с plotly.js из локального файла (без CDN) загружается один раз,
+    новые фигуры передаются в нее через runJavaScript и Plotly.react, который
+    обновляет только изменившиеся трассы. Фигура, переданная до окончания
+    загрузки страницы, отображается сразу после нее. Если страница или
+    plotly.js не загрузились, причина пишется в лог и показывается в окне.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ready = False
+        self._failed = False
+        self._pending = None
+        self.loadFinished.connect(self._on_load_finished)
+
+        self._script_path = plotly_js_path()
+        script = f'<script src="{self._script_path.name}"></script>'
+        self.setHtml(PAGE_TEMPLATE.format(script=script),
+                     QUrl.fromLocalFile(str(self._script_path.parent) + os.sep))
+
+    def _on_load_finished(self, ok):
+        if self._failed:
+            return  # Загрузилась страница с сообщением об ошибке
+        if not ok:
+            self._fail("страница графиков не загрузилась")
+            return
+        # Страница загружается и без скрипта - проверяется, что Plotly определен
+        self.page().runJavaScript("typeof Plotly", self._on_plotly_checked)
+
+    def _on_plotly_checked(self, kind):
+        if kind in (None, 'undefined'):
+            self._fail(f"не удалось загрузить {self._script_path}")
+            return
+        self._ready = True
+        if self._pending is not None:
+            payload, self._pending = self._pending, None
+            self._render(payload)
+
+    def _fail(self, reason):
+        self._failed = True
+        self._pending = None
+        logger.error("Графики недоступны: %s", reason)
+        self.setHtml(ERROR_TEMPLATE.format(reason=html.escape(reason)))
+
+    def show_figure(self, figure):
+        """figure - go.Figure или ее JSON (fig.to_json(), можно получить в фоновом потоке)"""
+        if self._failed:
+            return
+        payload = figure if isinstance(figure, str) else figure.to_json()
+        if not self._ready:
+            self._pending = payload
+            return
+        self._render(payload)
+
+    def _render(self, payload):
+        self.page().runJavaScript(f"render({payload});")
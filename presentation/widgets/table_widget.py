@@ -1,19 +1,40 @@
 # presentation/widgets/table_widget.py
-from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView
+import numpy as np
 from PyQt5.QtCore import Qt
-from data.data_manager import DataManager
-from business.data_processor import DataProcessor
+from PyQt5.QtWidgets import QTableView, QHeaderView, QAbstractItemView, QMenu, QInputDialog, QMessageBox
+
+from presentation.widgets.dataframe_model import DataFrameModel, FILTER_HELP
+
+SAMPLE_ROWS = 100  # Строк, по которым подбирается ширина столбцов
+
+
+class TableWidget(QTableView):
+    """Просмотр DataFrame любого размера через DataFrameModel.
+
+    Щелчок по заголовку сортирует по столбцу, контекстное меню заголовка -
+    сортировка и фильтр столбца.
+    """
 
-class TableWidget(QTableWidget):
     def __init__(self):
         super().__init__()
-        self.setEditTriggers(QTableWidget.NoEditTriggers)  # Блокировка редактирования
-        self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)  # Авто-ширина
+        self.data_model = DataFrameModel(self)
+        self.setModel(self.data_model)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)  # Блокировка редактирования
+        # Ширина подбирается по выборке строк, а не по всем строкам (ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         self.horizontalHeader().setStretchLastSection(True)  # Растягивание последнего столбца
+        self.horizontalHeader().setMinimumSectionSize(100)  # Минимальная ширина
         self.verticalHeader().setVisible(False)  # Скрыть вертикальные заголовки
+        # Одинаковая высота строк: прокрутка не требует измерения строк
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.setAlternatingRowColors(True)  # Чередование цветов строк
+        # Без сортировки до первого щелчка по заголовку
+        self.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.setSortingEnabled(True)
+        self.horizontalHeader().setContextMenuPolicy(Qt.CustomContextMenu)
+        self.horizontalHeader().customContextMenuRequested.connect(self.show_header_menu)
         self.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 font: 10pt "Segoe UI";
                 gridline-color: #E0E0E0;
             }
@@ -24,28 +45,53 @@ class TableWidget(QTableWidget):
             }
         """)
 
-    def display_data(self, df, max_rows=15):
-        self.clear()
-        self.setColumnCount(len(df.columns))
-        self.setRowCount(min(max_rows, len(df)))
-        self.setHorizontalHeaderLabels(df.columns)
-        
-        # Заполнение данными
-        for row in range(min(max_rows, len(df))):
-            for col in range(len(df.columns)):
-                item = QTableWidgetItem(str(df.iloc[row, col]))
-                
-                # Дополнительные настройки для запрета редактирования
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                item.setTextAlignment(Qt.AlignCenter)
-                
-                self.setItem(row, col, item)
-        
-        # Оптимизация ширины столбцов
-        self.resizeColumnsToContents()
-        self.horizontalHeader().setMinimumSectionSize(100)  # Минимальная ширина
-        
-        # Установка разумных пределов
-        for col in range(self.columnCount()):
-            current_width = self.columnWidth(col)
-            self.setColumnWidth(col, min(current_width, 300))
\ No newline at end of file
+    def display_data(self, df, max_rows=None):
+        """Показывает df целиком (или первые max_rows строк)"""
+        if max_rows is not None:
+            df = df.iloc[:max_rows]
+        self.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.data_model.set_frame(df)
+        self.fit_columns()
+
+    def fit_columns(self, max_width=300):
+        """Ширина столбцов по заголовку и равномерной выборке строк"""
+        model = self.data_model
+        rows = model.rowCount()
+        sample = np.unique(np.linspace(0, rows - 1, min(rows, SAMPLE_ROWS)).astype(int)) if rows else []
+        metrics = self.fontMetrics()
+        padding = 24
+        for col in range(model.columnCount()):
+            texts = [model.headerData(col, Qt.Horizontal)] + [model.text(row, col) for row in sample]
+            width = max(metrics.horizontalAdvance(text) for text in texts) + padding
+            self.setColumnWidth(col, min(width, max_width))
+
+    def show_header_menu(self, pos):
+        col = self.horizontalHeader().logicalIndexAt(pos)
+        if col < 0:
+            return
+        model = self.data_model
+        menu = QMenu(self)
+        menu.addAction("Сортировать по возрастанию", lambda: self.sortByColumn(col, Qt.AscendingOrder))
+        menu.addAction("Сортировать по убыванию", lambda: self.sortByColumn(col, Qt.DescendingOrder))
+        menu.addAction("Исходный порядок", lambda: self.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder))
+        menu.addSeparator()
+        menu.addAction("Фильтр...", lambda: self.edit_filter(col))
+        if model.filter_expression(col):
+            menu.addAction("Снять фильтр", lambda: model.set_filter(col, ""))
+        if any(model.filter_expression(c) for c in range(model.columnCount())):
+            menu.addAction("Снять все фильтры", model.clear_filters)
+        menu.exec_(self.horizontalHeader().mapToGlobal(pos))
+
+    def edit_filter(self, col):
+        model = self.data_model
+        name = model.headerData(col, Qt.Horizontal).rstrip(" *")
+        expression, ok = QInputDialog.getText(
+            self, "Фильтр", f"Условие для «{name}»:\n{FILTER_HELP}",
+            text=model.filter_expression(col)
+        )
+        if not ok:
+            return
+        try:
+            model.set_filter(col, expression)
+        except ValueError as e:
+            QMessageBox.warning(self, "Фильтр", str(e))
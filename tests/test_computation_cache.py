@@ -0,0 +1,51 @@
+# tests/test_computation_cache.py
+import numpy as np
+import pandas as pd
+
+from business.computation_cache import ComputationCache
+
+
+CONSTRAINTS = {'temp': {'type': 'range', 'min': 20, 'max': 25}}
+
+
+def test_invalidate_drops_scores():
+    cache = ComputationCache()
+    cache.quality('static', pd.DataFrame({'temp': [20.0, 23.0]}), CONSTRAINTS)
+    assert cache._scores
+
+    cache.invalidate('static')
+    assert not cache._scores and not cache._aggregates
+
+
+def test_stale_result_is_not_stored_after_invalidate():
+    cache = ComputationCache()
+    df = pd.DataFrame({'temp': [20.0, 23.0]})
+    calculate = cache.reduction
+
+    def reduction_with_reload(*args):
+        # Новые данные загрузились, пока шел фоновый расчет
+        result = calculate(*args)
+        cache.invalidate('static')
+        return result
+
+    cache.reduction = reduction_with_reload
+    cache.quality('static', df, CONSTRAINTS)
+    assert not cache._scores and not cache._aggregates
+
+    cache = ComputationCache()
+    version = cache.version('static')
+    cache.invalidate('static')
+    cache._store(cache._aggregates, cache._aggregate_key('static', 'temp', CONSTRAINTS['temp'], version), 1.0)
+    assert not cache._aggregates
+
+
+def test_nan_aggregate_is_not_cached():
+    cache = ComputationCache()
+    df = pd.DataFrame({'temp': [np.nan, np.nan]})
+    constraints = {'temp': {'type': 'min'}}
+
+    first, _ = cache.quality('static', df, constraints)
+    second, _ = cache.quality('static', df, constraints)
+
+    assert not cache._scores
+    assert first.equals(second)
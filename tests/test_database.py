@@ -0,0 +1,55 @@
+# tests/test_database.py
+import io
+
+import numpy as np
+import pandas as pd
+
+from data.database import PostgreSQLManager
+
+
+def copy_round_trip(df, batch_col, product_col, time_col):
+    """Строки measurements так, как их вернет SELECT после COPY ... FORMAT csv"""
+    service = {batch_col, product_col, time_col}
+    params = [c for c in df.columns if c not in service]
+    numeric = [c for c in params if pd.api.types.is_numeric_dtype(df[c])]
+    text = [c for c in params if c not in numeric]
+    buffer = PostgreSQLManager._measurements_csv(df, 1, 0, batch_col, product_col, time_col, numeric, text)
+
+    # COPY: пустое незакавыченное поле - NULL; value - DOUBLE PRECISION
+    long = pd.read_csv(buffer, header=None, names=list(PostgreSQLManager.MEASUREMENT_COLUMNS),
+                       keep_default_na=False, na_values=[''], dtype={'value': np.float64, 'value_text': object})
+    long['timestamp'] = pd.to_datetime(long['timestamp'])
+    long = long.astype(object).where(long.notna(), None)
+    rows = long[['row_num', 'batch_id', 'product_id', 'timestamp', 'param', 'value', 'value_text']].values.tolist()
+    layout = {
+        'keys': {'batch_id': batch_col, 'product_id': product_col, 'timestamp': time_col},
+        'dtypes': {str(c): str(df[c].dtype) for c in df.columns},
+    }
+    return PostgreSQLManager._wide_frame(rows, [str(c) for c in df.columns], layout)
+
+
+def test_round_trip_keeps_ids_names_and_types():
+    df = pd.DataFrame({
+        'id': [1, 2, 3],
+        'Time': pd.to_datetime(['2024-01-01 00:00', '2024-01-01 01:00', '2024-01-01 02:00']),
+        'batch': ['B1', 'B1', None],
+        'product_id': ['P1', None, 'P3'],
+        'temp': [1.5, np.nan, 2.5],
+        'passed': [True, False, True],
+        'checked': pd.array([True, None, False], dtype='boolean'),
+        'count': np.array([3, 4, 5], dtype=np.int16),
+    })
+    restored = copy_round_trip(df, 'batch', 'product_id', 'Time')
+
+    assert list(restored.columns) == list(df.columns)
+    for col in ('id', 'temp', 'passed', 'checked', 'count'):
+        pd.testing.assert_series_equal(restored[col], df[col], check_names=False)
+    assert restored['batch'].isna().tolist() == [False, False, True]
+    assert restored['product_id'].isna().tolist() == [False, True, False]
+
+
+def test_bool_values_are_written_as_numbers():
+    df = pd.DataFrame({'batch_id': ['B1', 'B2'], 'passed': [True, False]})
+    buffer = PostgreSQLManager._measurements_csv(df, 1, 0, 'batch_id', None, None, ['passed'], [])
+    values = [line.split(',')[6] for line in buffer.getvalue().splitlines()]
+    assert values == ['1.0', '0.0']
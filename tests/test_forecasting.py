@@ -0,0 +1,74 @@
+# tests/test_forecasting.py
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import business.arima_predictor as arima_predictor
+from business.arima_predictor import ARIMAPredictor, shutdown_forecast_pool
+from business.forecast_engines import ForecastEngine, get_engine
+from business.model_cache import ModelCache
+
+
+def make_series(count, points=60):
+    times = pd.date_range('2024-01-01', periods=points, freq='D')
+    return {
+        f"B{i}": pd.DataFrame({'timestamp': times, 'v': np.random.default_rng(i).normal(size=points).cumsum()})
+        for i in range(count)
+    }
+
+
+class CrashEngine(ForecastEngine):
+    """Движок, процесс которого аварийно завершается на ряде с первым значением crash_on"""
+    name = 'crash'
+
+    def fit(self, series):
+        if series.iloc[0] == self.options['crash_on']:
+            os._exit(1)
+        return get_engine('ses').fit(series)
+
+
+def test_broken_worker_fails_one_batch():
+    series = make_series(5)
+    series['B2'].loc[0, 'v'] = 12345.0
+    engine = CrashEngine(crash_on=12345.0)
+    try:
+        results = {batch: (result, error) for batch, result, error in ARIMAPredictor.predict_many(
+            series, 'v', workers=2, model_cache=ModelCache(), engine=engine
+        )}
+    finally:
+        shutdown_forecast_pool()
+
+    assert set(results) == set(series)
+    failed = [batch for batch, (_, error) in results.items() if error is not None]
+    assert len(failed) == 1
+    assert all(result is not None for batch, (result, _) in results.items() if batch not in failed)
+
+
+def test_pool_is_reused_between_forecasts():
+    engine = CrashEngine(crash_on=np.inf)
+    try:
+        list(ARIMAPredictor.predict_many(make_series(4), 'v', workers=2, model_cache=ModelCache(), engine=engine))
+        pool = arima_predictor._pool
+        list(ARIMAPredictor.predict_many(make_series(4, 70), 'v', workers=2, model_cache=ModelCache(), engine=engine))
+        assert pool is not None and arima_predictor._pool is pool
+    finally:
+        shutdown_forecast_pool()
+
+
+def test_fast_engine_stays_in_process():
+    # Тот же вызов, что делает страница динамики при включенном параллельном режиме
+    shutdown_forecast_pool()
+    series = make_series(8)
+    started = time.monotonic()
+    results = list(ARIMAPredictor.predict_many(
+        series, 'v', time_col='timestamp', workers=None,
+        is_cancelled=lambda: False, model_cache=ModelCache(), engine=get_engine('ses')
+    ))
+    elapsed = time.monotonic() - started
+
+    assert arima_predictor._pool is None
+    assert sorted(batch for batch, _, _ in results) == sorted(series)
+    assert all(error is None for _, _, error in results)
+    assert elapsed < 1.5
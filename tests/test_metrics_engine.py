@@ -0,0 +1,43 @@
+# tests/test_metrics_engine.py
+import json
+
+import pandas as pd
+
+from business.metrics_engine import ALL_BATCHES, BatchMetricsEngine
+
+
+def make_frame():
+    return pd.DataFrame({
+        'lot': ['A', 'A', 'B', 'B'],
+        'temp': [18.0, 21.0, 26.0, None],
+        'weight': [1.0, 2.0, 3.0, 4.0],
+        'grade': ['x', 'y', 'x', None],
+    })
+
+
+def test_custom_batch_column_is_not_a_param():
+    cube = BatchMetricsEngine.build_cube(make_frame(), {}, batch_col='lot')
+    assert set(cube.index.get_level_values('param')) == {'temp', 'weight', 'grade'}
+    assert list(pd.unique(cube.index.get_level_values('batch'))) == [ALL_BATCHES, 'A', 'B']
+
+
+def test_violations_only_for_constrained_params():
+    constraints = {'temp': {'type': 'range', 'min': 20, 'max': 25}}
+    cube = BatchMetricsEngine.build_cube(make_frame(), constraints, batch_col='lot')
+
+    assert cube.loc[(ALL_BATCHES, 'temp'), 'За пределами норм'] == 2
+    assert cube.loc[('A', 'temp'), 'За пределами норм'] == 1
+    assert cube.loc[(ALL_BATCHES, 'weight'), 'За пределами норм'] == 0
+    assert cube.loc[('B', 'weight'), 'За пределами норм'] == 0
+
+
+def test_counts_stay_integer_after_round_trip():
+    cube = BatchMetricsEngine.build_cube(make_frame(), {}, batch_col='lot')
+    # Как при сохранении в JSONB: пропуски становятся null
+    records = json.loads(json.dumps(BatchMetricsEngine.cube_to_records(cube), default=str).replace('NaN', 'null'))
+    restored = BatchMetricsEngine.cube_from_records(records)
+
+    assert str(restored.loc[(ALL_BATCHES, 'temp'), 'Количество']) == '3'
+    assert str(restored.loc[(ALL_BATCHES, 'temp'), 'За пределами норм']) == '0'
+    assert str(restored.loc[('B', 'grade'), 'Количество значений']) == '1'
+    assert pd.isna(restored.loc[(ALL_BATCHES, 'grade'), 'Количество'])
@@ -0,0 +1,73 @@
+# tests/test_persistence_queue.py
+import threading
+import time
+
+from data.persistence_queue import PersistenceQueue
+
+
+class FakeConnection:
+    def commit(self):
+        pass
+
+
+class FakeManager:
+    """Менеджер базы: save_results ждет события release"""
+
+    def __init__(self, release, written):
+        self.conn = FakeConnection()
+        self.release = release
+        self.written = written
+
+    def save_results(self, *args, **kwargs):
+        self.release.wait()
+        self.written.append(args)
+
+    def close(self):
+        pass
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_unavailable_database_is_probed_once(tmp_path):
+    calls = []
+
+    def unavailable():
+        calls.append(time.monotonic())
+        raise ConnectionError("нет соединения")
+
+    persistence = PersistenceQueue(journal_dir=tmp_path, base_delay=5.0, manager_factory=unavailable).start()
+    try:
+        started = time.monotonic()
+        persistence.submit_results({}, {'value': 1}, 'static')
+        assert wait_for(lambda: persistence.stats()['journal_depth'] == 1)
+        assert time.monotonic() - started < 1.0
+        assert len(calls) == 1
+        assert not persistence.db_available
+    finally:
+        persistence.stop()
+
+
+def test_stop_leaves_draining_to_busy_worker(tmp_path):
+    release = threading.Event()
+    written = []
+    persistence = PersistenceQueue(journal_dir=tmp_path, batch_size=1,
+                                   manager_factory=lambda: FakeManager(release, written)).start()
+    assert wait_for(lambda: persistence.db_available)
+
+    persistence.submit_results({}, {'value': 1}, 'static')
+    assert wait_for(lambda: persistence._queue.empty())
+    persistence.submit_results({}, {'value': 2}, 'static')
+
+    persistence.stop(timeout=0.1)
+    # Поток занят записью: stop не трогает очередь
+    assert persistence.stats()['journal_depth'] == 0
+
+    release.set()
+    persistence._thread.join(5.0)
+    assert [args[1] for args in written] == [{'value': 1}]
+    assert persistence.stats()['journal_depth'] == 1
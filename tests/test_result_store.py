@@ -0,0 +1,39 @@
+# tests/test_result_store.py
+import numpy as np
+import pandas as pd
+
+import data.result_store as result_store
+from business.computation_cache import ComputationCache
+from data.result_store import ResultStore
+
+
+class FakeQueue:
+    db_available = True
+
+    def __init__(self):
+        self.results = []
+
+    def submit_results(self, params, results, analysis_type, **kwargs):
+        self.results.append((params, results, analysis_type, kwargs))
+        return True
+
+
+def test_quality_index_is_stored(monkeypatch):
+    queue = FakeQueue()
+    monkeypatch.setattr(result_store, 'get_persistence_queue', lambda: queue)
+    df = pd.DataFrame({'batch_id': ['A', 'B', 'A'], 'temp': [20.0, 23.0, np.nan]})
+    constraints = {'temp': {'type': 'range', 'min': 20, 'max': 25}}
+
+    # Тот же путь, что и у InputPage.calculate_index: расчет через кэш, затем сохранение
+    cache = ComputationCache()
+    quality, best_worst = cache.quality('static', df, constraints)
+    digest = cache.memo('static', 'data_digest', lambda: ResultStore.data_digest(df))
+    content_hash = ResultStore.store_quality(df, constraints, 'static', quality, best_worst, data_digest=digest)
+
+    assert len(queue.results) == 1
+    params, results, analysis_type, kwargs = queue.results[0]
+    assert params == constraints and analysis_type == 'static'
+    assert kwargs['content_hash'] == content_hash
+    assert content_hash == ResultStore.content_key(df, constraints, 'static', 'quality_index')
+    assert results['quality_index'] == quality.to_dict()
+    assert results['best_worst'] == best_worst
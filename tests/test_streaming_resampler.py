@@ -0,0 +1,35 @@
+# tests/test_streaming_resampler.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from business.data_processor import DataProcessor
+from business.streaming_resampler import StreamingResampler
+
+
+def make_frame(rows=5000, seed=0):
+    """Упорядоченные по времени измерения с неравномерным шагом и пропуском в несколько суток"""
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp('2024-01-03 07:30') + pd.to_timedelta(np.cumsum(rng.integers(1, 90, rows)), unit='min')
+    times = times.where(times < pd.Timestamp('2024-01-20'), times + pd.Timedelta(days=5))
+    return pd.DataFrame({
+        'timestamp': times.astype(str),
+        'temperature': rng.normal(20, 2, rows),
+        'pressure': rng.normal(100, 5, rows),
+    })
+
+
+@pytest.mark.parametrize('rule', ['D', '2D', 'W', 'W-MON', 'h', '5h'])
+def test_stream_matches_in_memory(rule):
+    df = make_frame()
+    chunks = [df.iloc[i:i + 700] for i in range(0, len(df), 700)]
+
+    expected = DataProcessor.preprocess_data(df.copy(), 'dynamic', resample_rule=rule)
+    streamed = DataProcessor.preprocess_stream(iter(chunks), resample_rule=rule)
+
+    pd.testing.assert_frame_equal(streamed, expected, check_freq=False)
+
+
+def test_unsupported_rule():
+    with pytest.raises(ValueError):
+        StreamingResampler(rule='ME')